@@ -0,0 +1,66 @@
+import json
+import statistics
+import sys
+
+# Phases of the GET request, in order, as the time since the request started
+PHASES = ['connect_s', 'tls_s', 'request_s', 'first_byte_s', 'last_byte_s']
+
+def aggregate_phases(entries):
+    """Aggregates the phase timings of the successful trials of each
+    configuration, keyed by (label, cca, pep).
+
+    Returns a map from the configuration to the median duration of each
+    phase, i.e., the difference from the end of the previous phase, in seconds.
+    Phases without timings, e.g., tls_s without TLS, are omitted.
+    """
+    durations = {}
+    for entry in entries:
+        inputs = entry.get('inputs', {})
+        key = (entry.get('scene_id', inputs.get('label')),
+               entry.get('cca', inputs.get('cca')),
+               entry.get('pep', inputs.get('pep')))
+        config = durations.setdefault(key, {})
+        for output in entry.get('outputs', []):
+            if not output.get('success'):
+                continue
+            prev = 0.0
+            for phase in PHASES:
+                if phase not in output:
+                    continue
+                config.setdefault(phase, []).append(output[phase] - prev)
+                prev = output[phase]
+    return {
+        key: {phase: statistics.median(values)
+              for phase, values in config.items()}
+        for key, config in durations.items()
+    }
+
+def analyze(file_path):
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        print(f"File not found: {file_path}")
+        return
+    if isinstance(data, dict):
+        data = [data]
+
+    # Print the median duration of each phase in milliseconds
+    print(f"{'Scene':<15} {'CCA':<8} {'PEP':<6} " +
+          ' '.join(f'{phase[:-2]:<11}' for phase in PHASES))
+    print("-" * 90)
+    phases = aggregate_phases(data)
+    for (scene, cca, pep), medians in sorted(phases.items(), key=str):
+        row = []
+        for phase in PHASES:
+            if phase in medians:
+                row.append(f'{medians[phase] * 1000:<11.2f}')
+            else:
+                row.append(f'{"-":<11}')
+        print(f"{str(scene):<15} {str(cca):<8} {str(pep):<6} " + ' '.join(row))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        analyze(sys.argv[1])
+    else:
+        print("Usage: python analyze_phases.py <path_to_json>")
@@ -3,7 +3,7 @@ import json
 import os
 import subprocess
 import sys
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 # 仓库根目录（demo/ 的上一级）
 REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -34,6 +34,20 @@ def load_scenarios(path: str) -> List[NetworkScenario]:
     return scenes
 
 
+def select_protocol(cc: str) -> Tuple[str, str]:
+    """根据 CC 算法选择 emulation/main.py 的协议子命令及其 CCA 参数。"""
+    if cc == 'bbr2':
+        # BBRv2 使用 Cloudflare Quiche
+        return "cloudflare", "bbr2"
+    elif cc == 'bbr3':
+        # BBRv3 使用 Picoquic (其实现的最新版 BBR 即为 v3)
+        return "picoquic", "bbr"
+    else:
+        # 其他算法 (cubic, bbr 等) 使用 TCP
+        # 注意: 这里 'bbr' 将使用 Linux 内核的 TCP BBR (即 BBRv1)
+        return "tcp", cc
+
+
 def run_emulation(
     scene: NetworkScenario,
     strategy: str,
@@ -80,38 +94,34 @@ def run_emulation(
         cmd.append("--pep")
 
     # ---- 子命令 tcp 及其参数（必须在最后） ----
-    # 根据 CC 算法选择协议
-    if scene.cc == 'bbr2':
-        # BBRv2 使用 Cloudflare Quiche
-        cmd += [
-            "cloudflare",
-            "-n",
-            str(args.n_bytes),
-            "--congestion-control",
-            "bbr2"
-        ]
-    elif scene.cc == 'bbr3':
-        # BBRv3 使用 Picoquic (其实现的最新版 BBR 即为 v3)
-        cmd += [
-            "picoquic",
-            "-n",
-            str(args.n_bytes),
-            "--congestion-control",
-            "bbr"
-        ]
-    else:
-        # 其他算法 (cubic, bbr 等) 使用 TCP
-        # 注意: 这里 'bbr' 将使用 Linux 内核的 TCP BBR (即 BBRv1)
-        cmd += [
-            "tcp",
-            "-n",
-            str(args.n_bytes),
-            "--congestion-control",
-            scene.cc,
-        ]
+    protocol, cca = select_protocol(scene.cc)
+    cmd += [
+        protocol,
+        "-n",
+        str(args.n_bytes),
+        "--congestion-control",
+        cca,
+    ]
 
     print(f"[INFO] Running scene={scene.scene_id}, cc={scene.cc}, "
           f"strategy={strategy}, pep={pep}")
+    if args.daemon_socket is not None:
+        result = run_emulation_job(scene, label, pep, args)
+    else:
+        result = run_emulation_subprocess(cmd)
+
+    # 附加一些元信息，后续分析会用到
+    result["scene_id"] = scene.scene_id
+    result["strategy"] = strategy
+    result["pep"] = pep
+    result["cca"] = scene.cc
+    result["derived_rtt_ms"] = scene.rtt_ms
+    result["derived_loss_pct"] = scene.loss_pct
+    return result
+
+
+def run_emulation_subprocess(cmd: List[str]) -> Dict[str, Any]:
+    """在子进程中执行 emulation/main.py，返回其输出的 JSON 结果。"""
     print("[INFO] Command:", " ".join(cmd))
 
     proc = subprocess.run(cmd, text=True, capture_output=True)
@@ -134,15 +144,49 @@ def run_emulation(
         print(proc.stdout)
         raise ValueError("no JSON result found in emulation output")
 
-    result: Dict[str, Any] = json.loads(last_json)
-    # 附加一些元信息，后续分析会用到
-    result["scene_id"] = scene.scene_id
-    result["strategy"] = strategy
-    result["pep"] = pep
-    result["cca"] = scene.cc
-    result["derived_rtt_ms"] = scene.rtt_ms
-    result["derived_loss_pct"] = scene.loss_pct
-    return result
+    return json.loads(last_json)
+
+
+def run_emulation_job(
+    scene: NetworkScenario,
+    label: str,
+    pep: bool,
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    """
+    把与 run_emulation() 相同的实验作为 job 提交给常驻的 emulation daemon
+    （emulation/daemon.py），避免每次重新构建 mininet 网络。
+    """
+    from emulation.daemon_client import EmulationClient
+
+    protocol, cca = select_protocol(scene.cc)
+    job = {
+        "network": {
+            "topology": args.topology,
+            "delay1": int(scene.delay1_ms),
+            "loss1": str(int(scene.loss1_pct)),
+            "bw1": int(scene.bw1_mbps),
+            "qdisc": args.qdisc,
+        },
+        "protocol": protocol,
+        "cca": cca,
+        "pep": pep,
+        "n": args.n_bytes,
+        "trials": args.trials,
+        "timeout": args.timeout,
+        "label": label,
+        "network_statistics": args.network_statistics,
+    }
+    if args.topology == "two_segment":
+        job["network"].update({
+            "delay2": int(scene.delay2_ms),
+            "loss2": str(int(scene.loss2_pct)),
+            "bw2": int(scene.bw2_mbps),
+        })
+    print("[INFO] Job:", json.dumps(job))
+
+    client = EmulationClient(args.daemon_socket)
+    return client.run_job(**job)
 
 
 def main() -> None:
@@ -208,6 +252,13 @@ def main() -> None:
         help="Disable --network-statistics flag.",
     )
     parser.set_defaults(network_statistics=True)
+    parser.add_argument(
+        "--daemon-socket",
+        type=str,
+        default=None,
+        help="Submit runs to the emulation daemon on this Unix socket "
+             "instead of running emulation/main.py per run.",
+    )
 
     args = parser.parse_args()
 
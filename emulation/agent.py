@@ -0,0 +1,115 @@
+"""
+Long-lived client agent that runs in the background on a mininet host and
+executes one request for every command line written to its stdin, instead of
+starting a new client process for every trial. The agent prints AGENT_READY
+once it is set up, and AGENT_DONE after the output of each request, on stdout.
+"""
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from common import *
+
+AGENT_READY = '[AGENT] ready'
+AGENT_DONE = '[AGENT] done'
+
+# Interval at which a request checks whether the agent exited, in seconds
+AGENT_POLL_INTERVAL = 0.5
+
+
+class ClientAgent:
+    def __init__(self, net, host, cmd: str):
+        """The client agent that executes the command <cmd> on the mininet
+        host <host> of the network <net>, an EmulatedNetwork.
+        """
+        self.net = net
+        self.host = host
+        self.cmd = cmd
+        self.process = None
+        self.condition = threading.Condition()
+        self.ready = False
+        self.done = False
+        self.lines = None
+        self.logfile = None
+
+    def _on_line(self, line: str):
+        with self.condition:
+            if line.startswith(AGENT_READY):
+                self.ready = True
+            elif line.startswith(AGENT_DONE):
+                self.done = True
+            else:
+                if self.lines is not None:
+                    self.lines.append(line)
+                if self.logfile is not None:
+                    LOG_SINK.write(self.logfile, line)
+                return
+            self.condition.notify_all()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, timeout: int=SETUP_TIMEOUT):
+        """Starts the agent and blocks until it is ready to execute requests.
+
+        Raises:
+        - TimeoutError if the agent is not ready within <timeout> seconds.
+        """
+        self.process, _ = self.net.popen(self.host, self.cmd, background=True,
+            stdin=True, console_logger=DEBUG, func=self._on_line)
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.ready, timeout):
+                self.stop()
+                raise TimeoutError(f'start agent timeout {timeout}s')
+
+    def request(
+        self, command: str, logfile: Optional[str]=None,
+        timeout: Optional[int]=None,
+    ) -> Tuple[List[str], bool]:
+        """Executes the request <command> on the agent and blocks until it is
+        done. The agent is stopped if the request times out.
+
+        Parameters:
+        - command: The command line of the request, without a newline.
+        - logfile: The name of the logfile to append the output.
+        - timeout: If provided, the number of seconds to wait for the request.
+
+        Returns:
+        - The output lines of the request, and whether the request timed out.
+        """
+        with self.condition:
+            self.lines = []
+            self.done = False
+            self.logfile = logfile
+        self.process.stdin.write(f'{command}\n'.encode('utf-8'))
+        self.process.stdin.flush()
+
+        timeout_flag = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while not self.done and self.process.poll() is None:
+                interval = AGENT_POLL_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        timeout_flag = True
+                        break
+                    interval = min(interval, remaining)
+                self.condition.wait(interval)
+            lines = self.lines
+            self.lines = None
+            self.logfile = None
+        if not self.done and not timeout_flag:
+            ERROR(f'{self.host.name} agent exited: {self.cmd}')
+        if timeout_flag:
+            self.stop()
+        if logfile is not None:
+            LOG_SINK.flush(logfile)
+        return lines, timeout_flag
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+        self.process.wait()
@@ -1,17 +1,35 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import mininet
 
+from agent import ClientAgent
+from capabilities import get_capabilities
 from network import EmulatedNetwork
 from result import BenchmarkResult
 from common import *
 
 
 class Benchmark(ABC):
+    # Paths to the binaries executed by the benchmark, relative to the base repo
+    BINARIES = []
+
+    # Whether a non-zero client exitcode that is not a timeout raises an error
+    RAISE_CLIENT_ERROR = True
+
+    # Whether the server can serve any data size up to the size it was started
+    # with, see server_cmd()
+    SIZE_AGNOSTIC_SERVER = True
+
+    # The port the server listens on unless another port is provided
+    DEFAULT_PORT = None
+
     def __init__(
         self, net: EmulatedNetwork, protocol: Protocol, label: str,
         logdir: str, n: str, cca: str, certfile: str, keyfile: str, pep: bool,
+        max_n: Optional[int]=None, port: Optional[int]=None,
     ):
         """
         File download benchmark where the HTTP client on the h1 host requests
@@ -34,7 +52,17 @@ class Benchmark(ABC):
         - certfile: Path to the TLS/SSL certificate file.
         - keyfile: Path to the TLS/SSL key file.
         - pep: Whether to start a TCP connection-splitting PEP on p1.
+        - max_n: If provided, the maximum data size of the server. The server
+          keeps running on the network after the benchmark and is reused by
+          later benchmarks with the same server and any data size up to max_n,
+          see start_server().
+        - port: If provided, the port the server listens on instead of the
+          DEFAULT_PORT, e.g., to run several servers on the h2 host at once.
+
+        Raises:
+        - RuntimeError if a binary of the benchmark or the PEP is missing.
         """
+        get_capabilities().require(binaries=self.BINARIES, pep=pep)
         self.net = net
         self.protocol = protocol
         self.label = label
@@ -44,6 +72,15 @@ class Benchmark(ABC):
         self.certfile = certfile
         self.keyfile = keyfile
         self.pep = pep
+        self.port = self.DEFAULT_PORT if port is None else port
+        self.server_process = None
+        self.client_progress = None
+        self.client_phases = None
+        self.client_requests = None
+        if self.SIZE_AGNOSTIC_SERVER and max_n is not None:
+            self.server_n = max(n, max_n)
+        else:
+            self.server_n = n
 
     def logfile(self, host: mininet.node.Host) -> Optional[str]:
         """Path to the logfile for this host. The logs are written to the
@@ -65,19 +102,198 @@ class Benchmark(ABC):
     def client(self):
         return self.net.h1
 
+    @property
+    def server_key(self) -> Tuple[str, int]:
+        return (self.server.name, self.port)
+
+    @abstractmethod
+    def server_cmd(self, n: int) -> str:
+        """The command that starts the HTTP server on the h2 host. If the
+        server is size-agnostic, the server serves any data size up to <n>.
+        Otherwise, it only serves the data size <n>.
+        """
+        pass
+
+    @abstractmethod
+    def server_ready(self, line: str) -> bool:
+        """Whether the line of server output indicates that the server is
+        ready to accept client requests.
+        """
+        pass
+
     @abstractmethod
+    def client_cmd(self) -> str:
+        """The command that runs the HTTP client on the h1 host.
+        """
+        pass
+
+    @abstractmethod
+    def parse_client_output(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
+        """Parses the output lines of the HTTP client, see run_client().
+
+        Parameters:
+        - lines: The client output.
+        - timeout_flag: Whether the client timed out.
+        - timeout: The client timeout, in seconds.
+        """
+        pass
+
+    def parse_client_progress(self, lines: List[str]) -> Optional[Dict]:
+        """Parses the progress of the GET request from the output lines of
+        the HTTP client, e.g., the time to first byte and the throughput over
+        time, if the client reports it. Returns None by default.
+        """
+        return None
+
+    def parse_client_phases(self, lines: List[str]) -> Optional[Dict]:
+        """Parses the time, in seconds since the client started the GET
+        request, at which each phase of the request completed, e.g., the TCP
+        connect and TLS handshake, if the client reports it. Returns None by
+        default.
+        """
+        return None
+
+    def parse_client_requests(
+        self, lines: List[str],
+    ) -> Optional[List[Dict]]:
+        """Parses the result of each request from the output lines of the
+        HTTP client, if the client sends several requests per trial. Returns
+        None by default.
+        """
+        return None
+
+    def client_agent_cmd(self) -> Optional[str]:
+        """The command that starts a long-lived client agent on the h1 host,
+        which executes the request client_agent_request() for every trial
+        instead of running client_cmd(), see ClientAgent. Returns None by
+        default, i.e., every trial runs a new client.
+        """
+        return None
+
+    def client_agent_request(self) -> Optional[str]:
+        """The command line of the request sent to the client agent. Returns
+        None by default, i.e., there is no client agent, and must be provided
+        with client_agent_cmd().
+        """
+        return None
+
+    def prepare_client(self):
+        """Prepares the h1 host before each client request. Does nothing by
+        default.
+        """
+        pass
+
     def start_server(self, timeout: int=SETUP_TIMEOUT):
         """Start the HTTP server on the h2 host and write output to a logfile.
 
         This function runs the server in the background but blocks until the
         server is ready to accept requests. Raises an error if unsuccessful.
 
+        If a server that serves this benchmark is already running on the port
+        of the h2 host, i.e., one with the same command that serves the data size of the
+        benchmark, reuses the server instead. Otherwise, stops the running
+        server.
+
         Parameters:
         - timeout: The number of seconds to block during setup before an error.
         """
-        pass
+        if self._reuse_server():
+            return
+        self.stop_server()
+
+        condition = threading.Condition()
+        def notify_when_ready(line):
+            if self.server_ready(line):
+                with condition:
+                    condition.notify()
+
+        # The start_server() function blocks until the server is ready to
+        # accept client requests, as indicated by the server output.
+        logfile = self.logfile(self.server)
+        cmd = self.server_cmd(self.server_n)
+        with condition:
+            self.server_process, _ = self.net.popen(
+                self.server, cmd, background=True,
+                console_logger=DEBUG, logfile=logfile, func=notify_when_ready)
+            notified = condition.wait(timeout=timeout)
+            if not notified:
+                raise TimeoutError(f'start_server timeout {timeout}s')
+        self.net.servers[self.server_key] = \
+            (cmd, self.server_process, self.server_n)
+
+    async def astart_server(self, timeout: int=SETUP_TIMEOUT):
+        """Asynchronous variant of start_server() that waits until the server
+        is ready to accept requests without blocking the event loop.
+        """
+        if self._reuse_server():
+            return
+        await self.astop_server()
+
+        logfile = self.logfile(self.server)
+        cmd = self.server_cmd(self.server_n)
+        self.server_process, _ = await self.net.apopen(
+            self.server, cmd, background=True,
+            console_logger=DEBUG, logfile=logfile, ready=self.server_ready,
+            timeout=timeout)
+        self.net.servers[self.server_key] = \
+            (cmd, self.server_process, self.server_n)
+
+    def _reuse_server(self) -> bool:
+        """Reuses the server running on the port of the h2 host if it serves
+        this benchmark. Otherwise, sets the server process to the running server,
+        if any, so that it can be stopped.
+        """
+        self.server_process = None
+        running = self.net.servers.get(self.server_key)
+        if running is None:
+            return False
+        cmd, process, n = running
+        self.server_process = process
+        if isinstance(process, subprocess.Popen):
+            process.poll()
+        if process.returncode is not None:
+            return False
+        if cmd == self.server_cmd(self.n) or (self.SIZE_AGNOSTIC_SERVER and
+                n >= self.n and cmd == self.server_cmd(n)):
+            DEBUG(f'{self.server.name} reusing server {cmd}')
+            return True
+        return False
+
+    def stop_server(self):
+        """Stop the HTTP server on the h2 host, if it was started by
+        start_server(). Servers are otherwise only stopped when the network is
+        stopped, or when a benchmark that cannot reuse the server is started.
+        """
+        if self.server_process is None:
+            return
+        if self.server_process.returncode is None:
+            self.server_process.terminate()
+        if isinstance(self.server_process, subprocess.Popen):
+            self.server_process.wait()
+        self._forget_server()
+
+    async def astop_server(self):
+        """Stop the HTTP server on the h2 host, if it was started by
+        astart_server().
+        """
+        if self.server_process is None:
+            return
+        if isinstance(self.server_process, subprocess.Popen):
+            self.stop_server()
+            return
+        if self.server_process.returncode is None:
+            self.server_process.terminate()
+        await self.server_process.wait()
+        self._forget_server()
+
+    def _forget_server(self):
+        running = self.net.servers.get(self.server_key)
+        if running is not None and running[1] is self.server_process:
+            del self.net.servers[self.server_key]
+        self.server_process = None
 
-    @abstractmethod
     def run_client(
         self, timeout: Optional[int]=None,
     ) -> Optional[Tuple[int, float]]:
@@ -94,11 +310,70 @@ class Benchmark(ABC):
           request. If the client has timed out, returns HTTP_TIMEOUT_STATUSCODE
           even though the timeout may not have occurred in the actual endpoints.
         """
-        pass
+        self.prepare_client()
+        if self.client_agent_cmd() is not None:
+            lines, timeout_flag = self._request_client_agent(timeout)
+            return self._parse_client(lines, timeout_flag, timeout)
+        lines = []
+        logfile = self.logfile(self.client)
+        timeout_flag = self.net.popen(self.client, self.client_cmd(),
+            background=False, console_logger=DEBUG, logfile=logfile,
+            func=lines.append, timeout=timeout,
+            raise_error=self.RAISE_CLIENT_ERROR)
+        return self._parse_client(lines, timeout_flag, timeout)
+
+    async def arun_client(
+        self, timeout: Optional[int]=None,
+    ) -> Optional[Tuple[int, float]]:
+        """Asynchronous variant of run_client(). If cancelled, the client is
+        killed.
+        """
+        await asyncio.to_thread(self.prepare_client)
+        if self.client_agent_cmd() is not None:
+            lines, timeout_flag = await asyncio.to_thread(
+                self._request_client_agent, timeout)
+            return self._parse_client(lines, timeout_flag, timeout)
+        lines = []
+        logfile = self.logfile(self.client)
+        timeout_flag = await self.net.apopen(self.client, self.client_cmd(),
+            background=False, console_logger=DEBUG, logfile=logfile,
+            func=lines.append, timeout=timeout,
+            raise_error=self.RAISE_CLIENT_ERROR)
+        return self._parse_client(lines, timeout_flag, timeout)
+
+    def _parse_client(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
+        self.client_progress = self.parse_client_progress(lines)
+        self.client_phases = self.parse_client_phases(lines)
+        self.client_requests = self.parse_client_requests(lines)
+        return self.parse_client_output(lines, timeout_flag, timeout)
+
+    def _request_client_agent(
+        self, timeout: Optional[int],
+    ) -> Tuple[List[str], bool]:
+        """Sends the request to the client agent on the h1 host, starting the
+        agent if it is not already running. Agents keep running on the
+        network and are shared by benchmarks with the same agent command.
+        """
+        cmd = self.client_agent_cmd()
+        request = self.client_agent_request()
+        assert request is not None, \
+            f'{type(self).__name__} has a client agent without requests'
+        key = (self.client.name, cmd)
+        agent = self.net.agents.get(key)
+        if agent is None or not agent.is_alive():
+            agent = ClientAgent(self.net, self.client, cmd)
+            agent.start()
+            self.net.agents[key] = agent
+        return agent.request(request,
+                             logfile=self.logfile(self.client),
+                             timeout=timeout)
 
     def run_benchmark(
         self, num_trials: int, timeout: Optional[int]=None,
-        network_statistics: bool=False,
+        network_statistics: bool=False, timeline_interval: Optional[float]=None,
+        qdisc_interval: Optional[float]=None,
     ) -> BenchmarkResult:
         """
         Running the benchmark will start the HTTP server on the h2 host and
@@ -112,13 +387,45 @@ class Benchmark(ABC):
         - network_statistics: Whether to collect network statistics, i.e., the
           number of bytes and packets that were sent and received at each
           interface, of the most recent trial.
+        - timeline_interval: If provided, the interval, in seconds, at which
+          to sample the network statistics during each trial.
+        - qdisc_interval: If provided, the interval, in seconds, at which to
+          sample the qdisc statistics of the emulators during each trial.
 
         Returns:
         - A BenchmarkResult corresponding to the result of this benchmark.
         """
         self.start_server()
+        result = self._new_result()
+        for _ in range(num_trials):
+            self._start_trial(result, timeline_interval, qdisc_interval)
+            try:
+                output = self.run_client(timeout=timeout)
+            finally:
+                self._stop_samplers(result, timeline_interval, qdisc_interval)
+            self._end_trial(result, output, network_statistics)
+        return result
+
+    async def arun_benchmark(
+        self, num_trials: int, timeout: Optional[int]=None,
+        network_statistics: bool=False, timeline_interval: Optional[float]=None,
+        qdisc_interval: Optional[float]=None,
+    ) -> BenchmarkResult:
+        """Asynchronous variant of run_benchmark() with the same parameters.
+        The server is not stopped, see astop_server().
+        """
+        await self.astart_server()
+        result = self._new_result()
+        for _ in range(num_trials):
+            self._start_trial(result, timeline_interval, qdisc_interval)
+            try:
+                output = await self.arun_client(timeout=timeout)
+            finally:
+                self._stop_samplers(result, timeline_interval, qdisc_interval)
+            self._end_trial(result, output, network_statistics)
+        return result
 
-        # Initialize the benchmark result
+    def _new_result(self) -> BenchmarkResult:
         result = BenchmarkResult(
             label=self.label,
             protocol=self.protocol.name,
@@ -126,31 +433,59 @@ class Benchmark(ABC):
             cca=self.cca,
             pep=self.pep,
         )
-
-        # Run the client
-        for _ in range(num_trials):
-            result.append_new_output()
-            self.net.reset_statistics()
-            output = self.run_client(timeout=timeout)
-            if network_statistics:
-                statistics = self.net.snapshot_statistics()
-                result.set_network_statistics(statistics)
-
-            # Handle an error in the client
-            if output is None:
-                result.set_success(False)
-                result.set_timeout(False)
-                continue
-
-            # Handle a successful trial
-            status_code, time_s = output
-            result.set_success(status_code == HTTP_OK_STATUSCODE)
-            result.set_timeout(status_code == HTTP_TIMEOUT_STATUSCODE)
-            result.set_time_s(time_s)
-
-        # Return the result
+        # The TCP buffer sysctls of the network, if set
+        for sysctl, sizes in self.net.tcp_buffers.items():
+            result.inputs[sysctl] = dict(sizes)
         return result
 
+    def _start_trial(
+        self, result: BenchmarkResult, timeline_interval: Optional[float],
+        qdisc_interval: Optional[float],
+    ):
+        result.append_new_output()
+        self.client_progress = None
+        self.client_phases = None
+        self.client_requests = None
+        self.net.reset_statistics()
+        if timeline_interval is not None:
+            self.net.start_sampler(timeline_interval)
+        if qdisc_interval is not None:
+            self.net.start_qdisc_sampler(qdisc_interval)
+
+    def _stop_samplers(
+        self, result: BenchmarkResult, timeline_interval: Optional[float],
+        qdisc_interval: Optional[float],
+    ):
+        if timeline_interval is not None:
+            result.set_timeline(self.net.stop_sampler())
+        if qdisc_interval is not None:
+            result.set_qdisc_timeline(self.net.stop_qdisc_sampler())
+
+    def _end_trial(
+        self, result: BenchmarkResult, output: Optional[Tuple[int, float]],
+        network_statistics: bool,
+    ):
+        if network_statistics:
+            statistics = self.net.snapshot_statistics()
+            result.set_network_statistics(statistics)
+
+        # Handle an error in the client
+        if output is None:
+            result.set_success(False)
+            result.set_timeout(False)
+            return
+
+        # Handle a successful trial
+        status_code, time_s = output
+        result.set_success(status_code == HTTP_OK_STATUSCODE)
+        result.set_timeout(status_code == HTTP_TIMEOUT_STATUSCODE)
+        result.set_time_s(time_s)
+        if self.client_progress is not None:
+            result.set_progress(self.client_progress)
+        if self.client_phases is not None:
+            result.set_phases(self.client_phases)
+        if self.client_requests is not None:
+            result.set_requests(self.client_requests)
 
 from .cloudflare import CloudflareQUICBenchmark
 from .google import GoogleQUICBenchmark
@@ -1,6 +1,5 @@
 import re
-import threading
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from benchmark import Benchmark
 from network import EmulatedNetwork
@@ -8,64 +7,63 @@ from common import *
 
 
 class CloudflareQUICBenchmark(Benchmark):
+    BINARIES = [
+        'deps/quiche/target/release/quiche-server',
+        'deps/quiche/target/release/quiche-client',
+    ]
+    RAISE_CLIENT_ERROR = False
+    DEFAULT_PORT = 4433
+
     def __init__(self, net: EmulatedNetwork, label: str, logdir: str, n: str,
-                 cca: str, certfile: str, keyfile: str, pep: bool=False):
+                 cca: str, certfile: str, keyfile: str, pep: bool=False,
+                 max_n: Optional[int]=None, port: Optional[int]=None):
         super().__init__(net, Protocol.CLOUDFLARE_QUIC, label, logdir, n, cca,
-                         certfile, keyfile, pep)
+                         certfile, keyfile, pep, max_n, port)
 
-    def start_server(self, timeout: int=SETUP_TIMEOUT):
+    def server_cmd(self, n: int) -> str:
         base = 'deps/quiche/target/release'
         # Force RUST_LOG=info for server to reduce noise but keep key events
-        cmd = f'/usr/bin/env RUST_LOG=info ./{base}/quiche-server '\
-              f'--cert={self.certfile} '\
-              f'--key={self.keyfile} '\
-              f'--cc-algorithm {self.cca} ' \
-              f'--listen {self.server.IP()}:4433'
+        return f'/usr/bin/env RUST_LOG=info ./{base}/quiche-server '\
+               f'--cert={self.certfile} '\
+               f'--key={self.keyfile} '\
+               f'--cc-algorithm {self.cca} ' \
+               f'--listen {self.server.IP()}:{self.port}'
 
-        condition = threading.Condition()
-        def notify_when_ready(line):
-            if 'listening' in line.lower():
-                with condition:
-                    condition.notify()
+    def server_ready(self, line: str) -> bool:
+        return 'listening' in line.lower()
 
-        # The start_server() function blocks until the server is ready to
-        # accept client requests. That is, when we observe the 'Serving'
-        # string in the server output.
-        logfile = self.logfile(self.server)
-        self.net.popen(self.server, cmd, background=True,
-            console_logger=DEBUG, logfile=logfile, func=notify_when_ready)
-        with condition:
-            notified = condition.wait(timeout=timeout)
-            if not notified:
-                raise TimeoutError(f'start_server timeout {timeout}s')
+    @property
+    def dump_dir(self) -> str:
+        # Temp dir for response dump to avoid stdout flooding
+        return f"/tmp/quiche_dump_{self.label}"
 
-    def run_client(self, timeout: Optional[int]=None) -> Optional[Tuple[int, float]]:
-        """Returns the status code and runtime (seconds) of the GET request.
-        """
+    def prepare_client(self):
         # Debug: Check connectivity first
         DEBUG(f"Checking connectivity to {self.server.IP()}...")
         self.net.popen(self.client, f'ping -c 2 {self.server.IP()}', 
                       stdout=True, stderr=True, raise_error=False)
+        self.net.popen(self.client, f"mkdir -p {self.dump_dir}")
 
-        # Create a temp dir for response dump to avoid stdout flooding
-        dump_dir = f"/tmp/quiche_dump_{self.label}"
-        self.net.popen(self.client, f"mkdir -p {dump_dir}")
-
+    def client_cmd(self) -> str:
         base = 'deps/quiche/target/release'
         # Force RUST_LOG=info to diagnose connection issues but avoid debug spam
         # Redirect stderr to stdout is NOT needed because popen handles both streams separately or merged depending on config
         # We use --dump-responses to prevent body printing to stdout which clogs the pipe
-        cmd = f'/usr/bin/env RUST_LOG=info ./{base}/quiche-client '\
-              f'--no-verify '\
-              f'--method GET '\
-              f'--dump-responses {dump_dir} '\
-              f'--cc-algorithm {self.cca} ' \
-              f'-- https://{self.server.IP()}:4433/{self.n}'
-
+        return f'/usr/bin/env RUST_LOG=info ./{base}/quiche-client '\
+               f'--no-verify '\
+               f'--method GET '\
+               f'--dump-responses {self.dump_dir} '\
+               f'--cc-algorithm {self.cca} ' \
+               f'-- https://{self.server.IP()}:{self.port}/{self.n}'
 
+    def parse_client_output(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
+        """Returns the status code and runtime (seconds) of the GET request.
+        """
         result = []
         timed_out = False
-        def parse_result(line):
+        for line in lines:
             # Debug: log all lines to help diagnose
             DEBUG(f'quiche-client output: {line.strip()}')
             
@@ -73,12 +71,12 @@ class CloudflareQUICBenchmark(Benchmark):
                 # Also check for alternative formats
                 if 'response' in line.lower() and 'received' in line.lower():
                     DEBUG(f'Found potential response line but format may differ: {line.strip()}')
-                return
+                continue
             if 'Not found' in line:
-                return
+                continue
             if 'timed out' in line or 'timeout' in line.lower():
                 timed_out = True
-                return
+                continue
             try:
                 # Rust Duration format can be like "1.234s" or "1234ms" or "1.234567s"
                 # Match: "received in 1.234s" or "received in 1234ms" or "received in 1.234567s"
@@ -117,11 +115,6 @@ class CloudflareQUICBenchmark(Benchmark):
                 DEBUG(f'Failed to parse quiche-client output: {line.strip()}, error: {e}')
                 pass
 
-        logfile = self.logfile(self.client)
-        timeout_flag = self.net.popen(self.client, cmd, background=False,
-            console_logger=DEBUG, logfile=logfile, func=parse_result,
-            timeout=timeout, raise_error=False)
-
         if timed_out:
             # Max idle timeout reached when there have been no packets received for
             # N seconds (default: 30); this implies that something went
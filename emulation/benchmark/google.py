@@ -1,5 +1,4 @@
-import threading
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from benchmark import Benchmark
 from network import EmulatedNetwork
@@ -7,42 +6,35 @@ from common import *
 
 
 class GoogleQUICBenchmark(Benchmark):
+    BINARIES = [
+        'deps/chromium/src/out/Default/quic_server',
+        'deps/chromium/src/out/Default/quic_client',
+    ]
+    DEFAULT_PORT = 6121
+
     def __init__(self, net: EmulatedNetwork, label: str, logdir: str, n: str,
-                 cca: str, certfile: str, keyfile: str, pep: bool=False):
+                 cca: str, certfile: str, keyfile: str, pep: bool=False,
+                 max_n: Optional[int]=None, port: Optional[int]=None):
         super().__init__(net, Protocol.GOOGLE_QUIC, label, logdir, n, cca,
-                         certfile, keyfile, pep)
+                         certfile, keyfile, pep, max_n, port)
 
-    def start_server(self, timeout: int=SETUP_TIMEOUT):
+    def server_cmd(self, n: int) -> str:
         base = 'deps/chromium/src'
-        cmd = f'./{base}/out/Default/quic_server '\
-              f'--certificate_file={self.certfile} '\
-              f'--key_file={self.keyfile} '\
-              f'--num_cached_bytes={self.n}'
-
-        condition = threading.Condition()
-        def notify_when_ready(line):
-            if 'Serving' in line:
-                with condition:
-                    condition.notify()
+        # Dynamic responses serve any data size requested in the URL path
+        return f'./{base}/out/Default/quic_server '\
+               f'--certificate_file={self.certfile} '\
+               f'--key_file={self.keyfile} '\
+               f'--port={self.port} '\
+               f'--generate_dynamic_responses'
 
-        # The start_server() function blocks until the server is ready to
-        # accept client requests. That is, when we observe the 'Serving'
-        # string in the server output.
-        logfile = self.logfile(self.server)
-        self.net.popen(self.server, cmd, background=True,
-            console_logger=DEBUG, logfile=logfile, func=notify_when_ready)
-        with condition:
-            notified = condition.wait(timeout=timeout)
-            if not notified:
-                raise TimeoutError(f'start_server timeout {timeout}s')
+    def server_ready(self, line: str) -> bool:
+        return 'Serving' in line
 
-    def run_client(self, timeout: Optional[int]=None) -> Optional[Tuple[int, float]]:
-        """Returns the status code and runtime (seconds) of the GET request.
-        """
+    def client_cmd(self) -> str:
         base = 'deps/chromium/src'
         cmd = f'./{base}/out/Default/quic_client '\
               f'--allow_unknown_root_cert '\
-              f'--host={self.server.IP()} --port=6121 '\
+              f'--host={self.server.IP()} --port={self.port} '\
               f'https://www.example.org/{self.n} '
 
         # Add the congestion control algorithm options
@@ -56,11 +48,17 @@ class GoogleQUICBenchmark(Benchmark):
             option = cca_to_option[self.cca]
             cmd += f'--client_connection_options={option} '
             cmd += f'--connection_options={option} '
+        return cmd
 
+    def parse_client_output(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
+        """Returns the status code and runtime (seconds) of the GET request.
+        """
         result = []
-        def parse_result(line):
+        for line in lines:
             if not line.startswith('[QUIC_CLIENT]'):
-                return
+                continue
             try:
                 line = line.split(' ')[1:]
                 line = [kv.split('=') for kv in line]
@@ -72,10 +70,6 @@ class GoogleQUICBenchmark(Benchmark):
             except:
                 pass
 
-        logfile = self.logfile(self.client)
-        timeout_flag = self.net.popen(self.client, cmd, background=False,
-            console_logger=DEBUG, logfile=logfile, func=parse_result,
-            timeout=timeout)
         if timeout_flag:
             return (HTTP_TIMEOUT_STATUSCODE, timeout)
         elif len(result) == 0:
@@ -1,6 +1,5 @@
 import re
-import threading
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 
 from benchmark import Benchmark
 from network import EmulatedNetwork
@@ -8,72 +7,66 @@ from common import *
 
 
 class PicoQUICBenchmark(Benchmark):
+    BINARIES = [
+        'deps/picoquic/picoquic_sample',
+    ]
+    RAISE_CLIENT_ERROR = False
+
+    # The sample server only serves the data size it was started with
+    SIZE_AGNOSTIC_SERVER = False
+    DEFAULT_PORT = 4433
+
     def __init__(
         self, net: EmulatedNetwork, label: str, logdir: str, n: str,
         cca: str, certfile: str, keyfile: str, pep: bool=False,
+        max_n: Optional[int]=None, port: Optional[int]=None,
     ):
         super().__init__(net, Protocol.PICOQUIC, label, logdir, n, cca,
-                         certfile, keyfile, pep)
+                         certfile, keyfile, pep, max_n, port)
 
-    def start_server(self, timeout: int=SETUP_TIMEOUT):
+    def server_cmd(self, n: int) -> str:
         base = 'deps/picoquic'
-        cmd = f'./{base}/picoquic_sample '\
-              f'server '\
-              f'4433 '\
-              f'{self.certfile} '\
-              f'{self.keyfile} '\
-              f'. '\
-              f'{self.n} '\
-              f'{self.cca}'
+        return f'./{base}/picoquic_sample '\
+               f'server '\
+               f'{self.port} '\
+               f'{self.certfile} '\
+               f'{self.keyfile} '\
+               f'. '\
+               f'{n} '\
+               f'{self.cca}'
 
-        condition = threading.Condition()
-        def notify_when_ready(line):
-            if line.startswith('Serving'):
-                with condition:
-                    condition.notify()
+    def server_ready(self, line: str) -> bool:
+        return line.startswith('Serving')
 
-        # The start_server() function blocks until the server is ready to
-        # accept client requests. That is, when we observe the 'Serving'
-        # string in the server output.
-        logfile = self.logfile(self.server)
-        self.net.popen(self.server, cmd, background=True,
-            console_logger=DEBUG, logfile=logfile, func=notify_when_ready)
-        with condition:
-            notified = condition.wait(timeout=timeout)
-            if not notified:
-                raise TimeoutError(f'start_server timeout {timeout}s')
+    def client_cmd(self) -> str:
+        base = 'deps/picoquic'
+        return f'./{base}/picoquic_sample '\
+               f'client '\
+               f'{self.server.IP()} '\
+               f'{self.port} '\
+               f'/tmp '\
+               f'{self.cca} '\
+               f'{self.n}.html '
 
-    def run_client(self, timeout: Optional[int]=None) -> Optional[Tuple[int, float]]:
+    def parse_client_output(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
         """Returns the status code and runtime (seconds) of the GET request.
         """
-        base = 'deps/picoquic'
-        cmd = f'./{base}/picoquic_sample '\
-              f'client '\
-              f'{self.server.IP()} '\
-              f'4433 '\
-              f'/tmp '\
-              f'{self.cca} '\
-              f'{self.n}.html '
-
         result = []
-        def parse_result(line):
+        for line in lines:
             pattern = r'complete.*in ([\d.]+) seconds'
             match = re.search(pattern, line)
             if match is None:
-                return
+                continue
             time_s = float(match.group(1))
             result.append(time_s)
 
-        logfile = self.logfile(self.client)
-        timeout_flag = self.net.popen(self.client, cmd, background=False,
-            console_logger=DEBUG, logfile=logfile, func=parse_result,
-            timeout=timeout, raise_error=False)
-
         if len(result) == 0:
             WARN('PicoQUIC client failed to return result')
         elif len(result) > 1:
             WARN(f'PicoQUIC client returned multiple results {result}')
         elif timeout_flag:
-            return HTTPClientOutput(HTTP_TIMEOUT_STATUSCODE, timeout)
+            return (HTTP_TIMEOUT_STATUSCODE, timeout)
         else:
             return (HTTP_OK_STATUSCODE, result[0])
@@ -1,50 +1,247 @@
-import threading
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from benchmark import Benchmark
+from capabilities import get_capabilities
 from network import EmulatedNetwork
+from result import BenchmarkResult
 from common import *
 
+# The phases of the GET request reported by the client, in order
+PHASES = ['connect_s', 'tls_s', 'request_s', 'first_byte_s', 'last_byte_s']
+
+# How the requests of a trial reuse connections, see LinuxTCPBenchmark
+REUSE_MODES = ['none', 'keepalive', 'resume']
+
+# The hosts whose congestion control algorithm can be set separately: the
+# client, the router running the PEP, and the server
+HOST_CCA_HOSTS = ['h1', 'r1', 'h2']
+
+# The socket options of the server and client: SO_SNDBUF, SO_RCVBUF, and
+# TCP_NOTSENT_LOWAT
+SOCKET_OPTIONS = ['sndbuf', 'rcvbuf', 'notsent_lowat']
+
 
 class LinuxTCPBenchmark(Benchmark):
+    BINARIES = [
+        'webserver/http_server.py',
+        'webserver/http_client.py',
+    ]
+    DEFAULT_PORT = 8443
+
     def __init__(self, net: EmulatedNetwork, label: str, logdir: str, n: str,
-                 cca: str, certfile: str, keyfile: str, pep: bool=False):
+                 cca: str, certfile: str, keyfile: str, pep: bool=False,
+                 max_n: Optional[int]=None, port: Optional[int]=None,
+                 tls: bool=True, workers: int=1, agent: bool=False,
+                 requests: int=1, reuse: str='none', fastopen: bool=False,
+                 host_ccas: Optional[Dict[str, str]]=None,
+                 socket_options: Optional[Dict[str, int]]=None,
+                 set_cca: bool=True):
+        """See Benchmark. If not <tls>, the server and client use plain HTTP
+        over TCP, e.g., to tell whether TLS limits the rate. The server runs
+        <workers> processes that share the port with SO_REUSEPORT, and is only
+        ready once every worker is listening. If <agent>, the requests of
+        every trial are executed by a client agent on the h1 host, so that
+        the client does not start a new interpreter for each trial.
+
+        Each trial sends <requests> GET requests, which are reported per
+        request. If <reuse> is 'keepalive', the requests share one connection,
+        and if 'resume', each request opens a new connection that resumes the
+        TLS session of the previous one. The trial reports the first request.
+
+        If <fastopen>, TCP Fast Open is enabled on every host, and the server
+        and client use TCP Fast Open sockets. Each trial reports whether the
+        first connection of the client sent data in its SYN, and the change in
+        the TCP Fast Open counters of each host, e.g., of the PEP on r1.
+
+        The <cca> is the congestion control algorithm of every host, unless
+        <host_ccas> maps a host in HOST_CCA_HOSTS to another algorithm. With
+        the PEP, the sender of the far segment is h2 and that of the near
+        segment is r1, so e.g. {'h2': 'bbr', 'r1': 'cubic'} runs BBR on the
+        far segment and CUBIC on the near one.
+        If not <set_cca>, the algorithms of the hosts are left unchanged,
+        e.g., if the caller sets them once for several benchmarks, and only
+        the server socket uses the algorithm of h2.
+
+        If provided, <socket_options> maps a socket option in SOCKET_OPTIONS
+        to the value, in bytes, that the server and client set on their
+        sockets, e.g., {'sndbuf': 4000000}.
+        """
+        socket_options = socket_options or {}
+        for option in socket_options:
+            if option not in SOCKET_OPTIONS:
+                raise ValueError(f'invalid socket option {option}')
+        host_ccas = host_ccas or {}
+        for name in host_ccas:
+            if name not in HOST_CCA_HOSTS or not hasattr(net, name):
+                raise ValueError(f'invalid CCA host {name}')
+        if reuse not in REUSE_MODES:
+            raise ValueError(f'invalid reuse {reuse}')
+        if reuse == 'resume' and not tls:
+            raise ValueError('TLS session resumption requires TLS')
         super().__init__(net, Protocol.LINUX_TCP, label, logdir, n, cca,
-                         certfile, keyfile, pep)
-        net.set_tcp_congestion_control(cca)
-
-    def start_server(self, timeout: int=SETUP_TIMEOUT):
-        cmd = f'python3 -u webserver/http_server.py --server-ip {self.server.IP()} '\
-              f'--certfile {self.certfile} --keyfile {self.keyfile} '\
-              f'-n {self.n}'
-
-        condition = threading.Condition()
-        def notify_when_ready(line):
-            if 'Serving' in line:
-                with condition:
-                    condition.notify()
-
-        # The start_server() function blocks until the server is ready to
-        # accept client requests. That is, when we observe the 'Serving'
-        # string in the server output.
-        logfile = self.logfile(self.server)
-        self.net.popen(self.server, cmd, background=True,
-            console_logger=DEBUG, logfile=logfile, func=notify_when_ready)
-        with condition:
-            notified = condition.wait(timeout=timeout)
-            if not notified:
-                raise TimeoutError(f'start_server timeout {timeout}s')
-
-    def run_client(self, timeout: Optional[int]=None) -> Optional[Tuple[int, float]]:
-        """Returns the status code and runtime (seconds) of the GET request.
+                         certfile, keyfile, pep, max_n, port)
+        self.tls = tls
+        self.workers = workers
+        self.agent = agent
+        self.requests = requests
+        self.reuse = reuse
+        self.fastopen = fastopen
+        self.socket_options = socket_options
+        self.client_fastopen = None
+        self.fastopen_counters = None
+        self.host_ccas = {name: host_ccas.get(name, cca)
+                          for name in HOST_CCA_HOSTS if hasattr(net, name)}
+        for host_cca in set(self.host_ccas.values()):
+            get_capabilities().require(cca=host_cca)
+        if set_cca:
+            net.set_tcp_congestion_control(cca, self.host_ccas)
+        if fastopen:
+            net.set_tcp_fastopen(True)
+
+    def server_cmd(self, n: int) -> str:
+        return f'python3 -u webserver/http_server.py --server-ip {self.server.IP()} '\
+               f'--server-port {self.port} --cca {self.host_ccas["h2"]} '\
+               f'--certfile {self.certfile} --keyfile {self.keyfile} '\
+               f'-n {n} --workers {self.workers}'\
+               f'{"" if self.tls else " --no-tls"}'\
+               f'{" --fastopen" if self.fastopen else ""}'\
+               f'{self._socket_option_args()}'
+
+    def server_ready(self, line: str) -> bool:
+        return 'Serving' in line
+
+    def client_cmd(self) -> str:
+        return f'python3 webserver/http_client.py {self.client_agent_request()}'
+
+    def client_agent_cmd(self) -> Optional[str]:
+        if not self.agent:
+            return None
+        return 'python3 -u webserver/http_client.py --agent'
+
+    def client_agent_request(self) -> str:
+        return f'--server-ip {self.server.IP()} --server-port {self.port} '\
+               f'-n {self.n} --requests {self.requests} --reuse {self.reuse}'\
+               f'{"" if self.tls else " --no-tls"}'\
+               f'{" --fastopen" if self.fastopen else ""}'\
+               f'{self._socket_option_args()}'
+
+    def _socket_option_args(self) -> str:
+        return ''.join(f' --{option.replace("_", "-")} {value}'
+                       for option, value in self.socket_options.items())
+
+    def _new_result(self) -> BenchmarkResult:
+        result = super()._new_result()
+        result.inputs['tls'] = self.tls
+        result.inputs['requests'] = self.requests
+        result.inputs['reuse'] = self.reuse
+        result.inputs['fastopen'] = self.fastopen
+        result.inputs['ccas'] = self.host_ccas
+        result.inputs.update(self.socket_options)
+        return result
+
+    def _start_trial(
+        self, result: BenchmarkResult, timeline_interval: Optional[float],
+        qdisc_interval: Optional[float],
+    ):
+        super()._start_trial(result, timeline_interval, qdisc_interval)
+        self.client_fastopen = None
+        if self.fastopen:
+            self.fastopen_counters = self.net.read_tcp_counters(
+                self.net.TCP_FASTOPEN_COUNTERS)
+
+    def _parse_client(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
+        for kvs in self._client_lines(lines)[:1]:
+            if 'tfo' in kvs:
+                self.client_fastopen = kvs['tfo'] == '1'
+        return super()._parse_client(lines, timeout_flag, timeout)
+
+    def _end_trial(
+        self, result: BenchmarkResult, output: Optional[Tuple[int, float]],
+        network_statistics: bool,
+    ):
+        super()._end_trial(result, output, network_statistics)
+        if not self.fastopen:
+            return
+        counters = self.net.read_tcp_counters(self.net.TCP_FASTOPEN_COUNTERS)
+        for host, values in counters.items():
+            for counter in values:
+                values[counter] -= self.fastopen_counters[host][counter]
+        result.set_fastopen(self.client_fastopen, counters)
+
+    def _client_lines(self, lines: List[str]) -> List[Dict[str, str]]:
+        """The key-value pairs of each [TCP_CLIENT] line, i.e., request.
+        """
+        requests = []
+        for line in lines:
+            if not line.startswith('[TCP_CLIENT]'):
+                continue
+            requests.append(dict(kv.split('=', 1) for kv in line.split()[1:]
+                                 if '=' in kv))
+        return requests
+
+    def parse_client_progress(self, lines: List[str]) -> Optional[Dict]:
+        """Returns the time to first byte, the times to receive 50%, 90%, and
+        100% of the body (seconds), and the throughput (Mbit/s) of each
+        checkpoint interval of the GET request.
         """
-        cmd = f'python3 webserver/http_client.py --server-ip {self.server.IP()} '\
-              f'-n {self.n}'
+        for kvs in self._client_lines(lines)[:1]:
+            if 'ttfb_s' not in kvs:
+                continue
+            progress = {}
+            for key in ['ttfb_s', 't50_s', 't90_s', 't100_s', 'interval_s']:
+                if key in kvs:
+                    progress[key] = float(kvs[key])
+            throughputs = kvs.get('throughput_mbps', '')
+            progress['throughput_mbps'] = \
+                [float(value) for value in throughputs.split(',') if value]
+            return progress
 
+    def parse_client_phases(self, lines: List[str]) -> Optional[Dict]:
+        """Returns the times (seconds) of the TCP connect, the TLS handshake
+        unless TLS is disabled, the sent request, the first body byte, and the
+        last byte of the first GET request.
+        """
+        for kvs in self._client_lines(lines)[:1]:
+            phases = {key: float(kvs[key]) for key in PHASES if key in kvs}
+            if len(phases) > 0:
+                return phases
+
+    def parse_client_requests(self, lines: List[str]) -> Optional[List[Dict]]:
+        """Returns the status code, runtime and phase times (seconds), and
+        whether the TLS session was resumed and the connection used TCP Fast
+        Open, of each GET request, if the trial sends more than one request.
+        """
+        if self.requests == 1:
+            return None
+        requests = []
+        for kvs in self._client_lines(lines):
+            try:
+                request = {
+                    'request': int(kvs['request']),
+                    'status_code': int(kvs['status_code']),
+                    'time_s': float(kvs['time_s']),
+                    'resumed': kvs.get('resumed') == '1',
+                    'tfo': kvs.get('tfo') == '1',
+                }
+                request.update({key: float(kvs[key]) for key in PHASES
+                                if key in kvs})
+                requests.append(request)
+            except (KeyError, ValueError):
+                pass
+        return requests
+
+    def parse_client_output(
+        self, lines: List[str], timeout_flag: bool, timeout: Optional[int],
+    ) -> Optional[Tuple[int, float]]:
+        """Returns the status code and runtime (seconds) of the first GET
+        request. The status code is not OK if any request is not OK.
+        """
         result = []
-        def parse_result(line):
+        for line in lines:
             if not line.startswith('[TCP_CLIENT]'):
-                return
+                continue
             try:
                 line = line.split(' ')[1:]
                 line = [kv.split('=') for kv in line]
@@ -56,15 +253,15 @@ class LinuxTCPBenchmark(Benchmark):
             except:
                 pass
 
-        logfile = self.logfile(self.client)
-        timeout_flag = self.net.popen(self.client, cmd, background=False,
-            console_logger=DEBUG, logfile=logfile, func=parse_result,
-            timeout=timeout)
         if timeout_flag:
             return (HTTP_TIMEOUT_STATUSCODE, timeout)
         elif len(result) == 0:
             WARN('TCP client failed to return result')
-        elif len(result) > 1:
-            WARN(f'TCP client returned multiple results {result}')
+        elif len(result) != self.requests:
+            WARN(f'TCP client returned {len(result)} results for '\
+                 f'{self.requests} requests {result}')
         else:
+            for status_code, _ in result:
+                if status_code != HTTP_OK_STATUSCODE:
+                    return (status_code, result[0][1])
             return result[0]
@@ -0,0 +1,261 @@
+"""
+Probe the capabilities of the host once per boot, i.e., the kernel version,
+the available congestion control algorithms and qdiscs, ethtool offload
+support, and the benchmark binaries, and persist them to a cache file. Use
+get_capabilities() to read the capabilities and Capabilities.require() to fail
+fast before starting the network when a capability is missing.
+
+The cache is only trusted if it is owned by the current user and not writable
+by others, since experiments run as root. A capability missing from the cache
+is probed again before it fails, e.g., a CCA module or a tool installed since
+boot.
+"""
+import json
+import os
+import platform
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+from common import *
+
+# The cache is in a directory that only root can write when run as root
+if os.geteuid() == 0:
+    CAPABILITIES_CACHE = '/var/cache/atc25/capabilities.json'
+else:
+    CAPABILITIES_CACHE = os.path.expanduser('~/.cache/atc25/capabilities.json')
+
+# Map from the --qdisc option to the kernel modules it requires, in addition
+# to netem and htb which are required by every emulator node.
+QDISC_MODULES = {
+    'red': ['sch_red'],
+    'bfifo-large': [],
+    'bfifo-small': [],
+    'pie': ['sch_pie'],
+    'codel': ['sch_codel'],
+    'fq_codel': ['sch_fq_codel'],
+    'policer': ['act_police', 'cls_u32'],
+}
+EMULATOR_MODULES = ['sch_netem', 'sch_htb']
+
+# Commands executed by the network, in addition to the benchmark binaries.
+TOOLS = ['tc', 'ethtool', 'pepsal']
+
+_capabilities = None
+
+
+def read_boot_id() -> str:
+    with open('/proc/sys/kernel/random/boot_id') as f:
+        return f.read().strip()
+
+def probe_ccas() -> List[str]:
+    """The congestion control algorithms currently available to TCP.
+    """
+    path = '/proc/sys/net/ipv4/tcp_available_congestion_control'
+    try:
+        with open(path) as f:
+            return f.read().split()
+    except OSError:
+        return []
+
+def probe_kernel_modules(release: str) -> Optional[List[str]]:
+    """The names of the kernel modules that are built in, loaded, or loadable
+    from /lib/modules/<release>. Returns None if the modules of the kernel are
+    unknown, e.g., in a container without /lib/modules.
+    """
+    modules = set()
+    if os.path.isdir('/sys/module'):
+        modules.update(os.listdir('/sys/module'))
+    base = f'/lib/modules/{release}'
+    if not os.path.isdir(base):
+        return None
+    try:
+        with open(f'{base}/modules.builtin') as f:
+            for line in f:
+                modules.add(os.path.basename(line.strip()).split('.')[0])
+    except OSError:
+        pass
+    for _, _, filenames in os.walk(f'{base}/kernel/net'):
+        for filename in filenames:
+            if '.ko' in filename:
+                modules.add(filename.split('.')[0])
+    return list(sorted(module.replace('-', '_') for module in modules))
+
+def probe_offloads() -> Dict[str, bool]:
+    """Whether TSO and GSO can be changed with ethtool, on the loopback
+    interface of the host.
+    """
+    offloads = {}
+    if shutil.which('ethtool') is None:
+        return offloads
+    proc = subprocess.run(['ethtool', '-k', 'lo'], capture_output=True,
+                          text=True)
+    features = {
+        'tcp-segmentation-offload': 'tso',
+        'generic-segmentation-offload': 'gso',
+    }
+    for line in proc.stdout.splitlines():
+        feature = line.split(':')[0].strip()
+        if feature in features:
+            offloads[features[feature]] = '[fixed]' not in line
+    return offloads
+
+def probe() -> Dict:
+    release = platform.release()
+    return {
+        'boot_id': read_boot_id(),
+        'kernel_release': release,
+        'linux_version': get_linux_version(),
+        'ccas': probe_ccas(),
+        'kernel_modules': probe_kernel_modules(release),
+        'offloads': probe_offloads(),
+        'tools': { tool: shutil.which(tool) is not None for tool in TOOLS },
+        'binaries': {},
+    }
+
+
+class Capabilities:
+    def __init__(self, data: Dict, path: Optional[str]=None,
+                 probed: bool=False):
+        """The probed capabilities <data>, persisted to the cache file <path>
+        when updated. Unless <probed>, i.e., the data was just probed, the data
+        of a cache file is probed again if a required capability is missing.
+        """
+        self.data = data
+        self.path = path
+        self.probed = probed
+
+    @property
+    def linux_version(self) -> float:
+        return self.data['linux_version']
+
+    def has_cca(self, cca: str) -> bool:
+        """Whether the kernel TCP congestion control algorithm is available or
+        can be loaded as a module on demand.
+        """
+        if cca in self.data['ccas']:
+            return True
+        modules = self.data['kernel_modules']
+        return modules is None or f'tcp_{cca}' in modules
+
+    def has_modules(self, modules: List[str]) -> bool:
+        """Whether the kernel modules are available. Assumes they are if the
+        kernel modules are unknown.
+        """
+        if self.data['kernel_modules'] is None:
+            return True
+        return all(module in self.data['kernel_modules'] for module in modules)
+
+    def has_qdisc(self, qdisc: Optional[str]) -> bool:
+        if qdisc is not None and qdisc not in QDISC_MODULES:
+            return False
+        modules = list(EMULATOR_MODULES)
+        if qdisc is not None:
+            modules.extend(QDISC_MODULES[qdisc])
+        return self.has_modules(modules)
+
+    def has_tool(self, tool: str) -> bool:
+        return self.data['tools'].get(tool, False)
+
+    def has_binary(self, path: str) -> bool:
+        """Whether the binary exists, relative to the base repo. Binaries that
+        were missing are probed again in case they have since been built.
+        """
+        if not self.data['binaries'].get(path, False):
+            self.data['binaries'][path] = os.path.exists(path)
+            self.save()
+        return self.data['binaries'][path]
+
+    def require(self, binaries: List[str]=[], cca: Optional[str]=None,
+                qdisc: Optional[str]=None, pep: bool=False):
+        """Checks that the capabilities required by an experiment exist.
+
+        Parameters:
+        - binaries: Paths to the benchmark binaries.
+        - cca: If provided, the kernel TCP congestion control algorithm.
+        - qdisc: If provided, the queue management at the emulator nodes.
+        - pep: Whether the TCP PEP is required.
+
+        Raises:
+        - RuntimeError listing every missing capability.
+        """
+        missing = self._missing(binaries, cca, qdisc, pep)
+        if len(missing) > 0 and self.path is not None and not self.probed:
+            DEBUG(f'probing host capabilities, missing {", ".join(missing)}')
+            self.data = probe()
+            self.probed = True
+            self.save()
+            missing = self._missing(binaries, cca, qdisc, pep)
+        if len(missing) > 0:
+            raise RuntimeError(f'missing capabilities: {", ".join(missing)}')
+
+    def _missing(self, binaries: List[str], cca: Optional[str],
+                 qdisc: Optional[str], pep: bool) -> List[str]:
+        missing = []
+        missing.extend(f'binary {path}' for path in binaries
+                       if not self.has_binary(path))
+        if not self.has_tool('tc'):
+            missing.append('tool tc')
+        if pep and not self.has_tool('pepsal'):
+            missing.append('tool pepsal')
+        if cca is not None and not self.has_cca(cca):
+            missing.append(f'congestion control {cca}')
+        if not self.has_qdisc(qdisc):
+            missing.append(f'qdisc {qdisc}')
+        return missing
+
+    def save(self):
+        if self.path is None:
+            return
+        dirname = os.path.dirname(self.path)
+        try:
+            os.makedirs(dirname, mode=0o755, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=dirname,
+                                             delete=False) as f:
+                json.dump(self.data, f)
+            os.chmod(f.name, 0o644)
+            os.replace(f.name, self.path)
+        except OSError as e:
+            WARN(f'failed to write capabilities cache {self.path}: {e}')
+
+
+def read_cache(path: str) -> Optional[Dict]:
+    """Reads the cache file if it is owned by the current user and not
+    writable by the group or others. Returns None otherwise.
+    """
+    with open(path) as f:
+        st = os.fstat(f.fileno())
+        if st.st_uid != os.geteuid() or st.st_mode & 0o022:
+            WARN(f'ignoring untrusted capabilities cache {path}')
+            return None
+        return json.load(f)
+
+
+def get_capabilities(path: str=CAPABILITIES_CACHE,
+                     refresh: bool=False) -> Capabilities:
+    """Returns the capabilities of the host, probing the host only if the
+    cache file does not exist, is not trusted, or is from a previous boot.
+
+    Parameters:
+    - path: Path to the cache file.
+    - refresh: Whether to probe the host even if the cache is valid.
+    """
+    global _capabilities
+    if _capabilities is not None and _capabilities.path == path and \
+            not refresh:
+        return _capabilities
+
+    data = None
+    if not refresh:
+        try:
+            data = read_cache(path)
+            if data is not None and data.get('boot_id') != read_boot_id():
+                data = None
+        except (OSError, ValueError):
+            data = None
+    _capabilities = Capabilities(data, path, probed=data is None)
+    if data is None:
+        DEBUG('probing host capabilities')
+        _capabilities.data = probe()
+        _capabilities.save()
+    return _capabilities
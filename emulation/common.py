@@ -1,10 +1,14 @@
+import json
 import os
-import select
+import platform
+import selectors
 import sys
 import subprocess
 import re
 from enum import Enum
 
+from logsink import LOG_SINK
+
 SERVER_LOGFILE = 'server.log'
 CLIENT_LOGFILE = 'client.log'
 ROUTER_LOGFILE = 'router.log'
@@ -47,11 +51,31 @@ def mac(digit):
     assert 0 <= digit < 10
     return f'00:00:00:00:00:0{int(digit)}'
 
-def calculate_bdp(delay1, delay2, bw1, bw2):
-    rtt_ms = 2 * (delay1 + delay2)
-    bw_mbps = min(bw1, bw2)
+def calculate_rtt(delays):
+    """The round-trip time, in ms, over segments with the one-way delays,
+    in ms.
+    """
+    return 2 * sum(delays)
+
+def calculate_bdp(delays, bws):
+    """The bandwidth-delay product, in bytes, over segments with the one-way
+    delays, in ms, at the bandwidth of the bottleneck segment, in Mbit/s.
+    """
+    rtt_ms = calculate_rtt(delays)
+    bw_mbps = min(bws)
     return rtt_ms * bw_mbps * 1000000. / 1000. / 8.
 
+def jain_fairness_index(values):
+    """Jain's fairness index of the values, e.g., the throughputs of
+    concurrent flows. Ranges from 1/n, when one flow gets everything, to 1,
+    when every flow gets an equal share.
+    """
+    assert len(values) > 0
+    squares = sum(value * value for value in values)
+    if squares == 0:
+        return 1.
+    return sum(values) ** 2 / (len(values) * squares)
+
 def parse_data_size(n):
     try:
         multiplier = 1
@@ -67,45 +91,136 @@ def parse_data_size(n):
     except Exception:
         raise ValueError(f'invalid data size {n}')
 
+def parse_tcp_mem(value):
+    """Parse the TCP buffer sizes <min>,<default>,<max> in bytes, e.g.,
+    4096,131072,6M, of the tcp_rmem and tcp_wmem sysctls into a list.
+    """
+    sizes = [parse_data_size(size) for size in value.split(',')]
+    if len(sizes) != 3 or sizes != sorted(sizes):
+        raise ValueError(f'invalid TCP buffer sizes {value}')
+    return sizes
+
+def parse_proc_net_dev(text):
+    """Parse the interface statistics in /proc/<pid>/net/dev, which has the
+    same counters as /sys/class/net/<iface>/statistics/<metric> for every
+    interface in the network namespace of <pid>.
+
+    Returns a map from interface name -> metric -> value, for the metrics
+    rx_bytes, rx_packets, tx_bytes, and tx_packets.
+    """
+    stats = {}
+    for line in text.splitlines()[2:]:
+        if ':' not in line:
+            continue
+        iface, values = line.split(':', 1)
+        values = values.split()
+        stats[iface.strip()] = {
+            'rx_bytes': int(values[0]),
+            'rx_packets': int(values[1]),
+            'tx_bytes': int(values[8]),
+            'tx_packets': int(values[9]),
+        }
+    return stats
+
+def parse_proc_net_netstat(text):
+    """Parse the extended protocol counters in /proc/<pid>/net/netstat, e.g.,
+    the TcpExt counters of the network namespace of <pid>. Each protocol has a
+    line of counter names followed by a line of values.
+
+    Returns a map from protocol, e.g., 'TcpExt' -> counter name -> value.
+    """
+    stats = {}
+    lines = text.splitlines()
+    for names, values in zip(lines[0::2], lines[1::2]):
+        protocol, names = names.split(':', 1)
+        _, values = values.split(':', 1)
+        stats[protocol] = {
+            name: int(value) for name, value in
+            zip(names.split(), values.split())
+        }
+    return stats
+
+def parse_tc_qdisc_stats(text):
+    """Parse the qdisc statistics in the output of `tc -s -j qdisc show`.
+
+    Returns a map from (interface name, qdisc handle) -> metric -> value, for
+    the metrics backlog (in bytes), drops, overlimits, and marks. Marks are
+    the packets ECN-marked by RED, PIE, CoDel, or FQ-CoDel, and 0 for every
+    other qdisc.
+    """
+    stats = {}
+    for qdisc in json.loads(text):
+        marks = qdisc.get('marked', qdisc.get('ecn_mark', 0))
+        stats[(qdisc['dev'], qdisc['handle'])] = {
+            'backlog': qdisc.get('backlog', 0),
+            'drops': qdisc.get('drops', 0),
+            'overlimits': qdisc.get('overlimits', 0),
+            'marks': marks,
+        }
+    return stats
+
 def init_logdir(path):
+    LOG_SINK.close(path)
     os.system(f'mkdir -p {path}')
     os.system(f'rm -f {path}/*')
 
+# Maximum number of bytes read from a pipe at a time
+PIPE_READ_SIZE = 65536
+
+class LineReader:
+    def __init__(self):
+        """Splits the bytes read from a pipe into lines incrementally. Lines
+        are decoded as UTF-8 and keep their line endings.
+        """
+        self.buffer = b''
+
+    def feed(self, data: bytes):
+        """Returns the complete lines after appending <data> to the buffer,
+        or the remaining partial line if <data> is empty, i.e., on EOF.
+        """
+        if not data:
+            line, self.buffer = self.buffer, b''
+            return [line.decode('utf-8', errors='replace')] if line else []
+        self.buffer += data
+        i = self.buffer.rfind(b'\n')
+        if i < 0:
+            return []
+        text = self.buffer[:i + 1].decode('utf-8', errors='replace')
+        self.buffer = self.buffer[i + 1:]
+        return [line + '\n' for line in text.split('\n')[:-1]]
+
+def read_pipe(fd: int) -> bytes:
+    """Non-blocking read from the pipe <fd>. Returns b'' on EOF and None if
+    there is no data to read.
+    """
+    try:
+        return os.read(fd, PIPE_READ_SIZE)
+    except BlockingIOError:
+        return None
+
 def read_subprocess_pipe(p):
-    streams = [p.stdout, p.stderr]
-    while p.poll() is None:
-        ready, _, _ = select.select(streams, [], [])
-        for stream in ready:
-            while True:
-                line = stream.readline()
-                if not line:
-                    break
-                yield (line, stream)
-    for stream in streams:
-        for line in stream.readlines():
-            yield (line, stream)
-    stdout, stderr = p.communicate()
-    for line in stdout.splitlines(keepends=True):
-        yield (line, p.stdout)
-    for line in stderr.splitlines(keepends=True):
-        yield (line, p.stderr)
-
-def handle_background_process(p, logfile, func):
-    # Only call the callback function
-    if logfile is None:
-        for line, _ in read_subprocess_pipe(p):
-            if func is not None:
-                func(line)
-        return
-
-    # Both write to the logfile and call the callback function
-    for line, _ in read_subprocess_pipe(p):
-        if func is not None:
-            func(line)
-        with open(logfile, 'a') as f:
-            f.write(line)
+    """Yields (line, stream) for every line of stdout and stderr of the
+    process <p> in the order the lines are read, until both streams are
+    closed. Neither stream blocks the other.
+    """
+    with selectors.DefaultSelector() as selector:
+        for stream in [p.stdout, p.stderr]:
+            os.set_blocking(stream.fileno(), False)
+            selector.register(stream, selectors.EVENT_READ, LineReader())
+        while len(selector.get_map()) > 0:
+            for key, _ in selector.select():
+                data = read_pipe(key.fd)
+                if data is None:
+                    continue
+                for line in key.data.feed(data):
+                    yield (line, key.fileobj)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
 
 def get_linux_version():
-    proc = subprocess.run(['uname', '-r'], capture_output=True, text=True, check=True)
-    version = proc.stdout.strip()
+    """The major and minor version of the running kernel, e.g., 5.15. Use
+    the cached value in capabilities.py instead of calling this directly.
+    """
+    version = platform.release()
     return float(re.search(r'^\d+\.\d+', version).group())
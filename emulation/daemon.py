@@ -0,0 +1,330 @@
+"""
+Long-lived emulation service that keeps mininet imported and the network
+built between experiments. Experiment jobs are submitted as JSON lines over a
+Unix socket and the BenchmarkResult of each job is written back as a JSON line.
+Use the EmulationClient in daemon_client.py to submit jobs.
+
+    sudo -E python3 emulation/daemon.py --socket /tmp/atc25-emulation.sock
+
+The network is reconfigured in place between jobs, and is only rebuilt if the
+topology or the pacing requirement of the endpoints changes.
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import signal
+import socket
+import threading
+
+from common import *
+from network import *
+from benchmark import *
+from daemon_client import DEFAULT_SOCKET
+from mininet.log import setLogLevel
+
+# Map from protocol name to the benchmark constructor and default SSL keyfile,
+# matching the subcommands in main.py.
+PROTOCOLS = {
+    'tcp': (LinuxTCPBenchmark, DEFAULT_SSL_KEYFILE),
+    'google': (GoogleQUICBenchmark, DEFAULT_SSL_KEYFILE_GOOGLE),
+    'cloudflare': (CloudflareQUICBenchmark, DEFAULT_SSL_KEYFILE),
+    'picoquic': (PicoQUICBenchmark, DEFAULT_SSL_KEYFILE),
+}
+
+# Default network settings, matching the defaults in main.py.
+DEFAULT_NETWORK = {
+    'delay1': 1,
+    'delay2': 25,
+    'loss1': '1',
+    'loss2': '0',
+    'bw1': 100,
+    'bw2': 10,
+    'qdisc': 'red',
+}
+
+
+# Optional network settings of the TCP buffer sysctls of each host, e.g.,
+# tcp_rmem_r1='4K,128K,6M', and of the socket options of the Linux TCP
+# endpoints, matching the options in main.py.
+TCP_BUFFER_SETTINGS = [f'{sysctl}_{host}' for sysctl in ['tcp_rmem', 'tcp_wmem']
+                       for host in ['h1', 'r1', 'h2']]
+SOCKET_OPTION_SETTINGS = ['sndbuf', 'rcvbuf', 'notsent_lowat']
+
+
+class Job:
+    def __init__(self, job_id: int, job: dict, conn: socket.socket,
+                 lock: threading.Lock):
+        """An experiment job submitted on the connection <conn>. Replies are
+        written to the connection while holding the connection <lock>.
+
+        Raises:
+        - ValueError if the job is invalid.
+        """
+        self.id = job_id
+        self.conn = conn
+        self.lock = lock
+        self.done = threading.Event()
+
+        protocol = job.get('protocol')
+        if protocol not in PROTOCOLS:
+            raise ValueError(f'invalid protocol {protocol}')
+        self.protocol = protocol
+        self.cca = str(job.get('cca', 'cubic'))
+        if re.match(r'^\w+$', self.cca) is None:
+            raise ValueError(f'invalid cca {self.cca}')
+        self.label = str(job.get('label', 'NO_LABEL'))
+        if re.match(r'^[\w.-]+$', self.label) is None:
+            raise ValueError(f'invalid label {self.label}')
+        self.pep = bool(job.get('pep', False))
+        self.n = int(job.get('n', 10000))
+        self.max_n = job.get('max_n')
+        if self.max_n is not None:
+            self.max_n = int(self.max_n)
+        self.trials = int(job.get('trials', 1))
+        self.timeout = job.get('timeout')
+        if self.timeout is not None:
+            self.timeout = int(self.timeout)
+        self.network_statistics = bool(job.get('network_statistics', False))
+
+        network = dict(job.get('network', {}))
+        self.topology = network.pop('topology', 'two_segment')
+        if self.topology not in ['direct', 'two_segment']:
+            raise ValueError(f'invalid topology {self.topology}')
+        if self.topology == 'direct' and self.pep:
+            raise ValueError('cannot start a PEP in a direct network')
+        self.network = {}
+        self.tcp_buffers = {}
+        self.socket_options = {}
+        for key, value in network.items():
+            if key not in DEFAULT_NETWORK and key not in TCP_BUFFER_SETTINGS \
+                    and key not in SOCKET_OPTION_SETTINGS:
+                raise ValueError(f'unknown network setting {key}')
+            if value is None:
+                continue
+            if key in TCP_BUFFER_SETTINGS:
+                sysctl, host = key.rsplit('_', 1)
+                if self.topology == 'direct' and host == 'r1':
+                    raise ValueError('the direct topology does not have an '\
+                                     'r1 host')
+                self.tcp_buffers.setdefault(sysctl, {})[host] = \
+                    parse_tcp_mem(str(value))
+            elif key in SOCKET_OPTION_SETTINGS:
+                if protocol != 'tcp':
+                    raise ValueError(f'{key} requires the tcp protocol')
+                self.socket_options[key] = parse_data_size(str(value))
+            elif key == 'qdisc':
+                self.network[key] = str(value)
+            elif key.startswith('loss'):
+                float(value)
+                self.network[key] = str(value)
+            else:
+                self.network[key] = int(value)
+
+        # Some BBR implementations require pacing, see main.py.
+        self.pacing = protocol == 'cloudflare' and 'bbr' in self.cca
+
+    def reply(self, data: dict):
+        data['id'] = self.id
+        line = json.dumps(data).encode('utf-8') + b'\n'
+        with self.lock:
+            try:
+                self.conn.sendall(line)
+            except OSError as e:
+                WARN(f'job {self.id} client disconnected: {e}')
+        self.done.set()
+
+
+class EmulationDaemon:
+    def __init__(self, socket_path: str, logdir: str, socket_mode: int=0o600,
+                 config_backend: str='popen'):
+        """Parameters:
+        - socket_path: Path to the Unix socket to listen on.
+        - logdir: Directory where host logs are written, reinitialized for
+          every job.
+        - socket_mode: File permissions of the Unix socket.
+        - config_backend: The configuration backend of the network.
+        """
+        self.socket_path = socket_path
+        self.socket_mode = socket_mode
+        self.logdir = logdir
+        self.config_backend = config_backend
+        self.jobs = queue.Queue()
+
+        # The currently built network and its configuration
+        self.net = None
+        self.topology = None
+        self.pacing = None
+        self.pep = False
+
+    def serve_forever(self):
+        """Accepts connections on the Unix socket and executes jobs one at a
+        time, in the order they were received, on a single worker thread.
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, self.socket_mode)
+        server.listen()
+        worker = threading.Thread(target=self._execute_jobs, daemon=True)
+        worker.start()
+        INFO(f'Serving on {self.socket_path}')
+        try:
+            while True:
+                conn, _ = server.accept()
+                thread = threading.Thread(target=self._handle_connection,
+                                          args=(conn,), daemon=True)
+                thread.start()
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+
+    def stop(self):
+        if self.net is not None:
+            self.net.stop()
+            self.net = None
+
+    def _handle_connection(self, conn: socket.socket):
+        """Reads jobs from the connection until the client shuts down its
+        write side, then closes the connection after every job is replied to.
+        """
+        lock = threading.Lock()
+        jobs = []
+        with conn, conn.makefile('r', encoding='utf-8') as f:
+            for i, line in enumerate(f):
+                data = None
+                try:
+                    data = json.loads(line)
+                    job = Job(data.get('id', i), data, conn, lock)
+                except Exception as e:
+                    # Reply with the id of the client if the line has one
+                    job_id = data.get('id', i) if isinstance(data, dict) else i
+                    with lock:
+                        conn.sendall(json.dumps({
+                            'id': job_id, 'error': f'invalid job: {e}',
+                        }).encode('utf-8') + b'\n')
+                    continue
+                jobs.append(job)
+                self.jobs.put(job)
+            for job in jobs:
+                job.done.wait()
+
+    def _execute_jobs(self):
+        while True:
+            job = self.jobs.get()
+            DEBUG(f'job {job.id} {job.protocol} {job.cca} pep={job.pep} '\
+                  f'n={job.n} {job.network}')
+            try:
+                result = self.run_job(job)
+                job.reply(result.as_dict())
+            except Exception as e:
+                ERROR(f'job {job.id} failed: {e}')
+                job.reply({'error': str(e)})
+                # The state of the network is unknown after an error
+                self.stop()
+
+    def run_job(self, job: Job) -> BenchmarkResult:
+        self._setup_network(job)
+        init_logdir(self.logdir)
+        if job.pep and not self.pep:
+            self.net.start_tcp_pep(logdir=self.logdir)
+        elif not job.pep and self.pep:
+            self.net.stop_tcp_pep()
+        self.pep = job.pep
+
+        constructor, keyfile = PROTOCOLS[job.protocol]
+        protocol_options = {}
+        if job.protocol == 'tcp':
+            protocol_options['socket_options'] = job.socket_options
+        bm = constructor(
+            self.net,
+            job.label,
+            self.logdir,
+            job.n,
+            cca=job.cca,
+            certfile=DEFAULT_SSL_CERTFILE,
+            keyfile=keyfile,
+            pep=job.pep,
+            max_n=job.max_n,
+            **protocol_options,
+        )
+        # The server keeps running for later jobs that can reuse it, e.g.,
+        # with a smaller data size, see Benchmark.start_server()
+        try:
+            return bm.run_benchmark(job.trials, job.timeout,
+                                    job.network_statistics)
+        except:
+            bm.stop_server()
+            raise
+
+    def _setup_network(self, job: Job):
+        """Reconfigures the existing network for the job, or builds a new
+        network if there is no network with the same topology, pacing, and
+        TCP buffer sysctls. The network is rebuilt rather than reconfigured
+        if the sysctls change, since their defaults are those of a new network
+        namespace.
+        """
+        # Settings that the job leaves out have their default values, not
+        # those of the previous job
+        network = dict(DEFAULT_NETWORK, **job.network)
+        if self.net is not None and self.topology == job.topology and \
+                self.pacing == job.pacing and \
+                self.net.tcp_buffers == job.tcp_buffers:
+            settings = { k: v for k, v in network.items()
+                         if k in self.net.settings and
+                         self.net.settings[k] != v }
+            qdisc = network['qdisc']
+            if len(settings) > 0 or qdisc != self.net.qdisc:
+                self.net.reconfigure(qdisc=qdisc, **settings)
+            return
+
+        self.stop()
+        self.pep = False
+        if job.topology == 'two_segment':
+            self.net = TwoSegmentNetwork(
+                network['delay1'], network['delay2'],
+                network['loss1'], network['loss2'],
+                network['bw1'], network['bw2'],
+                network['qdisc'], job.pacing,
+                config_backend=self.config_backend)
+        else:
+            self.net = OneSegmentNetwork(network['delay1'], network['loss1'],
+                network['bw1'], network['qdisc'], job.pacing,
+                config_backend=self.config_backend)
+        for sysctl, sizes in job.tcp_buffers.items():
+            self.net.set_tcp_buffers(sysctl, sizes)
+        self.topology = job.topology
+        self.pacing = job.pacing
+
+
+if __name__ == '__main__':
+    setLogLevel('info')
+
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET,
+        help='Path to the Unix socket to listen on')
+    parser.add_argument('--socket-mode', type=lambda x: int(x, 8),
+        default='600', help='File permissions of the Unix socket, in octal')
+    parser.add_argument('--logdir', type=str, default='/tmp/atc25-logs',
+        help='Directory where host logs are written')
+    parser.add_argument('--config-backend', choices=['popen', 'batch'],
+        default='batch', help='Configuration backend of the network')
+    args = parser.parse_args()
+
+    # Stop the network on SIGTERM as well as on a KeyboardInterrupt
+    def raise_keyboard_interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+
+    daemon = EmulationDaemon(args.socket, args.logdir, args.socket_mode,
+                             args.config_backend)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
@@ -0,0 +1,79 @@
+"""
+Client for the long-lived emulation daemon in daemon.py. Only depends on the
+standard library so that it can be imported from the notebooks and the demo
+runner without mininet, e.g., `from emulation.daemon_client import
+EmulationClient`.
+"""
+import json
+import socket
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_SOCKET = '/tmp/atc25-emulation.sock'
+
+
+class EmulationClient:
+    def __init__(self, socket_path: str=DEFAULT_SOCKET,
+                 timeout: Optional[float]=None):
+        """Submits experiment jobs to the emulation daemon listening on the
+        Unix socket <socket_path>, in place of executing emulation/main.py in
+        a subprocess.
+
+        A job is a dictionary with the following keys, all optional except
+        for the protocol:
+        - network: Network settings, e.g., NetworkSetting.settings. Includes
+          delay1, delay2, loss1, loss2, bw1, bw2, qdisc, and topology.
+        - protocol: One of 'tcp', 'google', 'cloudflare', or 'picoquic'.
+        - cca: The congestion control algorithm.
+        - pep: Whether to start the TCP connection-splitting PEP.
+        - n: The data size, in bytes.
+        - max_n: The maximum data size of the jobs in a sweep, in bytes. The
+          server is started with this size and reused by later jobs.
+        - trials: The number of trials.
+        - timeout: The timeout of each trial, in seconds.
+        - label: The label of the benchmark result.
+        - network_statistics: Whether to collect network statistics.
+
+        Parameters:
+        - socket_path: Path to the Unix socket of the daemon.
+        - timeout: If provided, the number of seconds to wait for the next
+          result before raising socket.timeout.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def run_jobs(self, jobs: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Submits all jobs and yields a reply for each job as it completes.
+        Replies arrive in completion order, not submission order, e.g., an
+        invalid job is rejected before earlier valid jobs complete, so match
+        each reply to its job by 'id'. Each reply is a BenchmarkResult JSON
+        object with the additional key 'id', the index of the job, or an
+        object with the keys 'id' and 'error' if the job failed.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            for i, job in enumerate(jobs):
+                job = dict(job, id=i)
+                sock.sendall(json.dumps(job).encode('utf-8') + b'\n')
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile('r', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+        finally:
+            sock.close()
+
+    def run_job(self, **job) -> Dict[str, Any]:
+        """Submits a single job and blocks until it completes.
+
+        Returns:
+        - The BenchmarkResult JSON object i.e., with 'inputs' and 'outputs'.
+
+        Raises:
+        - RuntimeError if the daemon could not execute the job.
+        """
+        for reply in self.run_jobs([job]):
+            if 'error' in reply:
+                raise RuntimeError(f'emulation failed: {reply["error"]}')
+            return reply
+        raise RuntimeError('emulation daemon closed the connection')
@@ -0,0 +1,156 @@
+"""
+Buffered log sink shared by every process that writes its output to a
+logfile, e.g., the SERVER_LOGFILE, CLIENT_LOGFILE, and ROUTER_LOGFILE of a
+benchmark. Output is queued and written by a single writer thread that keeps
+one buffered file open per logfile, instead of reopening the logfile for
+every line. Logfiles can optionally be rotated by size and gzipped.
+"""
+import gzip
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from typing import Optional
+
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+_WRITE = 0
+_FLUSH = 1
+_CLOSE = 2
+
+
+class LogSink:
+    def __init__(self, flush_interval: float=DEFAULT_FLUSH_INTERVAL,
+                 buffer_size: int=DEFAULT_BUFFER_SIZE):
+        """Parameters:
+        - flush_interval: The maximum number of seconds that written output
+          is buffered before it is flushed to the logfile.
+        - buffer_size: The size of the buffer of each logfile, in bytes.
+        """
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.max_bytes = None
+        self.backup_count = 1
+        self.compress = False
+        self.queue = queue.Queue()
+        self.files = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def configure(self, max_bytes: Optional[int]=None, backup_count: int=1,
+                  compress: bool=False):
+        """Configures the rotation of the logfiles.
+
+        Parameters:
+        - max_bytes: If provided, rotates a logfile to <logfile>.1 once it
+          exceeds this many bytes, shifting older backups up to
+          <logfile>.<backup_count>.
+        - backup_count: The number of rotated backups to keep.
+        - compress: Whether to gzip rotated backups, i.e., <logfile>.1.gz.
+        """
+        assert max_bytes is None or max_bytes > 0
+        assert backup_count > 0
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+
+    def write(self, path: str, data: str):
+        """Queues the output to be appended to the logfile <path>.
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        self.queue.put((_WRITE, path, data))
+
+    def flush(self, path: Optional[str]=None):
+        """Blocks until all output queued for the logfile <path>, or for every
+        logfile if not provided, is written to the logfile.
+        """
+        self._wait(_FLUSH, path)
+
+    def close(self, path: Optional[str]=None):
+        """Flushes and closes the logfile <path> or every logfile in the
+        directory <path>, or every logfile if not provided. The logfiles are
+        reopened on the next write.
+        """
+        self._wait(_CLOSE, path)
+
+    def _wait(self, op: int, path: Optional[str]):
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put((op, path, done))
+        done.wait()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                op, path, arg = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                op = None
+            # Any error is logged so that the thread keeps running, since
+            # flush() and close() block until the thread handles them
+            try:
+                if op == _WRITE:
+                    self._write(path, arg)
+                elif op == _FLUSH:
+                    self._flush(path)
+                elif op == _CLOSE:
+                    self._close(path)
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    last_flush = time.monotonic()
+                    self._flush(None)
+            except Exception as e:
+                print(f'[WARN] log sink {path}: {e!r}', file=sys.stderr)
+            finally:
+                if op in [_FLUSH, _CLOSE]:
+                    arg.set()
+
+    def _matches(self, path: Optional[str], logfile: str) -> bool:
+        return path is None or logfile == path or \
+            logfile.startswith(os.path.join(path, ''))
+
+    def _write(self, path: str, data: str):
+        f = self.files.get(path)
+        if f is None:
+            f = open(path, 'a', buffering=self.buffer_size)
+            self.files[path] = f
+        f.write(data)
+        if self.max_bytes is not None and f.tell() >= self.max_bytes:
+            self._rotate(path)
+
+    def _flush(self, path: Optional[str]):
+        for logfile, f in list(self.files.items()):
+            if self._matches(path, logfile):
+                try:
+                    f.flush()
+                except OSError as e:
+                    print(f'[WARN] log sink {logfile}: {e}', file=sys.stderr)
+
+    def _close(self, path: Optional[str]):
+        for logfile in list(self.files.keys()):
+            if self._matches(path, logfile):
+                self.files.pop(logfile).close()
+
+    def _rotate(self, path: str):
+        self.files.pop(path).close()
+        suffix = '.gz' if self.compress else ''
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{path}.{i}{suffix}'
+            if os.path.exists(src):
+                os.replace(src, f'{path}.{i + 1}{suffix}')
+        if self.compress:
+            with open(path, 'rb') as src, gzip.open(f'{path}.1.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        else:
+            os.replace(path, f'{path}.1')
+
+
+# The log sink shared by every logfile writer
+LOG_SINK = LogSink()
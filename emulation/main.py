@@ -1,7 +1,9 @@
 import argparse
 from common import *
+from capabilities import get_capabilities
 from network import *
 from benchmark import *
+from multiflow import FLOW_BENCHMARKS, MultiFlowBenchmark, parse_flow
 from mininet.cli import CLI
 from mininet.log import setLogLevel
 
@@ -29,12 +31,31 @@ if __name__ == '__main__':
         help='Directory where host logs are written')
     exp_config.add_argument('--network-statistics', action='store_true',
         help='Include measured network statistics in experiment output')
+    exp_config.add_argument('--log-max-bytes', type=int, metavar='BYTES',
+        help='If provided, rotate each host logfile once it exceeds this size')
+    exp_config.add_argument('--log-backups', type=int, default=1,
+        help='Number of rotated backups to keep of each host logfile')
+    exp_config.add_argument('--log-gzip', action='store_true',
+        help='Gzip rotated backups of the host logfiles')
+    exp_config.add_argument('--timeline-interval', type=float, metavar='MS',
+        help='If provided, include a timeline of the network statistics '\
+             'sampled at this interval in experiment output')
+    exp_config.add_argument('--qdisc-interval', type=float, metavar='MS',
+        help='If provided, include a timeline of the backlog, drops, '\
+             'overlimits, and marks of the emulator qdiscs sampled at this '\
+             'interval in experiment output')
     exp_config.add_argument('--topology',
         choices=['direct', 'two_segment'], default='two_segment',
         help='Network topology to use. If "one_segment", uses the network '\
              'path properties for the "near path segment" i.e. Link 1.')
     exp_config.add_argument('--pep', action='store_true',
         help='Enable PEPsal, a connection-splitting TCP PEP')
+    exp_config.add_argument('--pep-sweep', action='store_true',
+        help='Run every configuration without and then with PEPsal')
+    exp_config.add_argument('--config-backend', choices=['popen', 'batch'],
+        default='popen',
+        help='Execute each tc command in its own process, or batch the tc '\
+             'commands into one script per host')
 
     ###########################################################################
     # Network Configurations
@@ -56,6 +77,24 @@ if __name__ == '__main__':
         choices=['red', 'bfifo-large', 'bfifo-small', 'pie', 'codel',
                  'policer', 'fq_codel'],
         help='netem queuing discipline')
+    for host in ['h1', 'r1', 'h2']:
+        for sysctl, buffer in [('rmem', 'receive'), ('wmem', 'send')]:
+            net_config.add_argument(f'--tcp-{sysctl}-{host}',
+                type=parse_tcp_mem, metavar='MIN,DEFAULT,MAX',
+                help=f'TCP {buffer} buffer sizes (in bytes) of {host}, i.e., '\
+                     f'the net.ipv4.tcp_{sysctl} sysctl, e.g., 4K,128K,6M')
+
+    ###########################################################################
+    # Socket options of the Linux TCP endpoints
+    ###########################################################################
+    socket_config = parser.add_argument_group('socket_config')
+    socket_config.add_argument('--sndbuf', type=parse_data_size,
+        metavar='BYTES', help='SO_SNDBUF of the TCP server and client sockets')
+    socket_config.add_argument('--rcvbuf', type=parse_data_size,
+        metavar='BYTES', help='SO_RCVBUF of the TCP server and client sockets')
+    socket_config.add_argument('--notsent-lowat', type=parse_data_size,
+        metavar='BYTES',
+        help='TCP_NOTSENT_LOWAT of the TCP server and client sockets')
 
     ###########################################################################
     # HTTP/1.1+TCP benchmark
@@ -65,16 +104,39 @@ if __name__ == '__main__':
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     tcp.set_defaults(ty='benchmark', constructor=LinuxTCPBenchmark)
-    tcp.add_argument('-n', type=parse_data_size, default=10000,
+    tcp.add_argument('-n', type=parse_data_size, nargs='+', default=[10000],
         help='Number of bytes to download in the HTTP/1.1 GET request, '\
-             'e.g., 1000, 1K, 1M, 1000000, 1G')
-    tcp.add_argument('-cca', '--congestion-control',
-        choices=['reno', 'cubic', 'bbr', 'bbr2'], default='cubic',
-        help='Congestion control algorithm at endpoints')
+             'e.g., 1000, 1K, 1M, 1000000, 1G. Multiple values run a sweep')
+    tcp.add_argument('-cca', '--congestion-control', nargs='+',
+        choices=['reno', 'cubic', 'bbr', 'bbr2'], default=['cubic'],
+        help='Congestion control algorithm at endpoints. Multiple values run '\
+             'a sweep')
+    for host, role in [('h1', 'client'), ('r1', 'PEP router'),
+                       ('h2', 'server')]:
+        tcp.add_argument(f'--cca-{host}',
+            choices=['reno', 'cubic', 'bbr', 'bbr2'],
+            help=f'Congestion control algorithm of the {role} {host}, '\
+                 'overriding -cca, e.g., to run different algorithms on the '\
+                 'two halves of a connection split by the PEP')
     tcp.add_argument('--certfile', type=str, default=DEFAULT_SSL_CERTFILE,
         help='Path to SSL certificate')
     tcp.add_argument('--keyfile', type=str, default=DEFAULT_SSL_KEYFILE,
         help='Path to SSL key')
+    tcp.add_argument('--no-tls', action='store_true',
+        help='Use plain HTTP/1.1 over TCP without TLS')
+    tcp.add_argument('--server-workers', type=int, default=1,
+        help='Number of HTTP server processes that share the server port')
+    tcp.add_argument('--requests', type=int, default=1,
+        help='Number of GET requests per trial, each reported separately')
+    tcp.add_argument('--reuse', choices=['none', 'keepalive', 'resume'],
+        default='none',
+        help='Send the requests of a trial on one kept-alive connection, or '\
+             'on new connections that resume the TLS session')
+    tcp.add_argument('--fastopen', action='store_true',
+        help='Enable TCP Fast Open on every host, the endpoints, and the PEP')
+    tcp.add_argument('--client-agent', action='store_true',
+        help='Execute the requests of every trial in one long-lived client '\
+             'process instead of starting a client per trial')
 
     ###########################################################################
     # HTTP/3+QUIC benchmark
@@ -84,12 +146,13 @@ if __name__ == '__main__':
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     google.set_defaults(ty='benchmark', constructor=GoogleQUICBenchmark)
-    google.add_argument('-n', type=parse_data_size, default=10000,
+    google.add_argument('-n', type=parse_data_size, nargs='+', default=[10000],
         help='Number of bytes to download in the HTTP/3 GET request, '\
-             'e.g., 1000, 1K, 1M, 1000000, 1G')
-    google.add_argument('-cca', '--congestion-control',
-        choices=['cubic', 'reno', 'bbr1', 'bbr'], default='cubic',
-        help='Congestion control algorithm at endpoints')
+             'e.g., 1000, 1K, 1M, 1000000, 1G. Multiple values run a sweep')
+    google.add_argument('-cca', '--congestion-control', nargs='+',
+        choices=['cubic', 'reno', 'bbr1', 'bbr'], default=['cubic'],
+        help='Congestion control algorithm at endpoints. Multiple values run '\
+             'a sweep')
     google.add_argument('--certfile', type=str, default=DEFAULT_SSL_CERTFILE,
         help='Path to SSL certificate')
     google.add_argument('--keyfile', type=str, default=DEFAULT_SSL_KEYFILE_GOOGLE,
@@ -103,12 +166,13 @@ if __name__ == '__main__':
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     cloudflare.set_defaults(ty='benchmark', constructor=CloudflareQUICBenchmark)
-    cloudflare.add_argument('-n', type=parse_data_size, default=10000,
+    cloudflare.add_argument('-n', type=parse_data_size, nargs='+', default=[10000],
         help='Number of bytes to download in the HTTP/3 GET request, '\
-             'e.g., 1000, 1K, 1M, 1000000, 1G')
-    cloudflare.add_argument('-cca', '--congestion-control',
-        choices=['cubic', 'reno', 'bbr2', 'bbr'], default='cubic',
-        help='Congestion control algorithm at endpoints')
+             'e.g., 1000, 1K, 1M, 1000000, 1G. Multiple values run a sweep')
+    cloudflare.add_argument('-cca', '--congestion-control', nargs='+',
+        choices=['cubic', 'reno', 'bbr2', 'bbr'], default=['cubic'],
+        help='Congestion control algorithm at endpoints. Multiple values run '\
+             'a sweep')
     cloudflare.add_argument('--certfile', type=str, default=DEFAULT_SSL_CERTFILE,
         help='Path to SSL certificate')
     cloudflare.add_argument('--keyfile', type=str, default=DEFAULT_SSL_KEYFILE,
@@ -122,62 +186,224 @@ if __name__ == '__main__':
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     picoquic.set_defaults(ty='benchmark', constructor=PicoQUICBenchmark)
-    picoquic.add_argument('-n', type=parse_data_size, default=10000,
+    picoquic.add_argument('-n', type=parse_data_size, nargs='+', default=[10000],
         help='Number of bytes to download in the HTTP/3 GET request, '\
-             'e.g., 1000, 1K, 1M, 1000000, 1G')
-    picoquic.add_argument('-cca', '--congestion-control',
-        choices=['newreno', 'cubic', 'dcubic', 'fast', 'bbr', 'prague', 'bbr1'], default='cubic',
-        help='Congestion control algorithm at endpoints')
+             'e.g., 1000, 1K, 1M, 1000000, 1G. Multiple values run a sweep')
+    picoquic.add_argument('-cca', '--congestion-control', nargs='+',
+        choices=['newreno', 'cubic', 'dcubic', 'fast', 'bbr', 'prague', 'bbr1'], default=['cubic'],
+        help='Congestion control algorithm at endpoints. Multiple values run '\
+             'a sweep')
     picoquic.add_argument('--certfile', type=str, default=DEFAULT_SSL_CERTFILE,
         help='Path to SSL certificate')
     picoquic.add_argument('--keyfile', type=str, default=DEFAULT_SSL_KEYFILE,
         help='Path to SSL key')
 
+    ###########################################################################
+    # Concurrent flows benchmark
+    ###########################################################################
+    multiflow = subparsers.add_parser(
+        'multiflow',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    multiflow.set_defaults(ty='multiflow')
+    multiflow.add_argument('--flow', type=parse_flow, action='append',
+        required=True, metavar='PROTOCOL:CCA[:pep]',
+        help='A flow that runs concurrently with the other flows, e.g., '\
+             'tcp:cubic:pep, tcp:bbr, or google:bbr1. The "pep" suffix splits '\
+             'a TCP flow with PEPsal. Repeat for each flow')
+    multiflow.add_argument('-n', type=parse_data_size, default=10000,
+        help='Number of bytes to download in each flow, e.g., 1000, 1K, 1M')
+    multiflow.add_argument('--certfile', type=str, default=DEFAULT_SSL_CERTFILE,
+        help='Path to SSL certificate')
+    multiflow.add_argument('--keyfile', type=str, default=DEFAULT_SSL_KEYFILE,
+        help='Path to SSL key')
+    multiflow.add_argument('--keyfile-google', type=str,
+        default=DEFAULT_SSL_KEYFILE_GOOGLE,
+        help='Path to SSL key of the Google QUIC flows')
+
     args = parser.parse_args()
 
     # Some BBR implementations require pacing.
     # This includes Cloudflare quiche and Linux kernel versions <5.0.
     # We automatically set pacing for Linux TCP BBR, but we need to set it
-    # here for user-space implementations.
-    if args.constructor == CloudflareQUICBenchmark and 'bbr' in args.congestion_control:
-        pacing = True
+    # here for user-space implementations. The network is built once for a
+    # sweep, so every CCA in the sweep must have the same requirement.
+    pacing = False
+    if args.ty == 'benchmark' and args.constructor == CloudflareQUICBenchmark:
+        pacing_ccas = set('bbr' in cca for cca in args.congestion_control)
+        if len(pacing_ccas) > 1:
+            parser.error('cannot sweep over Cloudflare QUIC BBR and non-BBR '\
+                         'CCAs on the same network since BBR requires pacing')
+        pacing = pacing_ccas.pop()
+    elif args.ty == 'multiflow':
+        pacing = any(protocol == 'cloudflare' and 'bbr' in cca
+                     for protocol, cca, _ in args.flow)
+
+    if args.ty == 'benchmark' and args.constructor == LinuxTCPBenchmark and \
+            args.reuse == 'resume' and args.no_tls:
+        parser.error('--reuse resume requires TLS')
+
+    # Per-host congestion control algorithms that override -cca
+    host_ccas = {}
+    if args.ty == 'benchmark' and args.constructor == LinuxTCPBenchmark:
+        for host in ['h1', 'r1', 'h2']:
+            if getattr(args, f'cca_{host}') is not None:
+                host_ccas[host] = getattr(args, f'cca_{host}')
+        if args.topology == 'direct' and 'r1' in host_ccas:
+            parser.error('the direct topology does not have an r1 host')
+
+    # TCP buffer sysctls of each host, and socket options of the TCP endpoints
+    tcp_buffers = {}
+    for sysctl in ['tcp_rmem', 'tcp_wmem']:
+        sizes = {host: getattr(args, f'{sysctl}_{host}')
+                 for host in ['h1', 'r1', 'h2']
+                 if getattr(args, f'{sysctl}_{host}') is not None}
+        if len(sizes) > 0:
+            tcp_buffers[sysctl] = sizes
+        if args.topology == 'direct' and 'r1' in sizes:
+            parser.error('the direct topology does not have an r1 host')
+    socket_options = {option: getattr(args, option)
+                      for option in ['sndbuf', 'rcvbuf', 'notsent_lowat']
+                      if getattr(args, option) is not None}
+    if len(socket_options) > 0 and not (args.ty == 'benchmark' and \
+            args.constructor == LinuxTCPBenchmark):
+        parser.error('socket options require the tcp benchmark')
+
+    # The configurations in the order they are run: PEP groups, then CCAs,
+    # then data sizes
+    peps = [False, True] if args.pep_sweep else [args.pep]
+    if args.ty == 'multiflow':
+        if args.pep or args.pep_sweep:
+            parser.error('split multiflow flows with the "pep" suffix of '\
+                         '--flow instead of --pep')
+        peps = [any(pep for _, _, pep in args.flow)]
+        if len(set(cca for _, cca, pep in args.flow if pep)) > 1:
+            parser.error('the TCP PEP runs one congestion control algorithm, '\
+                         'so split flows must have the same algorithm')
+    if args.topology == 'direct' and True in peps:
+        parser.error('the direct topology does not support a PEP')
+
+    LOG_SINK.configure(args.log_max_bytes, args.log_backups, args.log_gzip)
+
+    # Fail fast if the host is missing a capability of the experiment
+    if args.ty == 'benchmark':
+        for cca in args.congestion_control:
+            get_capabilities().require(
+                binaries=args.constructor.BINARIES,
+                cca=cca if args.constructor == LinuxTCPBenchmark else None,
+                qdisc=args.qdisc,
+                pep=True in peps,
+            )
+        for cca in host_ccas.values():
+            get_capabilities().require(cca=cca)
+    elif args.ty == 'multiflow':
+        for protocol, cca, _ in args.flow:
+            constructor = FLOW_BENCHMARKS[protocol]
+            get_capabilities().require(
+                binaries=constructor.BINARIES,
+                cca=cca if constructor == LinuxTCPBenchmark else None,
+                qdisc=args.qdisc,
+                pep=True in peps,
+            )
     else:
-        pacing = False
+        get_capabilities().require(qdisc=args.qdisc, pep=args.pep)
 
     if args.topology == 'two_segment':
         net = TwoSegmentNetwork(args.delay1, args.delay2,
-            args.loss1, args.loss2, args.bw1, args.bw2, args.qdisc, pacing)
-        if args.pep:
-            net.start_tcp_pep(logdir=args.logdir)
+            args.loss1, args.loss2, args.bw1, args.bw2, args.qdisc, pacing,
+            config_backend=args.config_backend)
     elif args.topology == 'direct':
-        assert not args.pep
         net = OneSegmentNetwork(args.delay1, args.loss1, args.bw1,
-            args.qdisc, pacing)
+            args.qdisc, pacing, config_backend=args.config_backend)
     else:
         raise NotImplementedError(args.topology)
+    INFO(f'Configured network with {args.config_backend} backend in '\
+         f'{net.config_time_s:.3f}s')
+    for sysctl, sizes in tcp_buffers.items():
+        net.set_tcp_buffers(sysctl, sizes)
 
     try:
         if args.ty == 'cli':
+            if args.pep:
+                net.start_tcp_pep(logdir=args.logdir)
             CLI(net.net)
-        else:
+        elif args.ty == 'multiflow':
             init_logdir(args.logdir)
-            bm = args.constructor(
+            bm = MultiFlowBenchmark(
                 net,
+                args.flow,
                 args.label,
                 args.logdir,
                 args.n,
-                cca=args.congestion_control,
                 certfile=args.certfile,
                 keyfile=args.keyfile,
-                pep=args.pep,
-            )
-            result = bm.run_benchmark(
-                args.trials,
-                args.timeout,
-                args.network_statistics,
+                keyfile_google=args.keyfile_google,
             )
+            result = bm.run_benchmark(args.trials, args.timeout,
+                                      args.network_statistics)
             result.print()
-            
+            os.makedirs('results', exist_ok=True)
+            output_file = os.path.join('results', f'{args.label}.json')
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(result.as_dict(), f, indent=2)
+            print(f"\n[INFO] Results saved to {output_file}", file=sys.stderr)
+        else:
+            init_logdir(args.logdir)
+            sweep = len(peps) * len(args.congestion_control) * len(args.n) > 1
+            protocol_options = {}
+            if args.constructor == LinuxTCPBenchmark:
+                protocol_options['tls'] = not args.no_tls
+                protocol_options['workers'] = args.server_workers
+                protocol_options['agent'] = args.client_agent
+                protocol_options['requests'] = args.requests
+                protocol_options['reuse'] = args.reuse
+                protocol_options['fastopen'] = args.fastopen
+                protocol_options['host_ccas'] = host_ccas
+                protocol_options['socket_options'] = socket_options
+            saved_data = []
+            for pep in peps:
+                # Start or stop the PEP between groups of configurations
+                if pep:
+                    net.start_tcp_pep(logdir=args.logdir,
+                        fastopen=protocol_options.get('fastopen', False))
+                for cca in args.congestion_control:
+                    for n in args.n:
+                        bm = args.constructor(
+                            net,
+                            args.label,
+                            args.logdir,
+                            n,
+                            cca=cca,
+                            certfile=args.certfile,
+                            keyfile=args.keyfile,
+                            pep=pep,
+                            max_n=max(args.n),
+                            **protocol_options,
+                        )
+                        result = bm.run_benchmark(
+                            args.trials,
+                            args.timeout,
+                            args.network_statistics,
+                            None if args.timeline_interval is None
+                                else args.timeline_interval / 1000,
+                            None if args.qdisc_interval is None
+                                else args.qdisc_interval / 1000,
+                        )
+                        # One JSON line per configuration as it completes
+                        result.print()
+                        sys.stdout.flush()
+                        saved_data.append({
+                            'inputs': result.inputs,
+                            'outputs': result.outputs,
+                            # Add extra metadata that might be useful
+                            'scene_id': args.label, # Using label as scene_id for now
+                            'cca': cca,
+                            'strategy': 'adaptive_split' if pep and 'policy' in args.label else ('no_split' if not pep else 'split'),
+                            'pep': pep
+                        })
+                if pep:
+                    net.stop_tcp_pep()
+
             # Save results to JSON
             import json
             import os
@@ -190,19 +416,11 @@ if __name__ == '__main__':
             # But analyze_gain.py expects a list of results if multiple runs.
             # Let's save a single run object. analyze_gain.py might need adjustment or we should append.
             # Let's check analyze_gain.py format expectation.
+            # A sweep saves the list of objects of every configuration.
             
             with open(output_file, 'w', encoding='utf-8') as f:
-                 # Construct the data object matching what print() outputs but as a dict
-                 data = {
-                     'inputs': result.inputs,
-                     'outputs': result.outputs,
-                     # Add extra metadata that might be useful
-                     'scene_id': args.label, # Using label as scene_id for now
-                     'cca': args.congestion_control,
-                     'strategy': 'adaptive_split' if args.pep and 'policy' in args.label else ('no_split' if not args.pep else 'split'),
-                     'pep': args.pep
-                 }
-                 json.dump(data, f, indent=2)
+                 json.dump(saved_data if sweep else saved_data[0], f, indent=2)
             print(f"\n[INFO] Results saved to {output_file}", file=sys.stderr)
     finally:
         net.stop()
+        LOG_SINK.close()
@@ -0,0 +1,194 @@
+"""
+Run several file download benchmarks concurrently across the same bottleneck,
+e.g., to measure how flows of different protocols and congestion control
+algorithms, or split and unsplit TCP flows, share the bottleneck link. Each
+flow has its own server port on the h2 host and its own log directory.
+"""
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+from benchmark import *
+from network import EmulatedNetwork
+from result import MultiFlowResult
+from common import *
+
+# Map from the protocol of a flow to its benchmark
+FLOW_BENCHMARKS = {
+    'tcp': LinuxTCPBenchmark,
+    'google': GoogleQUICBenchmark,
+    'cloudflare': CloudflareQUICBenchmark,
+    'picoquic': PicoQUICBenchmark,
+}
+
+
+def parse_flow(spec: str) -> Tuple[str, str, bool]:
+    """Parses a flow <protocol>:<cca>[:pep], e.g., tcp:cubic:pep or
+    google:bbr1, into the protocol, congestion control algorithm, and whether
+    the flow is split by the TCP PEP.
+    """
+    parts = spec.split(':')
+    if len(parts) not in [2, 3] or parts[0] not in FLOW_BENCHMARKS or \
+            (len(parts) == 3 and parts[2] != 'pep'):
+        raise ValueError(f'invalid flow {spec}')
+    pep = len(parts) == 3
+    if pep and parts[0] != 'tcp':
+        raise ValueError(f'only tcp flows can be split by the PEP: {spec}')
+    return parts[0], parts[1], pep
+
+
+class MultiFlowBenchmark:
+    def __init__(
+        self, net: EmulatedNetwork, flows: List[Tuple[str, str, bool]],
+        label: str, logdir: str, n: int, certfile: str, keyfile: str,
+        keyfile_google: str=DEFAULT_SSL_KEYFILE_GOOGLE,
+    ):
+        """
+        Concurrent file download benchmark where one HTTP client per flow on
+        the h1 host requests <n> bytes from its own HTTP server on the h2
+        host at the same time. Reports the completion time and throughput of
+        each flow, Jain's fairness index of the flow throughputs, and the
+        aggregate throughput and utilization of the bottleneck link.
+
+        Parameters:
+        - net: The mininet network to run the benchmark on, see Benchmark.
+        - flows: The protocol, congestion control algorithm, and whether to
+          split each flow with the TCP PEP, see parse_flow().
+        - label: The unique label to associate with this configuration.
+        - logdir: Path to a log directory (that already exists). The logs of
+          flow i are written to the subdirectory flow<i>, and the logs of the
+          TCP PEP to the ROUTER_LOGFILE in this directory.
+        - n: The data size, in bytes, downloaded by each flow.
+        - certfile: Path to the TLS/SSL certificate file.
+        - keyfile: Path to the TLS/SSL key file.
+        - keyfile_google: Path to the TLS/SSL key file of Google QUIC.
+
+        Raises:
+        - RuntimeError if a binary of a flow or the PEP is missing.
+        - ValueError if the split flows have different congestion control
+          algorithms.
+
+        TCP flows use their congestion control algorithm on the server
+        socket, so TCP flows with different algorithms can run at once. The
+        connections of the TCP PEP use the system default of the router, so
+        the default of every host is set to the algorithm of the split flows.
+        """
+        split_ccas = set(cca for _, cca, pep in flows if pep)
+        if len(split_ccas) > 1:
+            raise ValueError('split flows must have the same congestion '\
+                             f'control algorithm: {sorted(split_ccas)}')
+        self.net = net
+        self.label = label
+        self.logdir = logdir
+        self.n = n
+        self.benchmarks: List[Benchmark] = []
+        for i, (protocol, cca, pep) in enumerate(flows):
+            constructor = FLOW_BENCHMARKS[protocol]
+            self.benchmarks.append(constructor(
+                net,
+                f'{label}-flow{i}',
+                f'{logdir}/flow{i}',
+                n,
+                cca=cca,
+                certfile=certfile,
+                keyfile=keyfile_google if protocol == 'google' else keyfile,
+                pep=pep,
+                port=constructor.DEFAULT_PORT + i,
+                **({'set_cca': False} if protocol == 'tcp' else {}),
+            ))
+        self.pep_ports = [bm.port for bm in self.benchmarks if bm.pep]
+        if len(split_ccas) > 0:
+            net.set_tcp_congestion_control(split_ccas.pop())
+
+    def run_benchmark(
+        self, num_trials: int, timeout: Optional[int]=None,
+        network_statistics: bool=False,
+    ) -> MultiFlowResult:
+        """Runs the benchmark, see arun_benchmark().
+        """
+        return asyncio.run(self.arun_benchmark(num_trials, timeout,
+                                               network_statistics))
+
+    async def arun_benchmark(
+        self, num_trials: int, timeout: Optional[int]=None,
+        network_statistics: bool=False,
+    ) -> MultiFlowResult:
+        """
+        Starts the server of every flow on the h2 host, and the TCP PEP if a
+        flow is split, then starts every client on the h1 host at once, as
+        many times as the number of trials. The TCP PEP is stopped at the end.
+
+        Parameters:
+        - num_trials: Number of trials.
+        - timeout: If provided, the number of seconds to wait for each client
+          to complete its request.
+        - network_statistics: Whether to collect network statistics of the
+          most recent trial, see Benchmark.run_benchmark().
+
+        Returns:
+        - A MultiFlowResult corresponding to the result of this benchmark.
+        """
+        for bm in self.benchmarks:
+            init_logdir(bm.logdir)
+        if len(self.pep_ports) > 0:
+            self.net.start_tcp_pep(self.logdir, ports=self.pep_ports)
+        try:
+            await asyncio.gather(*[bm.astart_server()
+                                   for bm in self.benchmarks])
+            result = self._new_result()
+            for _ in range(num_trials):
+                await self._run_trial(result, timeout, network_statistics)
+            return result
+        finally:
+            if len(self.pep_ports) > 0:
+                self.net.stop_tcp_pep()
+
+    def _new_result(self) -> MultiFlowResult:
+        iface, bw = self.net.bottleneck()
+        flows = [{
+            'protocol': bm.protocol.name,
+            'cca': bm.cca,
+            'pep': bm.pep,
+            'port': bm.port,
+        } for bm in self.benchmarks]
+        return MultiFlowResult(self.label, self.n, flows, iface, bw)
+
+    async def _run_trial(
+        self, result: MultiFlowResult, timeout: Optional[int],
+        network_statistics: bool,
+    ):
+        result.append_new_output()
+        self.net.reset_statistics()
+        start = time.monotonic()
+
+        async def run_flow(bm: Benchmark):
+            output = await bm.arun_client(timeout=timeout)
+            return output, time.monotonic() - start
+
+        outputs = await asyncio.gather(*[run_flow(bm)
+                                         for bm in self.benchmarks])
+        time_s = time.monotonic() - start
+        statistics = self.net.snapshot_statistics()
+        if network_statistics:
+            result.set_network_statistics(statistics)
+
+        throughputs = []
+        for output, finish_s in outputs:
+            if output is None:
+                result.append_flow(False, False, None, finish_s)
+                continue
+            status_code, flow_time_s = output
+            success = status_code == HTTP_OK_STATUSCODE
+            result.append_flow(success,
+                               status_code == HTTP_TIMEOUT_STATUSCODE,
+                               flow_time_s, finish_s)
+            if success:
+                throughputs.append(self.n / flow_time_s)
+
+        # The fairness index is only defined if every flow completed
+        jain_index = None
+        if len(throughputs) == len(self.benchmarks):
+            jain_index = jain_fairness_index(throughputs)
+        iface = result.inputs['bottleneck']
+        i = statistics['ifaces'].index(iface)
+        result.set_aggregate(time_s, statistics['tx_bytes'][i], jain_index)
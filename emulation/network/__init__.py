@@ -1,8 +1,14 @@
+import asyncio
 import subprocess
 import sys
-import threading
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
 
 from common import *
+from capabilities import get_capabilities
+from reactor import REACTOR
+from sampler import *
 from mininet.node import Host
 from mininet.net import Mininet
 from mininet.link import TCLink
@@ -14,15 +20,61 @@ class EmulatedNetwork:
     """
     METRICS = ['tx_packets', 'tx_bytes', 'rx_packets', 'rx_bytes']
 
-    def __init__(self, debug: bool=False):
+    CONFIG_BACKENDS = ['popen', 'batch']
+
+    # TcpExt counters of TCP Fast Open, see read_tcp_counters()
+    TCP_FASTOPEN_COUNTERS = [
+        'TCPFastOpenActive',
+        'TCPFastOpenActiveFail',
+        'TCPFastOpenPassive',
+        'TCPFastOpenPassiveFail',
+        'TCPFastOpenCookieReqd',
+    ]
+
+    def __init__(self, debug: bool=False, config_backend: str='popen'):
+        """Parameters:
+        - debug: Whether to set debug environment variables in processes.
+        - config_backend: How config_iface() executes its commands. If 'popen',
+          executes each tc and ethtool command in its own process. If 'batch',
+          queues the commands and executes them in a single `tc -batch`
+          script per host on flush_config().
+        """
+        assert config_backend in self.CONFIG_BACKENDS
         self.net = Mininet(controller=None, link=TCLink)
         self.debug = debug
+        self.config_backend = config_backend
+        self.config_batches = {}
+        self.config_start = None
+        self.config_time_s = 0
         self.primary_ifaces = []
         self.iface_to_host = {}
 
+        # Network path properties that can be changed with reconfigure().
+        # Subclasses map the settings to the emulator interfaces that apply
+        # them, e.g., segment '1' -> delay1, loss1, and bw1.
+        self.settings = {}
+        self.qdisc = None
+        self.segments = {}
+        self.iface_config = {}
+        self.sampler = None
+        self.qdisc_sampler = None
+
+        # Map from TCP buffer sysctl, e.g., 'tcp_rmem', to the host attribute
+        # names and sizes set by set_tcp_buffers()
+        self.tcp_buffers = {}
+
         # Keep track of background processes for cleanup
         self.background_processes = []
         self.background_threads = []
+        self.async_processes = []
+
+        # Map from host name and port to the benchmark server running on the
+        # host, see Benchmark.start_server()
+        self.servers = {}
+
+        # Map from host name and command to the client agent running on the
+        # host, see Benchmark.client_agent_cmd()
+        self.agents = {}
 
     def set_arp_table(self, host: Host, ip: str, mac: str, iface: str):
         self.popen(host, f'ip neigh add {ip} lladdr {mac} dev {iface} nud permanent')
@@ -35,7 +87,7 @@ class EmulatedNetwork:
 
     def config_iface(self, iface, netem: bool, pacing: bool=False,
                       delay=None, loss=None, bw=None, bdp=None, qdisc=None,
-                      gso=True, tso=True):
+                      gso=True, tso=True, change=False):
         """Configures the given interface <iface>:
         - Netem: whether this is a network emulation node (i.e., delay, loss, etc.
           should be configured)
@@ -43,27 +95,41 @@ class EmulatedNetwork:
         - Delay: <delay>ms delay
         - Base bandwidth: <bw> Mbit/s, range: <bw_min> to <bw_max> Mbit/s
         - Bandwidth-delay product: <bdp> is used to set the queue size
+        - Change: whether to change the qdiscs already configured on this
+          interface in place instead of adding them, see reconfigure()
         """
         host = self.iface_to_host[iface]
 
         # Configure the end-host or router
         if not netem:
+            if change:
+                return
             # BBR requires fq (with pacing) for kernel versions <v4.20
             # https://groups.google.com/g/bbr-dev/c/zZ5c0qkWqbo/m/QulUwXLZAQAJ
-            linux_version = get_linux_version()
+            linux_version = get_capabilities().linux_version
             if pacing or linux_version < 5.0:
-                self.popen(host, f'tc qdisc add dev {iface} root handle 2: '\
-                                f'fq pacing', console_logger=TRACE)
+                self._config_cmd(host, f'tc qdisc add dev {iface} root '\
+                                       f'handle 2: fq pacing',
+                                 console_logger=TRACE)
             return
 
         # Configure the network emulator node
+        prev_qdisc = self.iface_config.get(iface, {}).get('qdisc')
+        self.iface_config[iface] = {
+            'delay': delay,
+            'loss': loss,
+            'bw': bw,
+            'bdp': bdp,
+            'qdisc': qdisc,
+        }
+        verb = 'change' if change else 'add'
 
         # Add netem with delay variability
-        cmd = f'tc qdisc add dev {iface} root handle 2: '\
+        cmd = f'tc qdisc {verb} dev {iface} root handle 2: '\
               f'netem delay {delay}ms '
-        if loss is not None and int(loss) > 0:
+        if loss is not None and float(loss) > 0:
             cmd += f'loss {loss}% '
-        self.popen(host, cmd, console_logger=TRACE)
+        self._config_cmd(host, cmd, console_logger=TRACE)
 
         # Add HTB for bandwidth
         # Take the min because sch_htb complains about the quantum being too big
@@ -72,13 +138,27 @@ class EmulatedNetwork:
         # twice as high as the policed rate.
         r2q = 10
         quantum = min(int(bw*1000000/8 / r2q), 200000)
-        self.popen(host, f'tc qdisc add dev {iface} parent 2: handle 3: ' \
-                         f'htb default 10', console_logger=TRACE)
+        if not change:
+            self._config_cmd(host, f'tc qdisc add dev {iface} parent 2: ' \
+                                   f'handle 3: htb default 10',
+                             console_logger=TRACE)
         htb_rate = int(2*bw) if qdisc == 'policer' else bw
-        self.popen(host, f'tc class add dev {iface} parent 3: ' \
-                         f'classid 10 htb rate {htb_rate}Mbit quantum {quantum}',
+        self._config_cmd(host, f'tc class {verb} dev {iface} parent 3: ' \
+                               f'classid 10 htb rate {htb_rate}Mbit ' \
+                               f'quantum {quantum}',
                          console_logger=TRACE)
 
+        # Remove the previous queue management. The policer is a filter on the
+        # HTB qdisc and every other queue is a leaf qdisc of the HTB class.
+        # Queues that are not removed are replaced below, which also resets
+        # their state.
+        if change and prev_qdisc == 'policer':
+            self._config_cmd(host, f'tc filter del dev {iface} parent 3:',
+                             console_logger=TRACE)
+        elif change and prev_qdisc is not None and qdisc in [None, 'policer']:
+            self._config_cmd(host, f'tc qdisc del dev {iface} parent 3:10',
+                             console_logger=TRACE)
+
         # Add queue management
         if qdisc == 'policer':
             # Burst time of 10ms
@@ -87,9 +167,10 @@ class EmulatedNetwork:
                         f'protocol ip u32 match ip src 0.0.0.0/0 '\
                         f'action police rate {bw}mbit burst {burst} '\
                         f'conform-exceed drop'
-            self.popen(host, queue_cmd, console_logger=DEBUG)
+            self._config_cmd(host, queue_cmd, console_logger=DEBUG)
         elif qdisc is not None:
-            queue_cmd = f'tc qdisc add dev {iface} parent 3:10 handle 11: '
+            queue_verb = 'replace' if change else 'add'
+            queue_cmd = f'tc qdisc {queue_verb} dev {iface} parent 3:10 handle 11: '
             if qdisc == 'red':
                 # The harddrop byte limit needs to be a min value or RED will
                 # be unable to calculate the EWMA constant so that min >= avpkt
@@ -115,34 +196,292 @@ class EmulatedNetwork:
             elif qdisc == 'codel':
                 # Memory limit, since packets are dropped based on target delay
                 limit = int(4 * bdp / 1500)
+                rtt = self.calculate_rtt()
                 queue_cmd += f'codel limit {limit} interval {rtt}ms'
             elif qdisc == 'fq_codel':
                 queue_cmd += f'fq_codel'
             else:
                 raise NotImplementedError(qdisc)
-            self.popen(host, queue_cmd, console_logger=TRACE)
+            self._config_cmd(host, queue_cmd, console_logger=TRACE)
+
+        # Offloads are unchanged when changing an existing configuration
+        if change:
+            return
 
         # Turn off tso and gso to send MTU-sized packets
         gso = 'on' if gso else 'off'
         tso = 'on' if tso else 'off'
-        self.popen(
+        self._config_cmd(
             host,
             f'ethtool -K {iface} gso {gso} tso {tso}',
             console_logger=TRACE,
             raise_error=False,
         )
 
-    def set_tcp_congestion_control(self, cca):
-        version = get_linux_version()
+    def _config_cmd(self, host, cmd, console_logger=TRACE, raise_error=True):
+        """Executes or queues a configuration command, depending on the
+        configuration backend.
+        """
+        if self.config_start is None:
+            self.config_start = time.monotonic()
+        if self.config_backend == 'popen':
+            self.popen(host, cmd, console_logger=console_logger,
+                       raise_error=raise_error)
+            return
+        console_logger(f'{host.name} {cmd} (batch)')
+        if host not in self.config_batches:
+            self.config_batches[host] = []
+        self.config_batches[host].append((cmd, raise_error))
+
+    def flush_config(self):
+        """Executes all queued configuration commands, i.e., of the 'batch'
+        configuration backend, as a single script per host. The tc commands
+        are executed with `tc -batch`. Records the time since the first
+        configuration command in config_time_s.
+
+        Raises:
+        - ValueError if a command failed that should raise an error.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for host, cmds in self.config_batches.items():
+                tc_file = f'{tmpdir}/{host.name}.tc'
+                sh_file = f'{tmpdir}/{host.name}.sh'
+                tc_cmds = [cmd[len('tc '):] for cmd, _ in cmds
+                           if cmd.startswith('tc ')]
+                with open(tc_file, 'w') as f:
+                    f.write('\n'.join(tc_cmds) + '\n')
+                with open(sh_file, 'w') as f:
+                    f.write('set -e\n')
+                    if len(tc_cmds) > 0:
+                        f.write(f'tc -batch {tc_file}\n')
+                    for cmd, raise_error in cmds:
+                        if cmd.startswith('tc '):
+                            continue
+                        f.write(cmd if raise_error else f'{cmd} || true')
+                        f.write('\n')
+                self.popen(host, f'sh {sh_file}', console_logger=TRACE)
+        self.config_batches = {}
+
+        if self.config_start is not None:
+            elapsed = time.monotonic() - self.config_start
+            self.config_time_s += elapsed
+            self.config_start = None
+            DEBUG(f'config_iface backend={self.config_backend} '\
+                  f'time_s={elapsed:.3f}')
+
+    def calculate_rtt(self) -> float:
+        """The round-trip time, in ms, over every segment of the current
+        settings.
+        """
+        return calculate_rtt([self.settings[f'delay{segment}']
+                              for segment in self.segments])
+
+    def calculate_bdp(self) -> float:
+        """The bandwidth-delay product, in bytes, of the current settings,
+        i.e., of the round trip over every segment at the bandwidth of the
+        bottleneck segment.
+        """
+        delays = [self.settings[f'delay{segment}'] for segment in self.segments]
+        bws = [self.settings[f'bw{segment}'] for segment in self.segments]
+        return calculate_bdp(delays, bws)
+
+    def bottleneck(self) -> Tuple[str, float]:
+        """The emulator interface that sends data toward h1 on the segment
+        with the lowest bandwidth, i.e., the first interface of the segment,
+        and its bandwidth, in Mbit/s.
+        """
+        ifaces = [self.segments[segment][0] for segment in self.segments]
+        iface = min(ifaces, key=lambda iface: self.iface_config[iface]['bw'])
+        return iface, self.iface_config[iface]['bw']
+
+    def reconfigure(self, qdisc=None, timeout: int=SETUP_TIMEOUT, **settings):
+        """Changes the network path properties of the existing network in
+        place, e.g., reconfigure(delay1=10, loss2='1', bw1=50, qdisc='pie'),
+        instead of building a new network. Settings that are not provided keep
+        their current values.
+
+        The netem and HTB qdiscs are changed with `tc ... change` and the queue
+        management is replaced. Blocks until the new configuration is verified
+        to be in effect and the queues are empty.
+
+        Raises:
+        - ValueError on an unknown setting or if the configuration could not
+          be verified.
+        - TimeoutError if the queues do not drain within the timeout.
+        """
+        for key in settings:
+            if key not in self.settings:
+                raise ValueError(f'unknown network setting {key}')
+        self.settings.update(settings)
+        if qdisc is not None:
+            self.qdisc = qdisc
+
+        bdp = self.calculate_bdp()
+        for segment, ifaces in self.segments.items():
+            delay = self.settings[f'delay{segment}']
+            loss = self.settings[f'loss{segment}']
+            bw = self.settings[f'bw{segment}']
+            for iface in ifaces:
+                self.config_iface(iface, True, False, delay, loss, bw, bdp,
+                                  self.qdisc, change=True)
+        self.flush_config()
+        for iface in self.iface_config:
+            self.verify_iface(iface)
+        self.reset_queues(timeout=timeout)
+
+    def verify_iface(self, iface):
+        """Checks that the delay, loss, bandwidth, and queue management of the
+        last call to config_iface() are in effect on the emulator interface.
+
+        Raises:
+        - ValueError if the interface is configured differently.
+        """
+        config = self.iface_config[iface]
+        host = self.iface_to_host[iface]
+        lines = []
+        self.popen(host, f'tc qdisc show dev {iface}', func=lines.append)
+        self.popen(host, f'tc class show dev {iface}', func=lines.append)
+        output = ''.join(lines)
+
+        errors = []
+        match = re.search(r'netem .*delay ([\d.]+)(us|ms|s)\b', output)
+        scale = {'us': 0.001, 'ms': 1, 's': 1000}
+        delay = 0 if match is None else \
+            float(match.group(1)) * scale[match.group(2)]
+        if abs(delay - float(config['delay'])) > 0.001:
+            errors.append(f'delay {delay}ms != {config["delay"]}ms')
+
+        match = re.search(r'netem .*loss ([\d.]+)%', output)
+        loss = 0 if match is None else float(match.group(1))
+        expected_loss = 0 if config['loss'] is None else float(config['loss'])
+        if abs(loss - expected_loss) > 0.001:
+            errors.append(f'loss {loss}% != {expected_loss}%')
+
+        match = re.search(r'class htb 3:10 .*rate ([\d.]+)([KMG]?)bit', output)
+        scale = {'': 0.000001, 'K': 0.001, 'M': 1, 'G': 1000}
+        bw = 0 if match is None else \
+            float(match.group(1)) * scale[match.group(2)]
+        expected_bw = config['bw'] * (2 if config['qdisc'] == 'policer' else 1)
+        if abs(bw - expected_bw) > 0.01 * expected_bw:
+            errors.append(f'rate {bw}Mbit != {expected_bw}Mbit')
+
+        qdisc = config['qdisc']
+        if qdisc not in [None, 'policer']:
+            kind = qdisc.split('-')[0]
+            if re.search(rf'qdisc {kind} 11: ', output) is None:
+                errors.append(f'missing {kind} qdisc')
+
+        if len(errors) > 0:
+            raise ValueError(f'{host.name} {iface}: ' + ', '.join(errors))
+
+    def reset_queues(self, timeout: int=SETUP_TIMEOUT, interval: float=0.01):
+        """Blocks until the qdiscs on every emulator interface are empty, so
+        that packets queued under a previous configuration do not affect the
+        next measurement.
+
+        Raises:
+        - TimeoutError if the queues do not drain within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        ifaces = list(self.iface_config.keys())
+        while len(ifaces) > 0:
+            backlogged = []
+            for iface in ifaces:
+                packets = []
+                def parse_backlog(line):
+                    match = re.search(r'backlog \S+ (\d+)p', line)
+                    if match is not None:
+                        packets.append(int(match.group(1)))
+                host = self.iface_to_host[iface]
+                self.popen(host, f'tc -s qdisc show dev {iface}',
+                           func=parse_backlog)
+                if sum(packets) > 0:
+                    backlogged.append(iface)
+            ifaces = backlogged
+            if len(ifaces) == 0:
+                break
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'reset_queues timeout {timeout}s {ifaces}')
+            time.sleep(interval)
+
+    def set_tcp_congestion_control(self, cca,
+                                   host_ccas: Optional[Dict[str, str]]=None):
+        """Set the default TCP congestion control algorithm <cca> of every
+        host. If provided, <host_ccas> maps the name of a host attribute,
+        e.g., 'r1', to the algorithm of that host instead, e.g., so that the
+        two halves of a connection split by the PEP use different algorithms.
+
+        Raises:
+        - ValueError if the kernel cannot set per-host algorithms.
+        """
+        version = get_capabilities().linux_version
         cmd = f'sysctl -w net.ipv4.tcp_congestion_control={cca}'
         if version == 4.9 or version < 4.15:
             # Setting CCA on Mininet nodes will fail for kernel v4.9-4.14, but they
             # will inherit the CCA setting of the host.
+            if host_ccas and set(host_ccas.values()) != {cca}:
+                raise ValueError('per-host CCAs require Linux >=4.15')
             self.popen(None, cmd, stderr=True, console_logger=DEBUG)
-        else:
-            for host in self.net.hosts:
+            return
+        for host in self.net.hosts:
+            self.popen(host, cmd, stderr=False, console_logger=DEBUG)
+        for name, host_cca in (host_ccas or {}).items():
+            if host_cca == cca:
+                continue
+            cmd = f'sysctl -w net.ipv4.tcp_congestion_control={host_cca}'
+            self.popen(getattr(self, name), cmd, stderr=False,
+                       console_logger=DEBUG)
+
+    def set_tcp_buffers(self, sysctl: str, sizes: Dict[str, List[int]]):
+        """Set the TCP buffer sysctl, either 'tcp_rmem' or 'tcp_wmem', of
+        each host in <sizes>, a map from the name of a host attribute, e.g.,
+        'r1', to the min, default, and max buffer sizes in bytes.
+        """
+        assert sysctl in ['tcp_rmem', 'tcp_wmem']
+        # The value has spaces, so it is read from a file with sysctl -p
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, value in sizes.items():
+                host = getattr(self, name)
+                path = f'{tmpdir}/{host.name}.conf'
+                with open(path, 'w') as f:
+                    f.write(f'net.ipv4.{sysctl} = '
+                            f'{" ".join(str(size) for size in value)}\n')
+                self.popen(host, f'sysctl -p {path}', stderr=False,
+                           console_logger=DEBUG)
+        self.tcp_buffers.setdefault(sysctl, {}).update(sizes)
+
+    def set_tcp_fastopen(self, enabled: bool):
+        """Enable TCP Fast Open for clients and servers on every host, or
+        restore the default of clients only. Enabling also disables the
+        blackhole detection, which would turn off TCP Fast Open after the
+        emulated loss of a SYN with data.
+        """
+        for host in self.net.hosts:
+            cmd = f'sysctl -w net.ipv4.tcp_fastopen={3 if enabled else 1}'
+            self.popen(host, cmd, stderr=False, console_logger=DEBUG)
+            if enabled:
+                cmd = 'sysctl -w net.ipv4.tcp_fastopen_blackhole_timeout_sec=0'
                 self.popen(host, cmd, stderr=False, console_logger=DEBUG)
 
+    def read_tcp_counters(self, counters: List[str]) -> Dict[str, Dict[str, int]]:
+        """Read the TcpExt counters, e.g., TCP_FASTOPEN_COUNTERS, of every
+        host from /proc/<pid>/net/netstat, i.e., of the network namespace of
+        the host. Counters that the kernel does not have are 0.
+
+        Returns a map from host name -> counter -> value.
+        """
+        values = {}
+        for host in self.net.hosts:
+            try:
+                with open(f'/proc/{host.pid}/net/netstat') as f:
+                    tcp = parse_proc_net_netstat(f.read()).get('TcpExt', {})
+            except OSError as e:
+                WARN(f'failed to read {host.name} counters: {e}')
+                tcp = {}
+            values[host.name] = {counter: tcp.get(counter, 0)
+                                 for counter in counters}
+        return values
+
     def reset_statistics(self):
         """After a reset, an immediate snapshot would return all 0 values.
         """
@@ -161,11 +500,63 @@ class EmulatedNetwork:
                 snapshot[metric].append(statistic)
         return snapshot
 
+    def start_sampler(self, interval_s: float,
+                      capacity: int=DEFAULT_SAMPLER_CAPACITY):
+        """Start sampling the statistics of every interface in the background
+        at the given interval, in seconds, until stop_sampler().
+        """
+        assert self.sampler is None
+        self.sampler = InterfaceSampler(self, interval_s, capacity)
+        self.sampler.start()
+
+    def stop_sampler(self):
+        """Stop the background sampler and return the timeline of the
+        statistics since the sampler started, see InterfaceSampler.stop().
+        """
+        timeline = self.sampler.stop()
+        self.sampler = None
+        return timeline
+
+    def start_qdisc_sampler(self, interval_s: float,
+                            capacity: int=DEFAULT_SAMPLER_CAPACITY):
+        """Start sampling the statistics of every qdisc configured by
+        config_iface() in the background at the given interval, in seconds,
+        until stop_qdisc_sampler().
+        """
+        assert self.qdisc_sampler is None
+        self.qdisc_sampler = QdiscSampler(self, interval_s, capacity)
+        self.qdisc_sampler.start()
+
+    def stop_qdisc_sampler(self):
+        """Stop the background qdisc sampler and return the timeline of the
+        qdisc statistics since the sampler started, see QdiscSampler.
+        """
+        timeline = self.qdisc_sampler.stop()
+        self.qdisc_sampler = None
+        return timeline
+
     def _read_raw_metrics(self):
         """Read the current raw metrics.
+
+        Reads /proc/<pid>/net/dev once per mininet host, which contains the
+        statistics of every interface in the network namespace of the host,
+        without executing a process. Falls back to reading each metric from
+        sysfs in the host if the interface is missing.
         """
+        host_stats = {}
+        for host in set(self.iface_to_host.values()):
+            try:
+                with open(f'/proc/{host.pid}/net/dev') as f:
+                    host_stats[host] = parse_proc_net_dev(f.read())
+            except OSError as e:
+                WARN(f'failed to read {host.name} statistics: {e}')
+                host_stats[host] = {}
+
         stats = {}
-        for iface in self.iface_to_host:
+        for iface, host in self.iface_to_host.items():
+            if iface in host_stats[host]:
+                stats[iface] = host_stats[host][iface]
+                continue
             stats[iface] = {}
             for metric in self.METRICS:
                 stats[iface][metric] = self._read_raw_metric(iface, metric)
@@ -186,9 +577,21 @@ class EmulatedNetwork:
         else:
             return value[0]
 
+    def _env(self):
+        """Environment variables of executed processes, with debug
+        environment variables set.
+        """
+        env = os.environ.copy()
+        env['RUST_BACKTRACE'] = '1'
+        if self.debug:
+            env['RUST_LOG'] = 'debug'
+        else:
+            env['RUST_LOG'] = 'info'
+        return env
+
     def popen(self, host, cmd, background=False, func=None, timeout=None,
               stdout=False, stderr=True, console_logger=TRACE, logfile=None,
-              raise_error=True):
+              raise_error=True, stdin=False):
         """
         Start a process that executes a command on the given mininet host.
 
@@ -206,9 +609,13 @@ class EmulatedNetwork:
         - background: Whether to run as a background process. Background
           processes can only be executed on mininet hosts.
         - func: A callback function to execute on every line of output. The
-          function takes as input (line,). Only on mininet hosts.
+          function takes as input (line,). Only on mininet hosts. Callbacks of
+          background processes are executed on the I/O reactor thread, so they
+          should not block.
         - timeout: The cmd timeout, in seconds. Only on mininet hosts and
           synchronous processes.
+        - stdin: Whether to pipe the stdin of the process, e.g., to send
+          commands to it. Only on background processes.
 
         Logging parameters:
         - console_logger: Log level function, e.g., DEBUG, for logging to the
@@ -228,8 +635,9 @@ class EmulatedNetwork:
           exitcode.
 
         Returns:
-        - If a background process, returns the process and the thread that is
-          handling the background process.
+        - If a background process, returns the process and its output handler
+          on the I/O reactor thread, which has the same join() and is_alive()
+          interface as a thread.
         - If not, returns True if there was a timeout and False if the process
           executed to completion.
         - For non-zero exitcodes, exits the program unless configured not to.
@@ -243,13 +651,7 @@ class EmulatedNetwork:
         background_str = ' &' if background else ''
         console_logger(f'{host_str}{cmd}{background_str}')
 
-        # Set debug environment variables.
-        env = os.environ.copy()
-        env['RUST_BACKTRACE'] = '1'
-        if self.debug:
-            env['RUST_LOG'] = 'debug'
-        else:
-            env['RUST_LOG'] = 'info'
+        env = self._env()
 
         # Execute the command on the local host
         if host is None:
@@ -257,6 +659,7 @@ class EmulatedNetwork:
             assert timeout is None
             assert logfile is None
             assert func is None
+            assert not stdin
             p = subprocess.run(cmd, shell=True, text=True, env=env,
                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             if p.stdout and stdout:
@@ -273,32 +676,31 @@ class EmulatedNetwork:
         if background:
             assert timeout is None
             p = host.popen(cmd.split(), stdout=subprocess.PIPE,
-                           stderr=subprocess.PIPE, text=True, env=env)
-            thread = threading.Thread(
-                target=handle_background_process,
-                args=(p, logfile, func),
-            )
-            thread.start()
+                           stderr=subprocess.PIPE, env=env,
+                           stdin=subprocess.PIPE if stdin else None)
+            thread = REACTOR.register(p, func=func, logfile=logfile)
             self.background_processes.append(p)
             self.background_threads.append(thread)
             return (p, thread)
 
         # Execute the command synchronously, possibly with a timeout
+        assert not stdin
         cmd_input = cmd.split()
         if timeout is not None:
             cmd_input = ['timeout', f'{timeout}s'] + cmd_input
         p = host.popen(cmd_input, stdout=subprocess.PIPE,
-                       stderr=subprocess.PIPE, text=True, env=env)
+                       stderr=subprocess.PIPE, env=env)
         for line, stream in read_subprocess_pipe(p):
             if stream == p.stdout and stdout:
                 console_logger(line.strip())
             if stream == p.stderr and stderr:
                 console_logger(line.strip())
             if logfile is not None:
-                with open(logfile, 'a') as f:
-                    f.write(line)
+                LOG_SINK.write(logfile, line)
             if func is not None:
                 func(line)
+        if logfile is not None:
+            LOG_SINK.flush(logfile)
 
         # Handle the exitcode
         exitcode = p.wait()
@@ -312,13 +714,135 @@ class EmulatedNetwork:
                 debug_str = f'{host}({cmd}) = {p.returncode}'
                 raise ValueError(debug_str)
 
+    async def apopen(self, host, cmd, background=False, func=None,
+                     ready=None, timeout=None, stdout=False, stderr=True,
+                     console_logger=TRACE, logfile=None, raise_error=True):
+        """
+        Asynchronous variant of popen() that executes a command on the given
+        mininet host as an asyncio subprocess in the network namespace of the
+        host. Has the same logging parameters as popen().
+
+        Parameters:
+        - host: The mininet host.
+        - cmd: A command string.
+        - background: Whether to run as a background process.
+        - func: A callback function to execute on every line of output.
+        - ready: For background processes, a function that takes as input
+          (line,) and returns whether the process is ready, e.g., a server
+          that is ready to accept requests. If provided, waits until an output
+          line is ready.
+        - timeout: For synchronous processes, the cmd timeout, in seconds.
+          For background processes, the number of seconds to wait until the
+          process is ready.
+
+        Returns:
+        - If a background process, returns the asyncio process and the task
+          that reads its output.
+        - If not, returns True if there was a timeout and False if the process
+          executed to completion.
+
+        Raises:
+        - TimeoutError if a background process is not ready before the
+          timeout, or ValueError if it exits before it is ready. The process
+          is killed.
+        - ValueError on a non-zero exitcode, unless configured not to.
+        - The process is killed if the caller is cancelled.
+        """
+        background_str = ' &' if background else ''
+        console_logger(f'{host.name} {cmd}{background_str}')
+        p = await asyncio.create_subprocess_exec(
+            'mnexec', '-da', str(host.pid), *cmd.split(),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            env=self._env())
+
+        loop = asyncio.get_running_loop()
+        is_ready = loop.create_future()
+        def handle_line(line, is_stdout):
+            if not background:
+                if (is_stdout and stdout) or (not is_stdout and stderr):
+                    console_logger(line.strip())
+            if logfile is not None:
+                LOG_SINK.write(logfile, line)
+            if func is not None:
+                func(line)
+            if ready is not None and not is_ready.done() and ready(line):
+                is_ready.set_result(True)
+
+        async def read_stream(stream, is_stdout):
+            reader = LineReader()
+            while True:
+                data = await stream.read(PIPE_READ_SIZE)
+                for line in reader.feed(data):
+                    handle_line(line, is_stdout)
+                if not data:
+                    return
+
+        async def read_output():
+            await asyncio.gather(read_stream(p.stdout, True),
+                                 read_stream(p.stderr, False))
+            if logfile is not None:
+                await asyncio.to_thread(LOG_SINK.flush, logfile)
+
+        def kill():
+            if p.returncode is None:
+                try:
+                    p.kill()
+                except ProcessLookupError:
+                    pass
+
+        # Execute the command in the background, possibly waiting until ready
+        reader = asyncio.create_task(read_output())
+        if background:
+            self.async_processes.append(p)
+            if ready is not None:
+                try:
+                    await asyncio.wait([is_ready, reader], timeout=timeout,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                except asyncio.CancelledError:
+                    kill()
+                    raise
+                if not is_ready.done():
+                    kill()
+                    if reader.done():
+                        raise ValueError(f'{host}({cmd}) exited before ready')
+                    raise TimeoutError(f'{host}({cmd}) not ready after '\
+                                       f'{timeout}s')
+            return (p, reader)
+
+        # Execute the command synchronously, possibly with a timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(reader), timeout)
+            exitcode = await p.wait()
+        except asyncio.TimeoutError:
+            kill()
+            await p.wait()
+            await reader
+            return True
+        except asyncio.CancelledError:
+            kill()
+            raise
+        if exitcode != 0:
+            ERROR(f'{host}({cmd}) = {exitcode}')
+            if raise_error:
+                raise ValueError(f'{host}({cmd}) = {exitcode}')
+        return False
+
     def stop(self):
         for p in self.background_processes:
             p.terminate()
             p.wait()
+        for p in self.async_processes:
+            if p.returncode is None:
+                try:
+                    p.terminate()
+                except ProcessLookupError:
+                    pass
+        for thread in self.background_threads:
+            thread.join(timeout=SETUP_TIMEOUT)
         if self.net is not None:
             self.net.stop()
 
 
 from .one_segment import OneSegmentNetwork
 from .two_segment import TwoSegmentNetwork
+from .multi_lane import MultiLaneNetwork
@@ -0,0 +1,41 @@
+from typing import List
+
+from common import *
+from network.two_segment import TwoSegmentNetwork
+
+
+class MultiLaneNetwork:
+    """
+    Defines K independent two segment networks, or lanes, in mininet that can
+    run experiments concurrently. Each lane has its own host name prefix,
+    subnets, and TCP PEP TPROXY mark, see TwoSegmentNetwork.
+    """
+    def __init__(self, num_lanes: int, delay1, delay2, loss1, loss2, bw1, bw2,
+                 qdisc, pacing, config_backend: str='popen'):
+        assert num_lanes > 0
+        self.lanes: List[TwoSegmentNetwork] = []
+        try:
+            for lane in range(num_lanes):
+                self.lanes.append(TwoSegmentNetwork(
+                    delay1, delay2, loss1, loss2, bw1, bw2, qdisc, pacing,
+                    lane=lane, config_backend=config_backend))
+        except:
+            self.stop()
+            raise
+
+    def logdir(self, logdir: str, lane: int) -> str:
+        """The log directory of the lane within the base log directory.
+        """
+        return f'{logdir}/lane{lane}'
+
+    def init_logdirs(self, logdir: str):
+        for lane in range(len(self.lanes)):
+            init_logdir(self.logdir(logdir, lane))
+
+    def start_tcp_pep(self, logdir: str, timeout: int=SETUP_TIMEOUT):
+        for lane, net in enumerate(self.lanes):
+            net.start_tcp_pep(self.logdir(logdir, lane), timeout=timeout)
+
+    def stop(self):
+        for net in self.lanes:
+            net.stop()
@@ -7,8 +7,9 @@ class OneSegmentNetwork(EmulatedNetwork):
     Defines an emulated network in mininet that directly connects the client /
     data receiver (h1) to the server / data sender (h2) with a single link.
     """
-    def __init__(self, delay, loss, bw, qdisc, pacing):
-        super().__init__()
+    def __init__(self, delay, loss, bw, qdisc, pacing,
+                 config_backend: str='popen'):
+        super().__init__(config_backend=config_backend)
 
         # Add hosts and switches
         self.h1 = self.net.addHost('h1', ip='172.16.1.10/24', mac=mac(1))
@@ -44,9 +45,18 @@ class OneSegmentNetwork(EmulatedNetwork):
 
         # Configure link latency, delay, bandwidth, and queue size
         # https://unix.stackexchange.com/questions/100785/bucket-size-in-tbf
-        bdp = calculate_bdp(delay, 0, bw, bw)
-        rtt = 2 * delay
+        self.settings = {
+            'delay1': delay,
+            'loss1': loss,
+            'bw1': bw,
+        }
+        self.qdisc = qdisc
+        self.segments = {
+            '1': ['e1-eth0', 'e1-eth1'],
+        }
+        bdp = self.calculate_bdp()
         self.config_iface('h1-eth0', False, pacing)
         self.config_iface('h2-eth0', False, pacing)
         self.config_iface('e1-eth0', True, False, delay, loss, bw, bdp, qdisc)
         self.config_iface('e1-eth1', True, False, delay, loss, bw, bdp, qdisc)
+        self.flush_config()
@@ -1,4 +1,6 @@
 import threading
+from typing import List, Optional
+
 from common import *
 from network import EmulatedNetwork
 
@@ -10,15 +12,34 @@ class TwoSegmentNetwork(EmulatedNetwork):
     (h1) and the router (r1), and the 2nd link is between the router (r1) and
     the server / data sender (h2).
     """
-    def __init__(self, delay1, delay2, loss1, loss2, bw1, bw2, qdisc, pacing):
-        super().__init__()
+    def __init__(self, delay1, delay2, loss1, loss2, bw1, bw2, qdisc, pacing,
+                 lane: int=0, config_backend: str='popen'):
+        """
+        Multiple two segment networks, or lanes, can run concurrently on the
+        same machine if they have different <lane> indexes. Lane 0 uses the
+        host names h1, h2, r1, e1, and e2 and the subnets 172.16.1.0/24 and
+        172.16.2.0/24. Lane i > 0 prefixes the host names with "l<i>" and uses
+        the subnets 172.16.<2i+1>.0/24 and 172.16.<2i+2>.0/24.
+        """
+        super().__init__(config_backend=config_backend)
+        assert 0 <= lane < 127
+        self.lane = lane
+        self.prefix = '' if lane == 0 else f'l{lane}'
+        self.pep_process = None
+        self.pep_mark = lane + 1
+        self.pep_table = 100 + lane
+        p = self.prefix
+        near = f'172.16.{2*lane+1}'
+        far = f'172.16.{2*lane+2}'
+        self.near_subnet = f'{near}.0/24'
+        self.far_subnet = f'{far}.0/24'
 
         # Add hosts, switches, and network emulation nodes
-        self.h1 = self.net.addHost('h1', ip='172.16.1.10/24', mac=mac(1))
-        self.h2 = self.net.addHost('h2', ip='172.16.2.10/24', mac=mac(2))
-        self.r1 = self.net.addHost('r1')
-        self.e1 = self.net.addHost('e1')
-        self.e2 = self.net.addHost('e2')
+        self.h1 = self.net.addHost(f'{p}h1', ip=f'{near}.10/24', mac=mac(1))
+        self.h2 = self.net.addHost(f'{p}h2', ip=f'{far}.10/24', mac=mac(2))
+        self.r1 = self.net.addHost(f'{p}r1')
+        self.e1 = self.net.addHost(f'{p}e1')
+        self.e2 = self.net.addHost(f'{p}e2')
 
         # Add links
         self.net.addLink(self.h1, self.e1)
@@ -28,64 +49,101 @@ class TwoSegmentNetwork(EmulatedNetwork):
         self.net.build()
 
         # Initialize statistics
-        self.primary_ifaces = ['h1-eth0', 'r1-eth0', 'r1-eth1', 'h2-eth0']
+        self.primary_ifaces = [f'{p}h1-eth0', f'{p}r1-eth0', f'{p}r1-eth1',
+                               f'{p}h2-eth0']
         self.iface_to_host = {
-            'h1-eth0': self.h1,
-            'r1-eth0': self.r1,
-            'r1-eth1': self.r1,
-            'h2-eth0': self.h2,
-            'e1-eth0': self.e1,
-            'e1-eth1': self.e1,
-            'e2-eth0': self.e2,
-            'e2-eth1': self.e2,
+            f'{p}h1-eth0': self.h1,
+            f'{p}r1-eth0': self.r1,
+            f'{p}r1-eth1': self.r1,
+            f'{p}h2-eth0': self.h2,
+            f'{p}e1-eth0': self.e1,
+            f'{p}e1-eth1': self.e1,
+            f'{p}e2-eth0': self.e2,
+            f'{p}e2-eth1': self.e2,
         }
 
         # Setup routing and forwarding
-        self.popen(self.r1, "ifconfig r1-eth0 0")
-        self.popen(self.r1, "ifconfig r1-eth1 0")
-        self.popen(self.r1, f"ifconfig r1-eth0 hw ether {mac(3)}")
-        self.popen(self.r1, f"ifconfig r1-eth1 hw ether {mac(4)}")
-        self.popen(self.r1, "ip addr add 172.16.1.1/24 brd + dev r1-eth0")
-        self.popen(self.r1, "ip addr add 172.16.2.1/24 brd + dev r1-eth1")
+        self.popen(self.r1, f"ifconfig {p}r1-eth0 0")
+        self.popen(self.r1, f"ifconfig {p}r1-eth1 0")
+        self.popen(self.r1, f"ifconfig {p}r1-eth0 hw ether {mac(3)}")
+        self.popen(self.r1, f"ifconfig {p}r1-eth1 hw ether {mac(4)}")
+        self.popen(self.r1, f"ip addr add {near}.1/24 brd + dev {p}r1-eth0")
+        self.popen(self.r1, f"ip addr add {far}.1/24 brd + dev {p}r1-eth1")
         self.r1.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-        self.popen(self.h1, "ip route add 172.16.2.0/24 via 172.16.1.1")
-        self.popen(self.h2, "ip route add 172.16.1.0/24 via 172.16.2.1")
+        self.popen(self.h1, f"ip route add {self.far_subnet} via {near}.1")
+        self.popen(self.h2, f"ip route add {self.near_subnet} via {far}.1")
 
         # Set up bridging on the network emulation nodes
         self.popen(self.e1, "brctl addbr br0")
-        self.popen(self.e1, "brctl addif br0 e1-eth0")
-        self.popen(self.e1, "brctl addif br0 e1-eth1")
+        self.popen(self.e1, f"brctl addif br0 {p}e1-eth0")
+        self.popen(self.e1, f"brctl addif br0 {p}e1-eth1")
         self.popen(self.e1, "ip link set dev br0 up")
         self.popen(self.e2, "brctl addbr br0")
-        self.popen(self.e2, "brctl addif br0 e2-eth0")
-        self.popen(self.e2, "brctl addif br0 e2-eth1")
+        self.popen(self.e2, f"brctl addif br0 {p}e2-eth0")
+        self.popen(self.e2, f"brctl addif br0 {p}e2-eth1")
         self.popen(self.e2, "ip link set dev br0 up")
 
         # Prepopulate arp table
-        self.set_arp_table(self.h1, '172.16.1.1', mac(3), 'h1-eth0')
-        self.set_arp_table(self.r1, '172.16.1.10', mac(1), 'r1-eth0')
-        self.set_arp_table(self.r1, '172.16.2.10', mac(2), 'r1-eth1')
-        self.set_arp_table(self.h2, '172.16.2.1', mac(4), 'h2-eth0')
+        self.set_arp_table(self.h1, f'{near}.1', mac(3), f'{p}h1-eth0')
+        self.set_arp_table(self.r1, f'{near}.10', mac(1), f'{p}r1-eth0')
+        self.set_arp_table(self.r1, f'{far}.10', mac(2), f'{p}r1-eth1')
+        self.set_arp_table(self.h2, f'{far}.1', mac(4), f'{p}h2-eth0')
 
         # Configure link latency, delay, bandwidth, and queue size
         # https://unix.stackexchange.com/questions/100785/bucket-size-in-tbf
-        rtt = 2 * (delay1 + delay2)
-        bdp = calculate_bdp(delay1, delay2, bw1, bw2)
-        self.config_iface('h1-eth0', False, pacing)
-        self.config_iface('r1-eth0', False, pacing)
-        self.config_iface('r1-eth1', False, pacing)
-        self.config_iface('h2-eth0', False, pacing)
-        self.config_iface('e1-eth0', True, False, delay1, loss1, bw1, bdp, qdisc)
-        self.config_iface('e1-eth1', True, False, delay1, loss1, bw1, bdp, qdisc)
-        self.config_iface('e2-eth0', True, False, delay2, loss2, bw2, bdp, qdisc)
-        self.config_iface('e2-eth1', True, False, delay2, loss2, bw2, bdp, qdisc)
+        self.settings = {
+            'delay1': delay1,
+            'delay2': delay2,
+            'loss1': loss1,
+            'loss2': loss2,
+            'bw1': bw1,
+            'bw2': bw2,
+        }
+        self.qdisc = qdisc
+        self.segments = {
+            '1': [f'{p}e1-eth0', f'{p}e1-eth1'],
+            '2': [f'{p}e2-eth0', f'{p}e2-eth1'],
+        }
+        bdp = self.calculate_bdp()
+        self.config_iface(f'{p}h1-eth0', False, pacing)
+        self.config_iface(f'{p}r1-eth0', False, pacing)
+        self.config_iface(f'{p}r1-eth1', False, pacing)
+        self.config_iface(f'{p}h2-eth0', False, pacing)
+        self.config_iface(f'{p}e1-eth0', True, False, delay1, loss1, bw1, bdp, qdisc)
+        self.config_iface(f'{p}e1-eth1', True, False, delay1, loss1, bw1, bdp, qdisc)
+        self.config_iface(f'{p}e2-eth0', True, False, delay2, loss2, bw2, bdp, qdisc)
+        self.config_iface(f'{p}e2-eth1', True, False, delay2, loss2, bw2, bdp, qdisc)
+        self.flush_config()
 
-    def start_tcp_pep(self, logdir: str, timeout: int=SETUP_TIMEOUT):
-        self.popen(self.r1, 'ip rule add fwmark 1 lookup 100')
-        self.popen(self.r1, 'ip route add local 0.0.0.0/0 dev lo table 100')
+    def start_tcp_pep(self, logdir: str, timeout: int=SETUP_TIMEOUT,
+                      ports: Optional[List[int]]=None, fastopen: bool=False):
+        """Start the TCP PEP on r1 and redirect TCP connections to it with
+        TPROXY rules, blocking until the PEP is ready to split connections.
+
+        Parameters:
+        - logdir: The log directory of the ROUTER_LOGFILE.
+        - timeout: The number of seconds to block before an error.
+        - ports: If provided, only split the connections to these server
+          ports, e.g., to split a subset of concurrent flows. Otherwise,
+          splits every TCP connection.
+        - fastopen: Whether the PEP accepts and opens its connections with
+          TCP Fast Open, see EmulatedNetwork.set_tcp_fastopen().
+        """
+        p = self.prefix
+        mark = self.pep_mark
+        table = self.pep_table
+        # Data from the server (r1-eth1) and requests from the client (r1-eth0)
+        match1, match0 = '', ''
+        if ports is not None:
+            assert 0 < len(ports) <= 15, 'iptables multiport supports 15 ports'
+            ports = ','.join(str(port) for port in ports)
+            match1 = f'-m multiport --sports {ports} '
+            match0 = f'-m multiport --dports {ports} '
+        self.popen(self.r1, f'ip rule add fwmark {mark} lookup {table}')
+        self.popen(self.r1, f'ip route add local 0.0.0.0/0 dev lo table {table}')
         self.popen(self.r1, 'iptables -t mangle -F')
-        self.popen(self.r1, 'iptables -t mangle -A PREROUTING -i r1-eth1 -p tcp -j TPROXY --on-port 5000 --tproxy-mark 1')
-        self.popen(self.r1, 'iptables -t mangle -A PREROUTING -i r1-eth0 -p tcp -j TPROXY --on-port 5000 --tproxy-mark 1')
+        self.popen(self.r1, f'iptables -t mangle -A PREROUTING -i {p}r1-eth1 -p tcp {match1}-j TPROXY --on-port 5000 --tproxy-mark {mark}')
+        self.popen(self.r1, f'iptables -t mangle -A PREROUTING -i {p}r1-eth0 -p tcp {match0}-j TPROXY --on-port 5000 --tproxy-mark {mark}')
 
         condition = threading.Condition()
         def notify_when_ready(line):
@@ -97,9 +155,25 @@ class TwoSegmentNetwork(EmulatedNetwork):
         # split connections. That is, when we observe the 'Pepsal started'
         # string in the router output.
         logfile = f'{logdir}/{ROUTER_LOGFILE}'
-        self.popen(self.r1, 'pepsal -v', background=True,
+        cmd = 'pepsal -v -f' if fastopen else 'pepsal -v'
+        self.pep_process, _ = self.popen(self.r1, cmd, background=True,
             console_logger=DEBUG, logfile=logfile, func=notify_when_ready)
         with condition:
             notified = condition.wait(timeout=timeout)
             if not notified:
                 raise TimeoutError(f'start_tcp_pep timeout {timeout}s')
+
+    def stop_tcp_pep(self):
+        """Stop the TCP PEP and remove the TPROXY rules so that connections
+        are no longer split. Does nothing if the TCP PEP was not started.
+        """
+        if self.pep_process is None:
+            return
+        self.pep_process.terminate()
+        self.pep_process.wait()
+        self.pep_process = None
+        mark = self.pep_mark
+        table = self.pep_table
+        self.popen(self.r1, 'iptables -t mangle -F')
+        self.popen(self.r1, f'ip route del local 0.0.0.0/0 dev lo table {table}')
+        self.popen(self.r1, f'ip rule del fwmark {mark} lookup {table}')
@@ -0,0 +1,119 @@
+"""
+Single I/O reactor thread that reads the output of every background process,
+in place of one thread per process. The reactor owns the stdout and stderr
+pipes of each process, reads them without blocking, splits the output into
+lines, and dispatches each line to the callback function and logfile of the
+process.
+"""
+import os
+import selectors
+import threading
+from typing import Callable, Optional
+
+from common import *
+
+
+class BackgroundProcess:
+    def __init__(self, p, func: Optional[Callable[[str], None]]=None,
+                 logfile: Optional[str]=None):
+        """The output handler of the background process <p>. Has the same
+        join() and is_alive() interface as the thread that previously handled
+        each background process. The handler is alive until both stdout and
+        stderr are closed and the output is written to the logfile.
+        """
+        self.p = p
+        self.func = func
+        self.logfile = logfile
+        self.open_streams = 2
+        self.done = threading.Event()
+
+    def join(self, timeout: Optional[float]=None):
+        self.done.wait(timeout)
+
+    def is_alive(self) -> bool:
+        return not self.done.is_set()
+
+    def _dispatch(self, line: str):
+        if self.func is not None:
+            try:
+                self.func(line)
+            except Exception as e:
+                WARN(f'background process callback failed: {e}')
+        if self.logfile is not None:
+            LOG_SINK.write(self.logfile, line)
+
+    def _close_stream(self):
+        self.open_streams -= 1
+        if self.open_streams > 0:
+            return
+        if self.logfile is not None:
+            LOG_SINK.flush(self.logfile)
+        self.done.set()
+
+
+class Reactor:
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.pending = []
+        self.thread = None
+
+        # Wakes up the reactor to register pending processes
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+
+    def register(self, p, func: Optional[Callable[[str], None]]=None,
+                 logfile: Optional[str]=None) -> BackgroundProcess:
+        """Reads the stdout and stderr of the process <p> on the reactor
+        thread until both streams are closed.
+
+        Parameters:
+        - p: The process, with piped stdout and stderr.
+        - func: A callback function to execute on every line of output, on
+          the reactor thread.
+        - logfile: The name of the logfile to append all output.
+
+        Returns:
+        - The output handler of the process.
+        """
+        handle = BackgroundProcess(p, func, logfile)
+        with self.lock:
+            self.pending.append(handle)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+        os.write(self.wakeup_w, b'\0')
+        return handle
+
+    def _register_pending(self):
+        while read_pipe(self.wakeup_r):
+            pass
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for handle in pending:
+            for stream in [handle.p.stdout, handle.p.stderr]:
+                os.set_blocking(stream.fileno(), False)
+                self.selector.register(stream, selectors.EVENT_READ,
+                                       (handle, LineReader()))
+
+    def _run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    self._register_pending()
+                    continue
+                handle, reader = key.data
+                data = read_pipe(key.fd)
+                if data is None:
+                    continue
+                for line in reader.feed(data):
+                    handle._dispatch(line)
+                if not data:
+                    self.selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    handle._close_stream()
+
+
+# The reactor shared by every background process
+REACTOR = Reactor()
@@ -1,5 +1,6 @@
 import json
 from datetime import datetime
+from typing import Dict, List, Optional
 
 
 class BenchmarkResult:
@@ -33,17 +34,119 @@ class BenchmarkResult:
         self.outputs[-1]['throughput_mbps'] = \
             8 * self.inputs['data_size'] / 1000000 / time_s
 
+    def set_progress(self, progress):
+        self.outputs[-1]['progress'] = progress
+
+    def set_requests(self, requests):
+        self.outputs[-1]['requests'] = requests
+
+    def set_fastopen(self, used, counters):
+        """Sets whether the first connection of the client used TCP Fast
+        Open, or None if unknown, and the TCP Fast Open counters of each host
+        during the trial.
+        """
+        self.outputs[-1]['tfo'] = used
+        self.outputs[-1]['tfo_counters'] = counters
+
+    def set_phases(self, phases):
+        """Sets the time at which each phase of the request completed, e.g.,
+        'connect_s' and 'tls_s', as separate fields of the trial.
+        """
+        self.outputs[-1].update(phases)
+
     def set_network_statistics(self, statistics):
         self.outputs[-1]['statistics'] = statistics
 
+    def set_timeline(self, timeline):
+        self.outputs[-1]['timeline'] = timeline
+
+    def set_qdisc_timeline(self, timeline):
+        self.outputs[-1]['qdisc_timeline'] = timeline
+
     def set_additional_data(self, data):
         self.outputs[-1]['additional_data'] = data
 
+    def as_dict(self):
+        return {
+            'inputs': self.inputs,
+            'outputs': self.outputs,
+        }
+
     def print(self, pretty_print=False):
-        result = {
+        result = self.as_dict()
+        if pretty_print:
+            print(json.dumps(result, indent=2))
+        else:
+            print(json.dumps(result))
+
+
+class MultiFlowResult:
+    def __init__(self, label: str, data_size: int, flows: List[Dict],
+                 bottleneck: str, bottleneck_bw: float):
+        """Result of concurrent flows that share the bottleneck interface
+        <bottleneck> of bandwidth <bottleneck_bw> Mbit/s. Each flow is
+        described by its protocol, cca, pep, and port.
+        """
+        self.inputs = {
+            'label': label,
+            'num_trials': 0,
+            'start_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'data_size': data_size,
+            'flows': flows,
+            'bottleneck': bottleneck,
+            'bottleneck_bw_mbps': bottleneck_bw,
+        }
+        self.outputs = []
+
+    def append_new_output(self):
+        self.inputs['num_trials'] += 1
+        self.outputs.append({
+            'success': False,
+            'flows': [],
+        })
+
+    def append_flow(self, success: bool, timeout: bool,
+                    time_s: Optional[float], finish_s: float):
+        """Appends the output of the next flow. <time_s> is the runtime of the
+        GET request reported by the client, if any, and <finish_s> the time
+        from the start of the trial until the client exited.
+        """
+        flow = {
+            'success': success,
+            'timeout': timeout,
+            'finish_s': finish_s,
+        }
+        if time_s is not None:
+            flow['time_s'] = time_s
+            flow['throughput_mbps'] = \
+                8 * self.inputs['data_size'] / 1000000 / time_s
+        self.outputs[-1]['flows'].append(flow)
+
+    def set_aggregate(self, time_s: float, bottleneck_tx_bytes: int,
+                      jain_index: Optional[float]):
+        """Sets the aggregate metrics of the trial, which lasted <time_s>
+        seconds until the last flow finished.
+        """
+        output = self.outputs[-1]
+        output['success'] = all(flow['success'] for flow in output['flows'])
+        output['time_s'] = time_s
+        output['aggregate_throughput_mbps'] = 8 * self.inputs['data_size'] * \
+            len(output['flows']) / 1000000 / time_s
+        output['utilization'] = 8 * bottleneck_tx_bytes / 1000000 / time_s / \
+            self.inputs['bottleneck_bw_mbps']
+        output['jain_index'] = jain_index
+
+    def set_network_statistics(self, statistics):
+        self.outputs[-1]['statistics'] = statistics
+
+    def as_dict(self):
+        return {
             'inputs': self.inputs,
             'outputs': self.outputs,
         }
+
+    def print(self, pretty_print=False):
+        result = self.as_dict()
         if pretty_print:
             print(json.dumps(result, indent=2))
         else:
@@ -0,0 +1,242 @@
+"""
+Sample the statistics of an EmulatedNetwork in the background at a fixed
+interval, to report the timeline of the bytes and packets sent and received at
+each interface, and of the queue at each emulator qdisc, within a trial.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+from common import *
+
+# Number of samples kept per trial, e.g., 100 seconds at 10 ms intervals
+DEFAULT_SAMPLER_CAPACITY = 10000
+
+
+class TimelineBuffer:
+    def __init__(self, num_columns: int, capacity: int):
+        """Preallocated ring buffer of at most <capacity> samples, where each
+        sample is a timestamp and <num_columns> integer counters. Appending to
+        a full buffer overwrites the oldest sample.
+        """
+        assert capacity > 0
+        self.num_columns = num_columns
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.values = array('q', [0]) * (capacity * num_columns)
+        self.start = 0
+        self.size = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, t: float, values: List[int]):
+        assert len(values) == self.num_columns
+        i = (self.start + self.size) % self.capacity
+        if self.size == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.size += 1
+        self.times[i] = t
+        offset = i * self.num_columns
+        for j, value in enumerate(values):
+            self.values[offset + j] = value
+
+    def samples(self) -> Iterator[Tuple[float, List[int]]]:
+        """Yields the timestamp and counters of each sample, oldest first.
+        """
+        for k in range(self.size):
+            i = (self.start + k) % self.capacity
+            offset = i * self.num_columns
+            yield self.times[i], self.values[offset:offset + self.num_columns]
+
+    def delta_encode(
+        self, t0: float, base: List[int],
+    ) -> Tuple[List[int], List[List[int]]]:
+        """Delta-encodes the samples, i.e., each value is the difference from
+        the previous sample, and the first sample is the difference from the
+        timestamp <t0> and counters <base>.
+
+        Returns:
+        - The timestamp deltas, in microseconds.
+        - The counter deltas of each column.
+        """
+        times = []
+        columns = [[] for _ in range(self.num_columns)]
+        prev_t, prev = t0, list(base)
+        for t, values in self.samples():
+            times.append(round((t - prev_t) * 1000000))
+            for j, value in enumerate(values):
+                columns[j].append(value - prev[j])
+            prev_t, prev = t, values
+        return times, columns
+
+
+class Sampler(ABC):
+    def __init__(self, interval_s: float, num_columns: int, capacity: int):
+        """Samples integer counters at a fixed interval on a background
+        thread, from start() until stop().
+
+        Subclasses of Sampler must call this constructor.
+
+        Parameters:
+        - interval_s: The sampling interval, in seconds.
+        - num_columns: The number of counters in each sample.
+        - capacity: The maximum number of samples. If the sampler runs for
+          longer, the oldest samples are dropped.
+        """
+        if interval_s <= 0:
+            raise ValueError(f'invalid sampling interval {interval_s}')
+        self.interval_s = interval_s
+        self.buffer = TimelineBuffer(num_columns, capacity)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.t0 = None
+        self.base = None
+
+    @abstractmethod
+    def _read(self) -> Tuple[float, List[int]]:
+        """Returns the current time and counters.
+        """
+        pass
+
+    @abstractmethod
+    def _timeline(self, columns: List[List[int]]) -> Dict:
+        """Returns the timeline of the delta-encoded columns.
+        """
+        pass
+
+    def _run(self):
+        next_t = self.t0
+        while True:
+            next_t += self.interval_s
+            if self.stopped.wait(max(0, next_t - time.monotonic())):
+                return
+            t, values = self._read()
+            self.buffer.append(t, values)
+            # Skip the missed intervals if sampling fell behind
+            if t > next_t + self.interval_s:
+                next_t = t
+
+    def start(self):
+        self.t0, self.base = self._read()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> Dict:
+        """Stops sampling after a final sample.
+
+        Returns:
+        - The timeline. 't_us' is the delta-encoded sample times, in
+          microseconds since the sampler started, and 'dropped' is the number
+          of samples dropped because the buffer was full.
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.buffer.append(*self._read())
+
+        times, columns = self.buffer.delta_encode(self.t0, self.base)
+        timeline = {
+            'interval_s': self.interval_s,
+            'dropped': self.buffer.dropped,
+            't_us': times,
+        }
+        timeline.update(self._timeline(columns))
+        return timeline
+
+
+class InterfaceSampler(Sampler):
+    def __init__(self, net, interval_s: float,
+                 capacity: int=DEFAULT_SAMPLER_CAPACITY):
+        """Samples the tx/rx bytes and packets of every interface in the
+        network <net>, an EmulatedNetwork.
+
+        The timeline has the same layout as the network statistics: the
+        sorted interfaces, and for each metric, the delta-encoded values of
+        each interface.
+        """
+        self.net = net
+        self.ifaces = list(sorted(net.iface_to_host.keys()))
+        self.metrics = net.METRICS
+        super().__init__(interval_s, len(self.ifaces) * len(self.metrics),
+                         capacity)
+
+    def _read(self) -> Tuple[float, List[int]]:
+        stats = self.net._read_raw_metrics()
+        t = time.monotonic()
+        values = [stats[iface][metric] for iface in self.ifaces
+                  for metric in self.metrics]
+        return t, values
+
+    def _timeline(self, columns: List[List[int]]) -> Dict:
+        timeline = {'ifaces': self.ifaces}
+        for m, metric in enumerate(self.metrics):
+            timeline[metric] = []
+            for i in range(len(self.ifaces)):
+                timeline[metric].append(columns[i * len(self.metrics) + m])
+        return timeline
+
+
+class QdiscSampler(Sampler):
+    METRICS = ['backlog', 'drops', 'overlimits', 'marks']
+
+    def __init__(self, net, interval_s: float,
+                 capacity: int=DEFAULT_SAMPLER_CAPACITY):
+        """Samples the backlog, drops, overlimits, and ECN marks of every
+        qdisc configured by config_iface() in the network <net>, an
+        EmulatedNetwork, i.e., the netem (2:), HTB (3:), and queue management
+        (11:) qdiscs of the emulator interfaces. Each sample executes one
+        `tc -s -j qdisc show` per emulator host.
+
+        The timeline lists the sampled qdiscs as [interface, handle] pairs,
+        and for each metric, the delta-encoded values of each qdisc. The
+        backlog, in bytes, is encoded as deltas from 0 and the counters as
+        deltas from the start of the sampler.
+        """
+        self.net = net
+        self.qdiscs = []
+        for iface in sorted(net.iface_config.keys()):
+            handles = ['2:', '3:']
+            if net.iface_config[iface]['qdisc'] not in [None, 'policer']:
+                handles.append('11:')
+            self.qdiscs.extend((iface, handle) for handle in handles)
+        self.hosts = {}
+        for iface, _ in self.qdiscs:
+            host = net.iface_to_host[iface]
+            self.hosts[host.name] = host
+        super().__init__(interval_s, len(self.qdiscs) * len(self.METRICS),
+                         capacity)
+
+    def _read(self) -> Tuple[float, List[int]]:
+        stats = {}
+        for host in self.hosts.values():
+            lines = []
+            self.net.popen(host, 'tc -s -j qdisc show', func=lines.append)
+            try:
+                stats.update(parse_tc_qdisc_stats(''.join(lines)))
+            except ValueError as e:
+                WARN(f'failed to parse {host.name} qdisc statistics: {e}')
+        t = time.monotonic()
+        values = []
+        for qdisc in self.qdiscs:
+            for metric in self.METRICS:
+                values.append(stats.get(qdisc, {}).get(metric, 0))
+        return t, values
+
+    def start(self):
+        super().start()
+        # The backlog is not a counter
+        for i in range(len(self.qdiscs)):
+            self.base[i * len(self.METRICS)] = 0
+
+    def _timeline(self, columns: List[List[int]]) -> Dict:
+        timeline = {'qdiscs': [list(qdisc) for qdisc in self.qdiscs]}
+        for m, metric in enumerate(self.METRICS):
+            timeline[metric] = []
+            for i in range(len(self.qdiscs)):
+                timeline[metric].append(columns[i * len(self.METRICS) + m])
+        return timeline
@@ -0,0 +1,109 @@
+"""
+Run benchmarks concurrently on the lanes of a MultiLaneNetwork.
+"""
+import os
+import queue
+import threading
+from typing import Callable, List, Optional
+
+from common import *
+from benchmark import Benchmark
+from network import MultiLaneNetwork, TwoSegmentNetwork
+from result import BenchmarkResult
+
+# Constructs a benchmark on the given lane network and log directory, e.g.,
+# lambda net, logdir: LinuxTCPBenchmark(net, 'label', logdir, n, cca, ...)
+BenchmarkFactory = Callable[[TwoSegmentNetwork, str], Benchmark]
+
+
+class LaneScheduler:
+    def __init__(self, net: MultiLaneNetwork, logdir: str,
+                 cpus_per_lane: float=4, max_lanes: Optional[int]=None):
+        """Schedules benchmark jobs on the lanes of <net>, running at most one
+        job per lane at a time.
+
+        Parameters:
+        - net: The multi-lane network.
+        - logdir: The base log directory. Each lane writes its logs to its own
+          subdirectory, see MultiLaneNetwork.logdir().
+        - cpus_per_lane: The number of CPUs reserved for each concurrently
+          running lane, i.e., the client, server, PEP, and emulator nodes.
+        - max_lanes: If provided, the maximum number of concurrent lanes.
+        """
+        self.net = net
+        self.logdir = logdir
+        self.cpus_per_lane = cpus_per_lane
+        self.max_lanes = max_lanes
+
+    def num_concurrent_lanes(self) -> int:
+        """The number of lanes that can run concurrently with the current CPU
+        headroom, i.e., the CPUs not used by the 1-minute load average.
+        """
+        num_lanes = len(self.net.lanes)
+        if self.max_lanes is not None:
+            num_lanes = min(num_lanes, self.max_lanes)
+        headroom = os.cpu_count() - os.getloadavg()[0]
+        return max(1, min(num_lanes, int(headroom // self.cpus_per_lane)))
+
+    def run(
+        self, jobs: List[BenchmarkFactory], num_trials: int,
+        timeout: Optional[int]=None, network_statistics: bool=False,
+    ) -> List[Optional[BenchmarkResult]]:
+        """Runs Benchmark.run_benchmark() for every job on the next available
+        lane, starting or stopping the TCP PEP on the lane as required by the
+        benchmark. Blocks until all jobs are complete.
+
+        Returns:
+        - The benchmark results in the same order as the jobs. Each result is
+          tagged with the lane it ran on in its inputs. If a job raises an
+          error, its result is None.
+        """
+        pending = queue.Queue()
+        for i, job in enumerate(jobs):
+            pending.put((i, job))
+        results = [None] * len(jobs)
+
+        def run_lane(lane: int):
+            net = self.net.lanes[lane]
+            logdir = self.net.logdir(self.logdir, lane)
+            init_logdir(logdir)
+            while True:
+                try:
+                    i, job = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[i] = self._run_job(net, logdir, job, num_trials,
+                                               timeout, network_statistics)
+                except Exception as e:
+                    ERROR(f'lane {lane} job {i} failed: {e}')
+
+        num_lanes = self.num_concurrent_lanes()
+        DEBUG(f'running {len(jobs)} jobs on {num_lanes} lanes')
+        threads = []
+        for lane in range(num_lanes):
+            thread = threading.Thread(target=run_lane, args=(lane,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _run_job(
+        self, net: TwoSegmentNetwork, logdir: str, job: BenchmarkFactory,
+        num_trials: int, timeout: Optional[int], network_statistics: bool,
+    ) -> BenchmarkResult:
+        bm = job(net, logdir)
+        if bm.pep and net.pep_process is None:
+            net.start_tcp_pep(logdir=logdir)
+        elif not bm.pep and net.pep_process is not None:
+            net.stop_tcp_pep()
+        # The server keeps running for later jobs on the lane that can reuse
+        # it, see Benchmark.start_server()
+        try:
+            result = bm.run_benchmark(num_trials, timeout, network_statistics)
+        except:
+            bm.stop_server()
+            raise
+        result.inputs['lane'] = net.lane
+        return result
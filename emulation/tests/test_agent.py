@@ -0,0 +1,68 @@
+"""
+Test agent.py.
+"""
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from agent import *
+from reactor import REACTOR
+
+# Echoes each request, or hangs on the request "hang"
+ECHO_AGENT = f'''
+import sys, time
+print('{AGENT_READY}', flush=True)
+for line in sys.stdin:
+    if line.strip() == 'hang':
+        time.sleep(60)
+    print('echo', line.strip())
+    print('{AGENT_DONE}', flush=True)
+'''
+
+
+class LocalHost:
+    name = 'local'
+
+
+class LocalNetwork:
+    """Executes background processes on the local host instead of a mininet
+    host, with the same interface as EmulatedNetwork.popen().
+    """
+    def popen(self, host, cmd, background=False, func=None, stdin=False,
+              console_logger=DEBUG):
+        p = subprocess.Popen(cmd.split(), stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             stdin=subprocess.PIPE if stdin else None)
+        return p, REACTOR.register(p, func=func)
+
+
+class TestClientAgent(unittest.TestCase):
+    def setUp(self):
+        self.script = tempfile.NamedTemporaryFile('w', suffix='.py')
+        self.script.write(ECHO_AGENT)
+        self.script.flush()
+        cmd = f'{sys.executable} -u {self.script.name}'
+        self.agent = ClientAgent(LocalNetwork(), LocalHost(), cmd)
+        self.agent.start()
+
+    def tearDown(self):
+        self.agent.stop()
+        self.script.close()
+
+    def test_requests_reuse_the_agent(self):
+        with tempfile.NamedTemporaryFile() as logfile:
+            for i in range(3):
+                lines, timeout_flag = self.agent.request(
+                    f'request {i}', logfile=logfile.name, timeout=10)
+                self.assertFalse(timeout_flag)
+                self.assertEqual(lines, [f'echo request {i}\n'])
+            with open(logfile.name) as f:
+                self.assertEqual(len(f.readlines()), 3)
+        self.assertTrue(self.agent.is_alive())
+
+    def test_timeout_stops_the_agent(self):
+        lines, timeout_flag = self.agent.request('hang', timeout=0.2)
+        self.assertTrue(timeout_flag)
+        self.assertEqual(lines, [])
+        self.assertFalse(self.agent.is_alive())
@@ -0,0 +1,78 @@
+"""
+Test capabilities.py.
+"""
+import json
+import os
+import platform
+import tempfile
+import unittest
+
+from capabilities import *
+
+
+class TestCapabilities(unittest.TestCase):
+    def setUp(self):
+        self.data = {
+            'boot_id': read_boot_id(),
+            'kernel_release': '6.1.0',
+            'linux_version': 6.1,
+            'ccas': ['reno', 'cubic'],
+            'kernel_modules': ['sch_netem', 'sch_htb', 'sch_red', 'tcp_bbr'],
+            'offloads': {'tso': True, 'gso': True},
+            'tools': {'tc': True, 'ethtool': True, 'pepsal': False},
+            'binaries': {},
+        }
+
+    def test_require(self):
+        capabilities = Capabilities(self.data)
+        capabilities.require(cca='cubic', qdisc='red')
+        capabilities.require(cca='bbr', qdisc=None)
+        with self.assertRaises(RuntimeError):
+            capabilities.require(cca='bbr2')
+        with self.assertRaises(RuntimeError):
+            capabilities.require(qdisc='pie')
+        with self.assertRaises(RuntimeError):
+            capabilities.require(pep=True)
+        with self.assertRaises(RuntimeError):
+            capabilities.require(binaries=['does/not/exist'])
+
+    def test_unknown_kernel_modules(self):
+        self.data['kernel_modules'] = None
+        capabilities = Capabilities(self.data)
+        capabilities.require(cca='bbr2', qdisc='pie')
+        with self.assertRaises(RuntimeError):
+            capabilities.require(qdisc='unknown')
+
+    def test_reads_cache_from_same_boot(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'capabilities.json')
+            with open(path, 'w') as f:
+                json.dump(self.data, f)
+            capabilities = get_capabilities(path)
+            self.assertEqual(capabilities.linux_version, 6.1)
+            self.assertIs(get_capabilities(path), capabilities)
+
+    def test_ignores_cache_writable_by_others(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'capabilities.json')
+            with open(path, 'w') as f:
+                json.dump(self.data, f)
+            os.chmod(path, 0o666)
+            capabilities = get_capabilities(path)
+            self.assertEqual(capabilities.data['kernel_release'],
+                             platform.release())
+
+    def test_probes_cache_again_if_missing(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'capabilities.json')
+            self.data['tools']['tc'] = False
+            with open(path, 'w') as f:
+                json.dump(self.data, f)
+            capabilities = get_capabilities(path)
+            try:
+                capabilities.require()
+            except RuntimeError:
+                pass
+            self.assertTrue(capabilities.probed)
+            self.assertEqual(capabilities.data['kernel_release'],
+                             platform.release())
@@ -83,6 +83,22 @@ class TestBenchmarkCUBIC(CLITestCase):
     def test_linux_tcp_benchmark_with_pep(self):
         self.execute_command_and_check('tcp', ['--pep'], ['-cca', 'cubic'])
 
+    def test_linux_tcp_benchmark_with_pep_buffers(self):
+        self.execute_command_and_check('tcp', [
+            '--pep', '--tcp-rmem-r1', '4K,128K,16M', '--sndbuf', '1M',
+            '--notsent-lowat', '128K'], ['-cca', 'cubic'])
+
+    def test_linux_tcp_benchmark_with_pep_and_host_ccas(self):
+        self.execute_command_and_check('tcp', ['--pep'], [
+            '-cca', 'cubic', '--cca-r1', 'cubic', '--cca-h2', 'bbr'])
+
+    def test_linux_tcp_benchmark_without_tls(self):
+        self.execute_command_and_check('tcp', [], ['-cca', 'cubic', '--no-tls'])
+
+    def test_linux_tcp_benchmark_with_server_workers(self):
+        self.execute_command_and_check('tcp', [], ['-cca', 'cubic',
+                                                   '--server-workers', '2'])
+
     @unittest.skip
     def test_google_quic_benchmark(self):
         self.execute_command_and_check('google', [], ['-cca', 'cubic'])
@@ -102,6 +118,10 @@ class TestBenchmarkMultipleTrials(CLITestCase):
     def test_linux_tcp_benchmark_with_pep(self):
         self.execute_command_and_check('tcp', ['--pep'], num_trials=2)
 
+    def test_linux_tcp_benchmark_with_client_agent(self):
+        self.execute_command_and_check('tcp', [], ['--client-agent'],
+                                       num_trials=2)
+
     @unittest.skip
     def test_google_quic_benchmark(self):
         self.execute_command_and_check('google', num_trials=2)
@@ -131,3 +151,84 @@ class TestBenchmarkBBR(CLITestCase):
 
     def test_picoquic_quic_benchmark(self):
         self.execute_command_and_check('picoquic', [], ['-cca', 'bbr'])
+
+
+class TestClientProgress(CLITestCase):
+    def test_linux_tcp_benchmark(self):
+        outputs = self.execute_command_and_check('tcp', [], ['-n', '1M'])
+        progress = outputs[0]['progress']
+        self.assertLessEqual(progress['ttfb_s'], progress['t50_s'])
+        self.assertLessEqual(progress['t50_s'], progress['t90_s'])
+        self.assertLessEqual(progress['t90_s'], progress['t100_s'])
+        self.assertGreater(len(progress['throughput_mbps']), 0)
+
+    def test_linux_tcp_benchmark_phases(self):
+        outputs = self.execute_command_and_check('tcp', [], ['-n', '1M'])
+        phases = ['connect_s', 'tls_s', 'request_s', 'first_byte_s',
+                  'last_byte_s']
+        times = [outputs[0][phase] for phase in phases]
+        self.assertEqual(times, sorted(times))
+
+    def test_linux_tcp_benchmark_keepalive(self):
+        outputs = self.execute_command_and_check('tcp', [], [
+            '-n', '1M', '--requests', '3', '--reuse', 'keepalive'])
+        requests = outputs[0]['requests']
+        self.assertEqual(len(requests), 3)
+        for request in requests[1:]:
+            self.assertNotIn('connect_s', request)
+
+    def test_linux_tcp_benchmark_resume(self):
+        outputs = self.execute_command_and_check('tcp', [], [
+            '-n', '1M', '--requests', '2', '--reuse', 'resume'])
+        requests = outputs[0]['requests']
+        self.assertFalse(requests[0]['resumed'])
+        self.assertTrue(requests[1]['resumed'])
+
+    def test_linux_tcp_benchmark_fastopen(self):
+        outputs = self.execute_command_and_check('tcp', [], [
+            '-n', '10K', '--fastopen'], num_trials=2)
+        self.assertTrue(outputs[1]['tfo'])
+        self.assertGreater(
+            outputs[1]['tfo_counters']['h1']['TCPFastOpenActive'], 0)
+
+
+class TestSweep(CLITestCase):
+    def test_pep_sweep(self):
+        label = 'test_pep_sweep'
+        output_file = os.path.join('results', f'{label}.json')
+        self.addCleanup(lambda: os.path.exists(output_file) and
+                        os.remove(output_file))
+        stdout, _ = self.execute_command('tcp', [
+            '--pep-sweep', '--label', label], [
+            '-n', '10K', '100K', '-cca', 'cubic'])
+
+        # One JSON line per configuration, in groups of PEP off and on
+        lines = self.parse_json_lines(stdout)
+        configs = [(line['inputs']['pep'], line['inputs']['data_size'])
+                   for line in lines]
+        self.assertEqual(configs, [
+            (False, 10000), (False, 100000), (True, 10000), (True, 100000)])
+        for line in lines:
+            self.assertEqual(line['inputs']['cca'], 'cubic')
+            self.assertTrue(line['outputs'][0]['success'], line)
+
+        # The saved results are the list of every configuration
+        with open(output_file) as f:
+            saved = json.load(f)
+        self.assertEqual(len(saved), 4)
+        self.assertEqual([entry['pep'] for entry in saved],
+                         [False, False, True, True])
+
+
+class TestMultiFlow(CLITestCase):
+    def test_split_and_unsplit_tcp_flows(self):
+        outputs = self.execute_command_and_check('multiflow', [], [
+            '--flow', 'tcp:cubic:pep', '--flow', 'tcp:bbr', '-n', '1M'])
+        flows = outputs[0]['flows']
+        self.assertEqual(len(flows), 2)
+        for flow in flows:
+            self.assertTrue(flow['success'], flow)
+            self.assertGreater(flow['throughput_mbps'], 0)
+        self.assertGreaterEqual(outputs[0]['jain_index'], 0.5)
+        self.assertLessEqual(outputs[0]['jain_index'], 1)
+        self.assertGreater(outputs[0]['utilization'], 0)
@@ -18,6 +18,13 @@ class TestSubprocessHandling(unittest.TestCase):
         self.assertEqual(len(output), n, output)
         self.assertEqual(p.wait(), 0)
 
+    def test_line_reader_splits_lines_incrementally(self):
+        reader = LineReader()
+        self.assertEqual(reader.feed(b'ab'), [])
+        self.assertEqual(reader.feed(b'c\nd\ne'), ['abc\n', 'd\n'])
+        self.assertEqual(reader.feed(b''), ['e'])
+        self.assertEqual(reader.feed(b''), [])
+
 
 class TestHelperFunctions(unittest.TestCase):
     def test_calculate_bdp(self):
@@ -27,10 +34,76 @@ class TestHelperFunctions(unittest.TestCase):
         bw2 = 1000
         expected_mbits = 0.6 # 60ms * 10Mbit/s
         expected_bytes = expected_mbits * 1000000 / 8
-        actual_bytes = calculate_bdp(delay1, delay2, bw1, bw2)
+        actual_bytes = calculate_bdp([delay1, delay2], [bw1, bw2])
         self.assertEqual(actual_bytes, expected_bytes,
                          'calculated bdp in bytes')
 
+    def test_calculate_rtt(self):
+        self.assertEqual(calculate_rtt([20, 10]), 60)
+        self.assertEqual(calculate_rtt([5]), 10)
+
+    def test_jain_fairness_index(self):
+        self.assertEqual(jain_fairness_index([5, 5, 5, 5]), 1.)
+        self.assertEqual(jain_fairness_index([8, 0, 0, 0]), 0.25)
+        self.assertAlmostEqual(jain_fairness_index([1, 3]), 0.8)
+
+    def test_parse_tcp_mem(self):
+        self.assertEqual(parse_tcp_mem('4096,131072,6M'),
+                         [4096, 131072, 6000000])
+        with self.assertRaises(ValueError):
+            parse_tcp_mem('4096,131072')
+        with self.assertRaises(ValueError):
+            parse_tcp_mem('6M,131072,4096')
+
+    def test_parse_proc_net_dev(self):
+        text = (
+            'Inter-|   Receive                                                |  Transmit\n'
+            ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed\n'
+            '    lo:     100       2    0    0    0     0          0         0      100       2    0    0    0     0       0          0\n'
+            'h1-eth0:  15140      10    0    1    0     0          0         0      980      12    0    0    0     0       0          0\n'
+        )
+        stats = parse_proc_net_dev(text)
+        self.assertEqual(set(stats.keys()), {'lo', 'h1-eth0'})
+        self.assertEqual(stats['h1-eth0'], {
+            'rx_bytes': 15140,
+            'rx_packets': 10,
+            'tx_bytes': 980,
+            'tx_packets': 12,
+        })
+
+    def test_parse_proc_net_netstat(self):
+        text = (
+            'TcpExt: SyncookiesSent TCPFastOpenActive TCPFastOpenPassive\n'
+            'TcpExt: 0 3 1\n'
+            'IpExt: InNoRoutes InOctets\n'
+            'IpExt: 0 15140\n'
+        )
+        stats = parse_proc_net_netstat(text)
+        self.assertEqual(stats['TcpExt'], {
+            'SyncookiesSent': 0,
+            'TCPFastOpenActive': 3,
+            'TCPFastOpenPassive': 1,
+        })
+        self.assertEqual(stats['IpExt']['InOctets'], 15140)
+
+    def test_parse_tc_qdisc_stats(self):
+        text = json.dumps([
+            {'kind': 'netem', 'handle': '2:', 'dev': 'e1-eth0', 'root': True,
+             'bytes': 3000, 'packets': 2, 'drops': 1, 'overlimits': 0,
+             'requeues': 0, 'backlog': 0, 'qlen': 0},
+            {'kind': 'red', 'handle': '11:', 'parent': '3:10',
+             'dev': 'e1-eth0', 'bytes': 3000, 'packets': 2, 'drops': 4,
+             'overlimits': 5, 'requeues': 0, 'marked': 3, 'early': 4,
+             'pdrop': 0, 'other': 0, 'backlog': 1514, 'qlen': 1},
+        ])
+        stats = parse_tc_qdisc_stats(text)
+        self.assertEqual(stats[('e1-eth0', '2:')], {
+            'backlog': 0, 'drops': 1, 'overlimits': 0, 'marks': 0,
+        })
+        self.assertEqual(stats[('e1-eth0', '11:')], {
+            'backlog': 1514, 'drops': 4, 'overlimits': 5, 'marks': 3,
+        })
+
     def test_mac(self):
         self.assertEqual(mac(0), '00:00:00:00:00:00')
         self.assertEqual(mac(1), '00:00:00:00:00:01')
@@ -0,0 +1,62 @@
+"""
+Test daemon.py.
+"""
+import unittest
+
+from daemon import *
+
+
+class FakeNetwork:
+    """A built two segment network that records reconfigure() instead of
+    changing the qdiscs.
+    """
+    def __init__(self):
+        self.settings = {k: v for k, v in DEFAULT_NETWORK.items()
+                         if k != 'qdisc'}
+        self.qdisc = DEFAULT_NETWORK['qdisc']
+        self.tcp_buffers = {}
+        self.reconfigured = []
+
+    def reconfigure(self, qdisc=None, **settings):
+        self.reconfigured.append(dict(settings, qdisc=qdisc))
+        self.settings.update(settings)
+        self.qdisc = qdisc
+
+
+class TestSetupNetwork(unittest.TestCase):
+    def setUp(self):
+        self.daemon = EmulationDaemon('/tmp/unused.sock', '/tmp/unused')
+        self.daemon.net = FakeNetwork()
+        self.daemon.topology = 'two_segment'
+        self.daemon.pacing = False
+
+    def job(self, network, protocol='tcp'):
+        return Job(0, {'protocol': protocol, 'network': network}, None, None)
+
+    def test_omitted_settings_are_reset_to_defaults(self):
+        self.daemon._setup_network(self.job({'loss1': '2', 'bw2': 50}))
+        self.daemon._setup_network(self.job({'delay2': 50}))
+        net = self.daemon.net
+        self.assertEqual(net.settings['delay2'], 50)
+        self.assertEqual(net.settings['loss1'], DEFAULT_NETWORK['loss1'])
+        self.assertEqual(net.settings['bw2'], DEFAULT_NETWORK['bw2'])
+        self.assertEqual(net.reconfigured[-1], {
+            'delay2': 50,
+            'loss1': DEFAULT_NETWORK['loss1'],
+            'bw2': DEFAULT_NETWORK['bw2'],
+            'qdisc': DEFAULT_NETWORK['qdisc'],
+        })
+
+    def test_same_settings_do_not_reconfigure(self):
+        self.daemon._setup_network(self.job({}))
+        self.daemon._setup_network(self.job({'delay1': 1}))
+        self.assertEqual(self.daemon.net.reconfigured, [])
+
+    def test_buffer_settings(self):
+        job = self.job({'tcp_rmem_r1': '4K,128K,6M', 'sndbuf': '1M'})
+        self.assertEqual(job.network, {})
+        self.assertEqual(job.tcp_buffers,
+                         {'tcp_rmem': {'r1': [4000, 128000, 6000000]}})
+        self.assertEqual(job.socket_options, {'sndbuf': 1000000})
+        with self.assertRaises(ValueError):
+            self.job({'sndbuf': '1M'}, protocol='google')
@@ -0,0 +1,56 @@
+"""
+Test logsink.py.
+"""
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+
+from logsink import LogSink
+
+
+class TestLogSink(unittest.TestCase):
+    def setUp(self):
+        self._logdir = tempfile.TemporaryDirectory()
+        self.logfile = f'{self._logdir.name}/server.log'
+        self.sink = LogSink()
+
+    def tearDown(self):
+        self.sink.close()
+        self._logdir.cleanup()
+
+    def test_flush_writes_queued_output(self):
+        self.sink.write(self.logfile, 'line1\n')
+        self.sink.write(self.logfile, 'line2\n')
+        self.sink.flush(self.logfile)
+        with open(self.logfile) as f:
+            self.assertEqual(f.read(), 'line1\nline2\n')
+
+        # Output is appended after the logfile is closed
+        self.sink.close(self._logdir.name)
+        self.sink.write(self.logfile, 'line3\n')
+        self.sink.flush()
+        with open(self.logfile) as f:
+            self.assertEqual(f.read(), 'line1\nline2\nline3\n')
+
+    def test_rotates_and_compresses(self):
+        self.sink.configure(max_bytes=10, backup_count=2, compress=True)
+        for i in range(4):
+            self.sink.write(self.logfile, f'line{i:05}\n')
+        self.sink.flush()
+        self.assertFalse(os.path.exists(f'{self.logfile}.3.gz'))
+        with gzip.open(f'{self.logfile}.1.gz', 'rt') as f:
+            self.assertEqual(f.read(), 'line00003\n')
+        with gzip.open(f'{self.logfile}.2.gz', 'rt') as f:
+            self.assertEqual(f.read(), 'line00002\n')
+
+    def test_error_does_not_stop_the_sink(self):
+        self.sink.write(self.logfile, b'not a string\n')
+        self.sink.write(self.logfile, 'line\n')
+        flush = threading.Thread(target=self.sink.flush, daemon=True)
+        flush.start()
+        flush.join(timeout=5)
+        self.assertFalse(flush.is_alive(), 'flush blocks after an error')
+        with open(self.logfile) as f:
+            self.assertEqual(f.read(), 'line\n')
@@ -1,6 +1,7 @@
 """
 Test network.py.
 """
+import asyncio
 import unittest
 import os
 import subprocess
@@ -351,6 +352,121 @@ class TestPopen(NetworkTestCase):
         self._test_appends_output_to_logfile(background=True)
 
 
+class TestAsyncPopen(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.setUpOneSegmentNetwork()
+
+    def test_callback_and_timeout(self):
+        host = self.net.h1
+        lines = []
+        timeout_flag = asyncio.run(
+            self.net.apopen(host, 'seq 10', func=lines.append))
+        self.assertFalse(timeout_flag)
+        self.assertEqual(len(lines), 10, lines)
+        self.assertTrue(asyncio.run(self.net.apopen(host, 'sleep 2', timeout=1)))
+        with self.assertRaises(ValueError):
+            asyncio.run(self.net.apopen(host, 'ls nonexistent_file_1234'))
+
+    def test_background_readiness(self):
+        host = self.net.h1
+        async def start(cmd, timeout):
+            p, reader = await self.net.apopen(host, cmd, background=True,
+                ready=lambda line: line.startswith('PING'), timeout=timeout)
+            self.assertIsNone(p.returncode)
+            p.terminate()
+            await p.wait()
+            await reader
+        asyncio.run(start('ping -c 60 127.0.0.1', 5))
+        with self.assertRaises(TimeoutError):
+            asyncio.run(start('sleep 60', 1))
+        with self.assertRaises(ValueError):
+            asyncio.run(start('true', 5))
+
+    def test_cancellation_kills_process(self):
+        host = self.net.h1
+        async def cancel():
+            task = asyncio.create_task(self.net.apopen(host, 'sleep 60'))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        asyncio.run(cancel())
+        output = host.cmd('pgrep -f "sleep 60"')
+        self.assertEqual(output.strip(), '')
+
+
+class TestReconfigure(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.setUpTwoSegmentNetwork(delay1=1, delay2=10)
+
+    def test_reconfigure_delay(self):
+        result = self.ping(self.net.h1, self.net.h2, n=5)
+        self.assertLess(abs(result.rtt_avg() - 22), self.threshold / 2)
+        self.net.reconfigure(delay2=30)
+        self.assertEqual(self.net.settings['delay2'], 30)
+        self.assertEqual(self.net.iface_config['e2-eth0']['delay'], 30)
+        result = self.ping(self.net.h1, self.net.h2, n=5)
+        self.assertLess(abs(result.rtt_avg() - 62), self.threshold / 2)
+
+    def test_reconfigure_qdisc(self):
+        for qdisc in ['bfifo-large', 'policer', 'pie', 'red', 'codel',
+                      'fq_codel']:
+            self.net.reconfigure(qdisc=qdisc, bw1=20, loss2='1')
+            for iface in ['e1-eth0', 'e1-eth1', 'e2-eth0', 'e2-eth1']:
+                self.assertEqual(self.net.iface_config[iface]['qdisc'], qdisc)
+            self.ping(self.net.h1, self.net.h2, n=5)
+
+    def test_reconfigure_unknown_setting(self):
+        with self.assertRaises(ValueError):
+            self.net.reconfigure(delay3=10)
+
+
+class TestConfigBackend(NetworkTestCase):
+    def _test_config_backend(self, config_backend):
+        self.net = TwoSegmentNetwork(1, 10, 0, '1', 50, 10, 'red', False,
+                                     config_backend=config_backend)
+        self.stopped = False
+        self.assertGreater(self.net.config_time_s, 0)
+        self.assertEqual(len(self.net.config_batches), 0)
+        for iface in self.net.iface_config:
+            self.net.verify_iface(iface)
+        result = self.ping(self.net.h1, self.net.h2, n=5)
+        self.assertLess(abs(result.rtt_avg() - 22), self.threshold / 2)
+
+    def test_popen_backend(self):
+        self._test_config_backend('popen')
+
+    def test_batch_backend(self):
+        self._test_config_backend('batch')
+
+
+class TestMultiLane(NetworkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.net = MultiLaneNetwork(2, 1, 10, 0, 0, 50, 10, 'red', False)
+        self.stopped = False
+
+    def test_lanes_have_distinct_names_and_subnets(self):
+        lane0, lane1 = self.net.lanes
+        self.assertEqual(lane0.h1.name, 'h1')
+        self.assertEqual(lane1.h1.name, 'l1h1')
+        self.assertEqual(lane0.h2.IP(), '172.16.2.10')
+        self.assertEqual(lane1.h2.IP(), '172.16.4.10')
+        self.assertNotEqual(lane0.pep_mark, lane1.pep_mark)
+        ifaces0 = set(lane0.iface_to_host.keys())
+        ifaces1 = set(lane1.iface_to_host.keys())
+        self.assertEqual(len(ifaces0 & ifaces1), 0)
+
+    def test_lanes_are_isolated(self):
+        lane0, lane1 = self.net.lanes
+        self.ping(lane0.h1, lane0.h2)
+        self.ping(lane1.h1, lane1.h2)
+        output = lane1.h1.cmd(f'ping -W 1 -c 1 {lane0.h2.IP()}')
+        self.assertFalse(PingResult(output).success, output)
+
+
 class TestPrepopulateArpTable(NetworkTestCase):
     def setUp(self):
         super().setUp()
@@ -0,0 +1,30 @@
+"""
+Test reactor.py.
+"""
+import subprocess
+import tempfile
+import unittest
+
+from reactor import *
+
+
+class TestReactor(unittest.TestCase):
+    def test_dispatches_output_of_background_processes(self):
+        lines = []
+        with tempfile.NamedTemporaryFile() as logfile:
+            handles = []
+            for cmd in ['seq 10', 'ls nonexistent_stderr_file_name_1234']:
+                p = subprocess.Popen(cmd.split(), stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+                handles.append(REACTOR.register(p, func=lines.append,
+                                                logfile=logfile.name))
+            for handle in handles:
+                handle.p.wait()
+                handle.join()
+                self.assertFalse(handle.is_alive())
+            with open(logfile.name) as f:
+                log = f.readlines()
+        self.assertEqual([line for line in lines if line[0].isdigit()],
+                         [f'{i}\n' for i in range(1, 11)])
+        self.assertEqual(len(lines), 11, lines)
+        self.assertEqual(sorted(log), sorted(lines))
@@ -0,0 +1,28 @@
+"""
+Test sampler.py.
+"""
+import unittest
+
+from sampler import *
+
+
+class TestTimelineBuffer(unittest.TestCase):
+    def test_delta_encode(self):
+        buffer = TimelineBuffer(2, capacity=4)
+        buffer.append(1.01, [10, 100])
+        buffer.append(1.02, [15, 100])
+        buffer.append(1.03, [30, 250])
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.dropped, 0)
+        times, columns = buffer.delta_encode(1.0, [0, 50])
+        self.assertEqual(times, [10000, 10000, 10000])
+        self.assertEqual(columns, [[10, 5, 15], [50, 0, 150]])
+
+    def test_overwrites_oldest_sample(self):
+        buffer = TimelineBuffer(1, capacity=2)
+        for i in range(5):
+            buffer.append(float(i), [i])
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(buffer.dropped, 3)
+        samples = [(t, list(values)) for t, values in buffer.samples()]
+        self.assertEqual(samples, [(3.0, [3]), (4.0, [4])])
@@ -10,7 +10,8 @@ from collections import defaultdict
 from typing import List, Tuple, Dict, Optional
 
 from common import WORKDIR
-from experiment import Treatment, NetworkSetting, DirectNetworkSetting, Experiment
+from experiment import Treatment, NetworkSetting, DirectNetworkSetting, Experiment, \
+    SOCKET_OPTION_SETTINGS
 
 DEFAULT_DATA_HOME = f'{WORKDIR}/data'
 
@@ -51,14 +52,16 @@ class RawDataFile:
         if timeout is not None:
             cmd.append('--timeout')
             cmd.append(str(timeout))
+        protocol = self._treatment.protocol
         for key in self._network_setting.labels:
-            cmd.append(f'--{key}')
+            if key in SOCKET_OPTION_SETTINGS and protocol != 'tcp':
+                continue
+            cmd.append(f'--{key.replace("_", "-")}')
             cmd.append(str(self._network_setting.settings[key]))
         cmd.append('-t')
         cmd.append(str(num_trials))
         cmd.append('--label')
         cmd.append(self._treatment.label())
-        protocol = self._treatment.protocol
         if protocol == 'tcp' and self._treatment.pep:
             cmd.append('--pep')
         cmd.append(protocol)
@@ -69,6 +72,27 @@ class RawDataFile:
         cmd.append(str(data_size))
         return ' '.join(cmd)
 
+    def job(self, data_size: int, num_trials: int, timeout: Optional[int],
+            max_data_size: Optional[int]=None):
+        """The equivalent of cmd() as a job for the emulation daemon. The
+        server is started with <max_data_size> bytes so that it can be reused
+        by the jobs for every smaller data size."""
+        network = dict(self._network_setting.settings)
+        if self._treatment.protocol != 'tcp':
+            for key in SOCKET_OPTION_SETTINGS:
+                network.pop(key, None)
+        return {
+            'network': network,
+            'protocol': self._treatment.protocol,
+            'cca': self._treatment.cca,
+            'pep': self._treatment.protocol == 'tcp' and self._treatment.pep,
+            'n': data_size,
+            'max_n': max_data_size,
+            'trials': num_trials,
+            'timeout': timeout,
+            'label': self._treatment.label(),
+        }
+
 
 class RawDataParser:
     def __init__(
@@ -186,8 +210,19 @@ class RawDataParser:
 """For executing mininet commands to collect missing data.
 """
 class RawDataExecutor:
-    def __init__(self, timeout):
+    def __init__(self, timeout, socket_path: Optional[str]=None):
+        """Parameters:
+        - socket_path: If provided, submits the commands as jobs to the
+          emulation daemon listening on this Unix socket instead of executing
+          them in a subprocess (see emulation/daemon.py).
+        """
         self.timeout = timeout
+        self.client = None
+        if socket_path is not None:
+            if WORKDIR not in sys.path:
+                sys.path.append(WORKDIR)
+            from emulation.daemon_client import EmulationClient
+            self.client = EmulationClient(socket_path)
 
     def _collect_missing_data(
         self,
@@ -195,16 +230,23 @@ class RawDataExecutor:
         chunk_size: int=10,
     ):
         print(len(missing_data))
+        max_data_size = max([ds for _, ds, _ in missing_data], default=None)
         for file, data_size, num_missing in missing_data:
             remaining = num_missing
             while remaining != 0:
                 num_trials = min(chunk_size, remaining)
                 start = time.time()
-                self._execute_chunk(file, data_size, num_trials)
+                self._execute_chunk(file, data_size, num_trials,
+                                    max_data_size)
                 print(time.time() - start)
                 remaining -= num_trials
 
-    def _execute_chunk(self, file: RawDataFile, data_size: int, num_trials: int):
+    def _execute_chunk(self, file: RawDataFile, data_size: int, num_trials: int,
+                       max_data_size: Optional[int]=None):
+        if self.client is not None:
+            self._execute_job(file, data_size, num_trials, max_data_size)
+            return
+
         # Start the process
         cmd = file.cmd(data_size, num_trials, timeout=self.timeout)
         print(cmd, end=' ')
@@ -247,6 +289,25 @@ class RawDataExecutor:
             sys.exit(1)
 
 
+    def _execute_job(self, file: RawDataFile, data_size: int, num_trials: int,
+                     max_data_size: Optional[int]=None):
+        job = file.job(data_size, num_trials, timeout=self.timeout,
+                       max_data_size=max_data_size)
+        print(job, end=' ')
+        try:
+            result = self.client.run_job(**job)
+        except RuntimeError as e:
+            print(f'execute error: {e}')
+            sys.exit(1)
+
+        # Write the result in the same format as the stdout of main.py
+        with open(file.stdout_filename(), 'a') as stdout,\
+             open(file.fulllog_filename(), 'a') as fulllog:
+            line = json.dumps(result) + '\n'
+            stdout.write(line)
+            fulllog.write(line)
+
+
 class RawData(RawDataParser, RawDataExecutor):
     def __init__(
         self,
@@ -256,6 +317,7 @@ class RawData(RawDataParser, RawDataExecutor):
         max_data_sizes: Dict[str, int]={},
         max_networks: Dict[str, int]={},
         data_suffix: str='',
+        socket_path: Optional[str]=None,
     ):
         """Parameters:
         - execute: Whether to collect missing data points.
@@ -272,6 +334,8 @@ class RawData(RawDataParser, RawDataExecutor):
           sizes.
         - data_suffix: The suffix of the directory to {WORKDIR}/data in
           which to parse raw data.
+        - socket_path: If provided, collects missing data points with the
+          emulation daemon listening on this Unix socket.
         """
         if len(data_suffix) > 0:
             data_home = f'{DEFAULT_DATA_HOME}/{data_suffix}'
@@ -279,7 +343,7 @@ class RawData(RawDataParser, RawDataExecutor):
             data_home = DEFAULT_DATA_HOME
         RawDataParser.__init__(self, exp, max_data_sizes=max_data_sizes,
             max_networks=max_networks, data_home=data_home)
-        RawDataExecutor.__init__(self, exp.timeout)
+        RawDataExecutor.__init__(self, exp.timeout, socket_path)
 
         for i in range(max_retries):
             missing_data = self._find_missing_data()
@@ -318,6 +382,7 @@ class DirectRawData(RawDataParser, RawDataExecutor):
         max_retries=10,
         max_num_timeouts=1,
         data_suffix: str='',
+        socket_path: Optional[str]=None,
     ):
         """Parameters:
         - execute: Whether to collect missing data points.
@@ -325,6 +390,8 @@ class DirectRawData(RawDataParser, RawDataExecutor):
           points after the first attempt.
         - data_suffix: The suffix of the directory to {WORKDIR}/data in
           which to parse raw data.
+        - socket_path: If provided, collects missing data points with the
+          emulation daemon listening on this Unix socket.
         """
         if len(data_suffix) > 0:
             data_home = f'{DEFAULT_DATA_HOME}/{data_suffix}'
@@ -332,7 +399,7 @@ class DirectRawData(RawDataParser, RawDataExecutor):
             data_home = DEFAULT_DATA_HOME
         RawDataParser.__init__(self, exp, max_data_sizes={}, max_networks={},
             data_home=data_home)
-        RawDataExecutor.__init__(self, exp.timeout)
+        RawDataExecutor.__init__(self, exp.timeout, socket_path)
 
         for i in range(max_retries):
             treatments = self.exp.get_treatments()
@@ -68,6 +68,19 @@ class PicoQUICTreatment(Treatment):
         return self._label
 
 
+# Optional settings of the TCP buffer sysctls of each host and the socket
+# options of the Linux TCP endpoints, which are only part of a network setting
+# if set, e.g., tcp_rmem_r1='4K,128K,6M' or sndbuf=4000000
+BUFFER_SETTINGS = [
+    'tcp_rmem_h1', 'tcp_rmem_r1', 'tcp_rmem_h2',
+    'tcp_wmem_h1', 'tcp_wmem_r1', 'tcp_wmem_h2',
+    'sndbuf', 'rcvbuf', 'notsent_lowat',
+]
+
+# The buffer settings that only apply to the Linux TCP treatments
+SOCKET_OPTION_SETTINGS = ['sndbuf', 'rcvbuf', 'notsent_lowat']
+
+
 class NetworkSetting:
     DEFAULTS = {
         'delay1': 1,
@@ -82,9 +95,10 @@ class NetworkSetting:
     def __init__(self, delay1: Optional[int]=None, delay2: Optional[int]=None,
                  loss1: Optional[str]=None, loss2: Optional[str]=None,
                  bw1: Optional[int]=None, bw2: Optional[int]=None,
-                 qdisc: Optional[str]=None):
+                 qdisc: Optional[str]=None, **buffers):
         """
         Labels is a list of setting names that are different from default.
+        The keyword arguments <buffers> are the BUFFER_SETTINGS that are set.
         """
         self.settings = {
             'delay1': delay1,
@@ -104,6 +118,12 @@ class NetworkSetting:
                 self.settings[key] = NetworkSetting.DEFAULTS[key]
             else:
                 self.labels.append(key)
+        for key, value in buffers.items():
+            if key not in BUFFER_SETTINGS:
+                raise ValueError(f'unknown buffer setting {key}')
+            if value is not None:
+                self.settings[key] = value
+                self.labels.append(key)
         self.labels.sort()
 
     def set(self, key: str, value):
@@ -124,6 +144,8 @@ class NetworkSetting:
             bw1=self.settings['bw2'],
             bw2=self.settings['bw1'],
             qdisc=self.settings.get('qdisc'),
+            **{key: self.settings[key] for key in BUFFER_SETTINGS
+               if key in self.settings},
         )
 
     def clone(self):
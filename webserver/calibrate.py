@@ -0,0 +1,75 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import os
+import threading
+
+DEFAULT_CERTFILE = f'{os.environ["HOME"]}/connection-splitting/deps/certs/out/leaf_cert.pem'
+DEFAULT_KEYFILE  = f'{os.environ["HOME"]}/connection-splitting/deps/certs/out/leaf_cert.key'
+BASE = os.path.dirname(os.path.abspath(__file__))
+
+# Start the server on the loopback interface and block until it is serving
+def start_server(port, n, certfile, keyfile, tls):
+    cmd = [sys.executable, '-u', f'{BASE}/http_server.py',
+           '--server-port', str(port), '-n', str(n),
+           '--certfile', certfile, '--keyfile', keyfile]
+    if not tls:
+        cmd.append('--no-tls')
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, text=True)
+    for line in server.stderr:
+        if 'Serving' in line:
+            # Drain the request logs so that the server never blocks on them
+            threading.Thread(target=server.stderr.read, daemon=True).start()
+            return server
+    raise RuntimeError(f'server exited with {server.wait()}')
+
+# Download n bytes and return the runtime of the GET request, in seconds
+def download(port, n, tls):
+    cmd = [sys.executable, f'{BASE}/http_client.py',
+           '--server-port', str(port), '-n', str(n)]
+    if not tls:
+        cmd.append('--no-tls')
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        if not line.startswith('[TCP_CLIENT]'):
+            continue
+        kvs = dict(kv.split('=', 1) for kv in line.split()[1:] if '=' in kv)
+        if kvs['status_code'] != '200':
+            raise RuntimeError(f'status code {kvs["status_code"]}')
+        return float(kvs['time_s'])
+    raise RuntimeError(f'client failed: {result.stderr}')
+
+# Report the maximum rate of the HTTP server and client on this machine with
+# and without TLS, i.e., the rate above which the endpoints and not the
+# emulated link limit the Linux TCP benchmark
+def run(port, n, trials, certfile, keyfile):
+    for tls in [True, False]:
+        server = start_server(port, n, certfile, keyfile, tls)
+        try:
+            rates = []
+            for _ in range(trials):
+                time_s = download(port, n, tls)
+                rates.append(8 * n / 1000000 / time_s)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'[CALIBRATE] tls={tls} n={n} trials={trials} '
+              f'max_mbps={max(rates):.1f} '
+              f'median_mbps={statistics.median(rates):.1f}', flush=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Loopback calibration of the maximum rate of the HTTP '\
+                    'server and client with and without TLS',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument('--server-port', type=int, default=8443)
+    parser.add_argument('--certfile', type=str, default=DEFAULT_CERTFILE)
+    parser.add_argument('--keyfile', type=str, default=DEFAULT_KEYFILE)
+    parser.add_argument('-n', type=int, default=100000000,
+        help='Number of bytes to download in each trial, 1e8 is 100 MB')
+    parser.add_argument('-t', '--trials', type=int, default=5)
+    args = parser.parse_args()
+    run(args.server_port, args.n, args.trials, args.certfile, args.keyfile)
@@ -1,43 +1,196 @@
 import argparse
 import http.client
+import socket
 import ssl
 import sys
 import time
 
-def run(server_ip, server_port, n, verbose):
-    # Set up an SSL context to ignore self-signed certificate warnings
-    # For testing purposes, disable certificate verification
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+# Linux constants of TCP Fast Open, which the socket module may not define
+TCP_FASTOPEN_CONNECT = getattr(socket, 'TCP_FASTOPEN_CONNECT', 30)
+TCPI_OPT_SYN_DATA = 32
+TCP_NOTSENT_LOWAT = getattr(socket, 'TCP_NOTSENT_LOWAT', 25)
+
+# Set up an SSL context to ignore self-signed certificate warnings
+# For testing purposes, disable certificate verification
+def create_ssl_context():
     ctx = ssl.create_default_context()
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+# Set the buffer sizes and the limit of unsent bytes of the socket, in bytes,
+# if provided
+def set_buffer_options(sock, sndbuf=None, rcvbuf=None, notsent_lowat=None):
+    if sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if notsent_lowat is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_NOTSENT_LOWAT, notsent_lowat)
+
+# Connect to the server and complete the TLS handshake before the request,
+# resuming the TLS session if provided, and record the time each phase
+# completes since the start of the request. With TCP Fast Open, the connect
+# is deferred until the first write, i.e., the ClientHello or the request, so
+# the SYN carries data if the host has a cookie for the server. The TCP and
+# TLS handshakes then complete together.
+def connect(server_ip, server_port, ctx, session, start, phases,
+            fastopen=False, buffer_options={}):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    set_buffer_options(sock, **buffer_options)
+    if fastopen:
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_FASTOPEN_CONNECT, 1)
+        if ctx is not None:
+            sock = ctx.wrap_socket(sock, server_hostname=server_ip,
+                                   session=session)
+        sock.connect((server_ip, server_port))
+        phases['connect_s'] = time.monotonic() - start
+        if ctx is not None:
+            phases['tls_s'] = phases['connect_s']
+    else:
+        sock.connect((server_ip, server_port))
+        phases['connect_s'] = time.monotonic() - start
+        if ctx is not None:
+            sock = ctx.wrap_socket(sock, server_hostname=server_ip,
+                                   session=session)
+            phases['tls_s'] = time.monotonic() - start
+    conn = http.client.HTTPConnection(server_ip, server_port)
+    conn.sock = sock
+    return conn
+
+# Whether the SYN of the connection carried data that the server acknowledged,
+# i.e., the connection used TCP Fast Open
+def used_fastopen(sock):
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 8)
+    return bool(info[5] & TCPI_OPT_SYN_DATA)
 
+# Send <requests> GET requests. If reuse is 'keepalive', the requests share
+# one connection. If 'resume', each request opens a new connection that resumes
+# the TLS session of the previous connection. Otherwise, each request does a
+# full handshake on a new connection.
+def run(server_ip, server_port, n, verbose, buffer_size, interval_s,
+        tls=True, ctx=None, out=sys.stderr, requests=1, reuse='none',
+        fastopen=False, buffer_options={}):
+    if tls and ctx is None:
+        ctx = create_ssl_context()
+    conn = None
+    session = None
+    for request in range(requests):
+        start = time.monotonic()
+        phases = {}
+        if conn is None:
+            conn = connect(server_ip, server_port, ctx if tls else None,
+                           session, start, phases, fastopen, buffer_options)
+        resumed = tls and conn.sock.session_reused
+        get(conn, n, verbose, buffer_size, interval_s, start, phases,
+            request, resumed, out)
+        if reuse == 'keepalive':
+            continue
+        if tls and reuse == 'resume':
+            session = conn.sock.session
+
+        # Close the connection
+        conn.close()
+        conn = None
+    if conn is not None:
+        conn.close()
+
+def get(conn, n, verbose, buffer_size, interval_s, start, phases, request,
+        resumed, out):
     # Send a GET request to the server
-    start = time.monotonic()
-    conn = http.client.HTTPSConnection(server_ip, server_port, context=ctx)
     conn.request('GET', f'/?n={n}')
+    phases['request_s'] = time.monotonic() - start
 
     # Get the response from the server
     response = conn.getresponse()
-    raw_bytes = response.read()
+    ttfb_s = time.monotonic() - start
+
+    # Read the body into a reusable buffer and discard it, recording the
+    # number of bytes received at each checkpoint interval and the times to
+    # receive 50%, 90%, and 100% of the body
+    length = response.length if response.length is not None else n
+    buf = memoryview(bytearray(buffer_size))
+    body = b''
+    received = 0
+    checkpoints = [(0, ttfb_s)]
+    next_checkpoint_s = ttfb_s + interval_s
+    thresholds = [(0.5, 't50_s'), (0.9, 't90_s'), (1.0, 't100_s')]
+    percentiles = {}
+    while True:
+        k = response.readinto(buf)
+        if k == 0:
+            break
+        received += k
+        now_s = time.monotonic() - start
+        if 'first_byte_s' not in phases:
+            phases['first_byte_s'] = now_s
+        while len(thresholds) > 0 and received >= thresholds[0][0] * length:
+            percentiles[thresholds.pop(0)[1]] = now_s
+        if now_s >= next_checkpoint_s:
+            checkpoints.append((received, now_s))
+            next_checkpoint_s = now_s + interval_s
+        if verbose and len(body) < 1024:
+            body += bytes(buf[:min(k, 1024 - len(body))])
     end = time.monotonic()
+    phases['last_byte_s'] = end - start
+    checkpoints.append((received, end - start))
+
+    throughputs = []
+    for (b0, t0), (b1, t1) in zip(checkpoints[:-1], checkpoints[1:]):
+        if t1 > t0:
+            throughputs.append(f'{8 * (b1 - b0) / 1000000 / (t1 - t0):.3f}')
     if verbose:
         print('Status:', response.status)
         print('Headers:')
         for k, v in response.getheaders():
             print(f'\t{k}: {v}')
-        print('Body:', raw_bytes[:min(len(raw_bytes), 1024)])
-    print(f'Downloaded {len(raw_bytes)} bytes')
+        print('Body:', body)
+    print(f'Downloaded {received} bytes')
+    progress = ' '.join(f'{key}={value}' for key, value in percentiles.items())
+    phases = ' '.join(f'{key}={value}' for key, value in phases.items())
     print(
-        f'[TCP_CLIENT] status_code={response.status} time_s={end - start}',
-        file=sys.stderr,
+        f'[TCP_CLIENT] status_code={response.status} time_s={end - start} '
+        f'{phases} ttfb_s={ttfb_s} {progress} interval_s={interval_s} '
+        f'throughput_mbps={",".join(throughputs)} '
+        f'request={request} resumed={int(resumed)} '
+        f'tfo={int(used_fastopen(conn.sock))}',
+        file=out,
     )
 
-    # Close the connection
-    conn.close()
+# The buffer options of the parsed arguments, see set_buffer_options()
+def buffer_options(args):
+    return {
+        'sndbuf': args.sndbuf,
+        'rcvbuf': args.rcvbuf,
+        'notsent_lowat': args.notsent_lowat,
+    }
+
+# Execute the request of every line of stdin, e.g., "--server-ip 10.0.0.1 -n
+# 1000", with the options of the client, so that the interpreter, imports, and
+# SSL context are only set up once. All output is written to stdout, followed
+# by a line that the request is done.
+def run_agent(parser):
+    ctx = create_ssl_context()
+    print('[AGENT] ready', flush=True)
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        try:
+            args = parser.parse_args(line.split())
+            run(args.server_ip, args.server_port, args.n, args.verbose,
+                args.buffer_size, args.checkpoint_interval / 1000,
+                not args.no_tls, ctx, sys.stdout, args.requests, args.reuse,
+                args.fastopen, buffer_options(args))
+        except (Exception, SystemExit) as e:
+            print(f'[AGENT] error {e!r}')
+        print('[AGENT] done', flush=True)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
-        description='HTTPS TCP client',
+        description='HTTPS (or HTTP) TCP client',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument('--server-ip', type=str, default='127.0.0.1')
@@ -45,5 +198,36 @@ if __name__ == '__main__':
     parser.add_argument('-v', '--verbose', action='store_true')
     parser.add_argument('-n', type=int, default=1000000,
         help='Number of bytes to request, 1e6 is 1 MB')
+    parser.add_argument('--buffer-size', type=int, default=DEFAULT_BUFFER_SIZE,
+        help='Size of the reusable receive buffer, in bytes')
+    parser.add_argument('--checkpoint-interval', type=float, default=100,
+        metavar='MS',
+        help='Interval between the throughput checkpoints, in milliseconds')
+    parser.add_argument('--no-tls', action='store_true',
+        help='Request plain HTTP over TCP without TLS')
+    parser.add_argument('--requests', type=int, default=1,
+        help='Number of GET requests, each reported on its own line')
+    parser.add_argument('--reuse', choices=['none', 'keepalive', 'resume'],
+        default='none',
+        help='Send the requests on one kept-alive connection, or on new '\
+             'connections that resume the TLS session, instead of a full '\
+             'handshake on a new connection per request')
+    parser.add_argument('--fastopen', action='store_true',
+        help='Connect with TCP Fast Open, sending data in the SYN if the '\
+             'host has a cookie for the server')
+    parser.add_argument('--sndbuf', type=int,
+        help='SO_SNDBUF of the client socket, in bytes')
+    parser.add_argument('--rcvbuf', type=int,
+        help='SO_RCVBUF of the client socket, in bytes')
+    parser.add_argument('--notsent-lowat', type=int,
+        help='TCP_NOTSENT_LOWAT of the client socket, in bytes')
+    parser.add_argument('--agent', action='store_true',
+        help='Run as an agent that executes the request on each line of stdin')
     args = parser.parse_args()
-    run(args.server_ip, args.server_port, args.n, args.verbose)
+    if args.agent:
+        run_agent(parser)
+        sys.exit(0)
+    run(args.server_ip, args.server_port, args.n, args.verbose,
+        args.buffer_size, args.checkpoint_interval / 1000, not args.no_tls,
+        requests=args.requests, reuse=args.reuse, fastopen=args.fastopen,
+        buffer_options=buffer_options(args))
@@ -1,18 +1,44 @@
 import argparse
 import http.server
+import mmap
+import socket
 import ssl
 import sys
 import os
+import signal
+import tempfile
 from urllib.parse import urlparse, parse_qs
 
 DEFAULT_CERTFILE = f'{os.environ["HOME"]}/connection-splitting/deps/certs/out/leaf_cert.pem'
 DEFAULT_KEYFILE  = f'{os.environ["HOME"]}/connection-splitting/deps/certs/out/leaf_cert.key'
-CACHE = b''
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+CHUNK_SIZE = DEFAULT_CHUNK_SIZE
+MAX_N = 0
+PAYLOAD = None
+CACHE = memoryview(b'')
 
-# Set up a basic request handler
+# Maximum number of pending TCP Fast Open connections of the listening socket
+FASTOPEN_QUEUE_SIZE = 256
+
+# Not defined by the socket module of older Python versions
+TCP_NOTSENT_LOWAT = getattr(socket, 'TCP_NOTSENT_LOWAT', 25)
+
+# Requests and response bytes served by this process, reported at shutdown
+REQUESTS = 0
+BYTES = 0
+
+# Set up a basic request handler. HTTP/1.1 keeps connections alive so that a
+# client can send several requests on the same connection, and disabling
+# Nagle's algorithm keeps the response headers of a later request from
+# waiting for a delayed ACK.
 class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
     def do_GET(self):
-        global CACHE
+        global REQUESTS, BYTES
+        REQUESTS += 1
         # Parse query param to determine number of bytes to send
         path = urlparse(self.path)
         try:
@@ -22,47 +48,175 @@ class SimpleHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         except Exception as e:
             print(e, file=sys.stderr)
             # Send a 400 Bad Request response
-            self.send_response(400)
-            self.send_header('Content-Type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b'Invalid request. Use GET /?n=<positive int>')
+            self.send_bad_request(b'Invalid request. Use GET /?n=<positive int>')
             return
 
-        if n > len(CACHE):
+        if n > MAX_N:
             # Send a 400 Bad Request response
-            self.send_response(400)
-            self.send_header('Content-Type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(f'Invalid request. {len(CACHE)} < {n} bytes in cache'.encode('utf-8'))
+            self.send_bad_request(f'Invalid request. {MAX_N} < {n} bytes in cache'.encode('utf-8'))
         else:
             # Send a 200 OK response
             self.send_response(200)
             self.send_header('Content-Type', 'application/octet-stream')
             self.send_header('Content-Length', str(n))
             self.end_headers()
-            self.wfile.write(CACHE[:n])
+            self.send_payload(n)
+            BYTES += n
+
+    def send_bad_request(self, body):
+        self.send_response(400)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_payload(self, n):
+        # Send the first n bytes of the payload in CHUNK_SIZE writes without
+        # copying it. Byte i of the payload is at i % BLOCK_SIZE in the cache,
+        # which holds a whole chunk from any such position. Plain TCP
+        # connections send from the payload file with sendfile so that the
+        # bytes never enter user space.
+        if not isinstance(self.connection, ssl.SSLSocket):
+            offset = 0
+            while offset < n:
+                sent = os.sendfile(self.connection.fileno(), PAYLOAD.fileno(),
+                                   offset % BLOCK_SIZE,
+                                   min(CHUNK_SIZE, n - offset))
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        for offset in range(0, n, CHUNK_SIZE):
+            start = offset % BLOCK_SIZE
+            self.wfile.write(CACHE[start:start + min(CHUNK_SIZE, n - offset)])
 
-# Initialize the response data cache
-def init_cache(n):
-    global CACHE
-    CACHE = os.urandom(n)
+# Initialize the response data cache. The payload repeats a random block of
+# BLOCK_SIZE bytes, so the cache only holds enough repetitions of the block to
+# serve a chunk from any offset, written to an unlinked payload file and
+# mapped into memory. Startup time and memory are independent of n.
+def init_cache(n, chunk_size):
+    global MAX_N, PAYLOAD, CACHE
+    MAX_N = n
+    block = os.urandom(BLOCK_SIZE)
+    repetitions = -(-(chunk_size + BLOCK_SIZE) // BLOCK_SIZE)
+    PAYLOAD = tempfile.TemporaryFile()
+    for _ in range(repetitions):
+        PAYLOAD.write(block)
+    PAYLOAD.flush()
+    CACHE = memoryview(mmap.mmap(PAYLOAD.fileno(), repetitions * BLOCK_SIZE,
+                                 prot=mmap.PROT_READ))
 
-# Set up the HTTPS server
-def run(server_ip, server_port, certfile, keyfile):
+# Set the buffer sizes and the limit of unsent bytes of the socket, in bytes,
+# if provided
+def set_buffer_options(sock, sndbuf=None, rcvbuf=None, notsent_lowat=None):
+    if sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+    if rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    if notsent_lowat is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_NOTSENT_LOWAT, notsent_lowat)
+
+# Set up the HTTPS server, or HTTP server without TLS, listening on its own
+# socket. Workers share the port with SO_REUSEPORT.
+def make_server(server_ip, server_port, ctx, cca=None, reuse_port=False,
+                fastopen=False, buffer_options={}):
     server_address = (server_ip, server_port)
-    httpd = http.server.HTTPServer(server_address, SimpleHTTPRequestHandler)
+    httpd = http.server.HTTPServer(server_address, SimpleHTTPRequestHandler,
+                                   bind_and_activate=False)
+    if reuse_port:
+        httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    # Accepted connections inherit the congestion control of the listening
+    # socket, overriding the system default
+    if cca is not None:
+        httpd.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CONGESTION,
+                                cca.encode('utf-8'))
+
+    # Accepted connections inherit the buffer options of the listening socket,
+    # and the receive buffer must be set before listen for window scaling
+    set_buffer_options(httpd.socket, **buffer_options)
+
+    # Accept data in the SYN of clients with a TCP Fast Open cookie
+    if fastopen:
+        httpd.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN,
+                                FASTOPEN_QUEUE_SIZE)
+    httpd.server_bind()
+    httpd.server_activate()
 
     # Wrap the socket with SSL
-    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    ctx.load_cert_chain(certfile=certfile, keyfile=keyfile)
-    httpd.socket = ctx.wrap_socket(httpd.socket, server_side=True)
+    if ctx is not None:
+        httpd.socket = ctx.wrap_socket(httpd.socket, server_side=True)
+    return httpd
+
+# Serve until SIGTERM, then report the counters of this process
+def serve(httpd, worker):
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        httpd.serve_forever()
+    finally:
+        print(f'[TCP_SERVER] worker={worker} requests={REQUESTS} bytes={BYTES}',
+              file=sys.stderr, flush=True)
+
+def run(server_ip, server_port, certfile, keyfile, cca=None, tls=True,
+        workers=1, session_tickets=2, fastopen=False, buffer_options={}):
+    ctx = None
+    scheme = 'http'
+    if tls:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(certfile=certfile, keyfile=keyfile)
+        # Issue session tickets so that clients can resume the TLS session
+        ctx.options &= ~ssl.OP_NO_TICKET
+        ctx.num_tickets = session_tickets
+        scheme = 'https'
+
+    if workers == 1:
+        httpd = make_server(server_ip, server_port, ctx, cca,
+                            fastopen=fastopen, buffer_options=buffer_options)
+        print(f'Serving on {scheme}://{server_ip}:{server_port}', file=sys.stderr, flush=True)
+        serve(httpd, 0)
+        return
+
+    # Prefork the workers, which each write a byte to the pipe once they are
+    # listening. SIGTERM is forwarded to the workers.
+    pids = []
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: [os.kill(pid, signum) for pid in pids])
+    ready_r, ready_w = os.pipe()
+    for worker in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # Do not inherit the handler that forwards SIGTERM to the workers
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                os.close(ready_r)
+                httpd = make_server(server_ip, server_port, ctx, cca,
+                                    reuse_port=True, fastopen=fastopen,
+                                    buffer_options=buffer_options)
+                os.write(ready_w, b'\0')
+                os.close(ready_w)
+                serve(httpd, worker)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    os.close(ready_w)
 
-    print(f'Serving on https://{server_ip}:{server_port}', file=sys.stderr, flush=True)
-    httpd.serve_forever()
+    # Only report that the server is ready once every worker is listening
+    ready = 0
+    while ready < workers:
+        data = os.read(ready_r, workers)
+        if not data:
+            for pid in pids:
+                os.kill(pid, signal.SIGTERM)
+            sys.exit('worker exited before listening')
+        ready += len(data)
+    os.close(ready_r)
+    print(f'Serving on {scheme}://{server_ip}:{server_port} with {workers} workers', file=sys.stderr, flush=True)
+    for pid in pids:
+        os.waitpid(pid, 0)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
-        description='HTTPS TCP server',
+        description='HTTPS (or HTTP) TCP server',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument('--server-ip', type=str, default='127.0.0.1')
@@ -70,9 +224,35 @@ if __name__ == '__main__':
     parser.add_argument('--certfile', type=str, default=DEFAULT_CERTFILE)
     parser.add_argument('--keyfile', type=str, default=DEFAULT_KEYFILE)
     parser.add_argument('-n', type=int, default=1000000,
-        help='Number of random bytes to initialize in the cache, 1e6 is 1 MB')
-    parser.add_argument('--chunk-size', type=int, required=False)
+        help='Maximum number of bytes served in a response, 1e6 is 1 MB')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+        help='Number of bytes of the response written at a time')
+    parser.add_argument('--cca', type=str, required=False,
+        help='Congestion control algorithm of the server connections, '\
+             'defaults to the system default')
+    parser.add_argument('--no-tls', action='store_true',
+        help='Serve plain HTTP over TCP without TLS')
+    parser.add_argument('--workers', type=int, default=1,
+        help='Number of worker processes that share the port with '\
+             'SO_REUSEPORT')
+    parser.add_argument('--session-tickets', type=int, default=2,
+        help='Number of TLS 1.3 session tickets issued per connection')
+    parser.add_argument('--fastopen', action='store_true',
+        help='Accept TCP Fast Open connections')
+    parser.add_argument('--sndbuf', type=int,
+        help='SO_SNDBUF of the server sockets, in bytes')
+    parser.add_argument('--rcvbuf', type=int,
+        help='SO_RCVBUF of the server sockets, in bytes')
+    parser.add_argument('--notsent-lowat', type=int,
+        help='TCP_NOTSENT_LOWAT of the server sockets, in bytes')
     args = parser.parse_args()
 
-    init_cache(args.n)
-    run(args.server_ip, args.server_port, args.certfile, args.keyfile)
+    CHUNK_SIZE = args.chunk_size
+    init_cache(args.n, args.chunk_size)
+    run(args.server_ip, args.server_port, args.certfile, args.keyfile,
+        args.cca, not args.no_tls, args.workers, args.session_tickets,
+        args.fastopen, {
+            'sndbuf': args.sndbuf,
+            'rcvbuf': args.rcvbuf,
+            'notsent_lowat': args.notsent_lowat,
+        })